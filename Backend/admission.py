@@ -0,0 +1,95 @@
+import threading
+import time
+
+# Admission control for the render stage.
+#
+# The cost of a request is estimated from its token and AST node counts once
+# tokenize/parse are done and before any DOT is generated. At most
+# `max_concurrent` renders run at once; others wait in a queue as long as the
+# total queued cost stays under `max_queued_cost`. Anything beyond that is
+# rejected immediately so the server can answer 429 with a Retry-After.
+
+
+class Rejected(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Render capacity exhausted, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+def estimate_cost(token_count, node_count):
+    # dot's layout dominates and grows with the node count; tokens stand in
+    # for the DOT generation and response encoding work
+    return node_count + token_count // 4
+
+
+class AdmissionController:
+    def __init__(self, max_concurrent=4, max_queued_cost=200000):
+        self.max_concurrent = max_concurrent
+        self.max_queued_cost = max_queued_cost
+        self._cond = threading.Condition()
+        self._running = 0
+        self._queued = 0
+        self._queued_cost = 0
+        self._seconds_per_cost = 1e-4
+        self.admitted = 0
+        self.rejected = 0
+
+    def admit(self, cost):
+        """Context manager that holds a render slot for a request of `cost`."""
+        return _Slot(self, cost)
+
+    def _acquire(self, cost):
+        with self._cond:
+            if self._running >= self.max_concurrent:
+                if self._queued_cost + cost > self.max_queued_cost:
+                    self.rejected += 1
+                    raise Rejected(self._retry_after(cost))
+                self._queued += 1
+                self._queued_cost += cost
+                try:
+                    while self._running >= self.max_concurrent:
+                        self._cond.wait()
+                finally:
+                    self._queued -= 1
+                    self._queued_cost -= cost
+            self._running += 1
+            self.admitted += 1
+
+    def _release(self, cost, elapsed):
+        with self._cond:
+            self._running -= 1
+            # Moving average of render time per unit of cost, for Retry-After
+            if cost:
+                self._seconds_per_cost = 0.9 * self._seconds_per_cost + 0.1 * (elapsed / cost)
+            self._cond.notify()
+
+    def _retry_after(self, cost):
+        backlog = self._queued_cost + cost
+        return max(1, round(backlog * self._seconds_per_cost / self.max_concurrent))
+
+    def stats(self):
+        with self._cond:
+            return {
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'running': self._running,
+                'queued': self._queued,
+                'queued_cost': self._queued_cost,
+                'max_concurrent': self.max_concurrent,
+                'max_queued_cost': self.max_queued_cost
+            }
+
+
+class _Slot:
+    def __init__(self, controller, cost):
+        self.controller = controller
+        self.cost = cost
+
+    def __enter__(self):
+        self.controller._acquire(self.cost)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.controller._release(self.cost, time.perf_counter() - self.start)
+        return False
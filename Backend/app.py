@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, send_file
 from pycparser import c_parser, c_ast
 from flask_cors import CORS
 import subprocess
@@ -6,13 +6,37 @@ import tempfile
 import pycparser
 import os
 import graphviz
-import base64
+import hashlib
+import io
+import threading
+from renders import RenderStore, render_with_deadline, PRUNE_DEPTH
+from resultcache import ResultCache, cache_render, restore_render
+from singleflight import SingleFlight
+from profiling import PROFILE_TOKEN, ProfileStore, authorized, profile_urls
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS to allow frontend requests
 
+RENDER_BUDGET = float(os.environ.get('AST_RENDER_BUDGET', 20))
+
+render_store = RenderStore()
+result_cache = ResultCache()
+inflight = SingleFlight()
+profiles = ProfileStore() if PROFILE_TOKEN else None
+
+# CParser builds its lexer and LALR tables on construction; keep one per
+# thread instead of paying for that on every request
+_parsers = threading.local()
+
+def get_parser():
+    """Return this thread's CParser, building it on first use."""
+    parser = getattr(_parsers, 'parser', None)
+    if parser is None:
+        parser = _parsers.parser = c_parser.CParser()
+    return parser
+
 class ASTConverter:
-    def to_dot(self, node, dot, parent_id=None):
+    def to_dot(self, node, dot, parent_id=None, depth=0, max_depth=None):
         """Convert a pycparser AST node to Graphviz DOT format."""
         if not isinstance(node, c_ast.Node):
             return
@@ -38,38 +62,45 @@ class ASTConverter:
         if parent_id:
             dot.edge(parent_id, node_id)
 
+        # Collapse the rest of the subtree when pruning to max_depth
+        if max_depth is not None and depth >= max_depth:
+            if node.children():
+                dot.node(f"{node_id}_more", "...", style='dashed')
+                dot.edge(node_id, f"{node_id}_more")
+            return
+
         # Recursively process children
         if isinstance(node, c_ast.FileAST):
             for child in node.ext:
-                self.to_dot(child, dot, node_id)
+                self.to_dot(child, dot, node_id, depth + 1, max_depth)
         elif isinstance(node, c_ast.FuncDef):
-            self.to_dot(node.decl, dot, node_id)
-            self.to_dot(node.body, dot, node_id)
+            self.to_dot(node.decl, dot, node_id, depth + 1, max_depth)
+            self.to_dot(node.body, dot, node_id, depth + 1, max_depth)
             for param in node.param_decls or []:
-                self.to_dot(param, dot, node_id)
+                self.to_dot(param, dot, node_id, depth + 1, max_depth)
         elif isinstance(node, c_ast.Compound):
             for item in node.block_items or []:
-                self.to_dot(item, dot, node_id)
+                self.to_dot(item, dot, node_id, depth + 1, max_depth)
         elif isinstance(node, c_ast.If):
-            self.to_dot(node.cond, dot, node_id)
-            self.to_dot(node.iftrue, dot, node_id)
+            self.to_dot(node.cond, dot, node_id, depth + 1, max_depth)
+            self.to_dot(node.iftrue, dot, node_id, depth + 1, max_depth)
             if node.iffalse:
-                self.to_dot(node.iffalse, dot, node_id)
+                self.to_dot(node.iffalse, dot, node_id, depth + 1, max_depth)
         else:
             for child_name, child in node.children():
                 if isinstance(child, list):
                     for c in child:
-                        self.to_dot(c, dot, node_id)
+                        self.to_dot(c, dot, node_id, depth + 1, max_depth)
                 elif child is not None:
-                    self.to_dot(child, dot, node_id)
+                    self.to_dot(child, dot, node_id, depth + 1, max_depth)
 
-    def filter_and_convert(self, node):
-        """Filter typedefs and convert to DOT."""
+    def filter_and_convert(self, node, max_depth=None):
+        """Filter typedefs and convert to DOT, optionally pruned to max_depth."""
         dot = graphviz.Digraph(comment='AST Visualization', format='png')
         if isinstance(node, c_ast.FileAST):
             for child in node.ext:
                 if isinstance(child, c_ast.FuncDef):  # Only include FuncDef
-                    self.to_dot(child, dot)
+                    self.to_dot(child, dot, max_depth=max_depth)
         return dot
 
 def preprocess_code(code):
@@ -102,15 +133,20 @@ def preprocess_code(code):
 
     return preprocessed_code, error
 
-def parse_code(code):
+def parse_code(code, budget=RENDER_BUDGET, use_cache=True):
     """Parse preprocessed C code into an AST and convert to Graphviz image."""
+    # Full renders are shared with every other worker through the result cache
+    cache_key = f"pycparser:{hashlib.sha256(code.encode('utf-8')).hexdigest()}"
+    cached = result_cache.get_json(cache_key) if use_cache else None
+    if cached is not None and restore_render(result_cache, render_store, cached['render_id']):
+        return cached
+
     preprocessed_code, preprocess_error = preprocess_code(code)
     if preprocess_error:
         return {'error': preprocess_error}
 
     try:
-        parser = c_parser.CParser()
-        ast = parser.parse(preprocessed_code, filename='<none>')
+        ast = get_parser().parse(preprocessed_code, filename='<none>')
         converter = ASTConverter()
         dot = converter.filter_and_convert(ast)
 
@@ -118,26 +154,27 @@ def parse_code(code):
         print("DOT Source:")
         print(dot.source)
 
-        # Save DOT file to a temporary location
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.dot', delete=False) as temp_dot:
-            temp_dot.write(dot.source)
-            dot_path = temp_dot.name
-
-        # Render DOT to PNG
-        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as temp_image:
-            image_path = temp_image.name
-            # Use subprocess to call dot directly for better control
-            result = subprocess.run(['dot', '-Tpng', dot_path, '-o', image_path], check=True, capture_output=True, text=True)
-            print("Dot command output:", result.stdout)  # Debug: Log dot command output
-            print("Dot command errors:", result.stderr)  # Debug: Log any errors
-            # Read the PNG file
-            with open(image_path, 'rb') as image_file:
-                image_data = base64.b64encode(image_file.read()).decode('utf-8')
-            # Clean up files
-            os.unlink(dot_path)
-            os.unlink(image_path)
-
-        return {'image': f'data:image/png;base64,{image_data}'}
+        # Render DOT directly into the render store within the time budget,
+        # degrading to cheaper output; the bytes are served by /image/<render-id>
+        key = hashlib.sha256(preprocessed_code.encode('utf-8')).hexdigest()
+        rid, level = render_with_deadline(
+            render_store, key, dot.source,
+            lambda: converter.filter_and_convert(ast, max_depth=PRUNE_DEPTH).source,
+            budget
+        )
+        if rid is None:
+            # Nothing rendered in time: fall back to pycparser's text dump
+            text = io.StringIO()
+            ast.show(buf=text)
+            return {'ast': text.getvalue(), 'degradation': level}
+        metadata = render_store.metadata(rid)
+        if metadata is None:
+            return {'error': 'Render was evicted before it could be served; retry'}
+        result = {'degradation': level, **metadata}
+        if level == 'full':
+            cache_render(result_cache, render_store, rid)
+            result_cache.put_json(cache_key, result)
+        return result
     except Exception as e:
         return {'error': f"Parsing or rendering failed: {str(e)}"}
 
@@ -148,8 +185,44 @@ def parse():
     code = data.get('code', '')
     if not code.strip():
         return jsonify({'error': 'No code provided'})
-    result = parse_code(code)
+    try:
+        budget = min(float(data.get('deadline', RENDER_BUDGET)), RENDER_BUDGET)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'deadline must be a number of seconds'})
+    if authorized(request.headers, request.args):
+        # Profiled requests skip the cache and coalescing so the pipeline really runs
+        result, profile_id = profiles.run('/parse', parse_code, code, budget, use_cache=False)
+        return jsonify({**result, 'profile': profile_urls(profile_id)}), 200, {'X-Profile-Id': profile_id}
+    # Identical concurrent submissions share one preprocess/parse/render
+    key = f"{hashlib.sha256(code.encode('utf-8')).hexdigest()}:{budget}"
+    result, _ = inflight.do(key, parse_code, code, budget)
     return jsonify(result)
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Shared result cache and request coalescing statistics."""
+    return jsonify({'cache': result_cache.stats(), 'coalescing': inflight.stats()})
+
+@app.route('/profiles/<name>', methods=['GET'])
+def profile(name):
+    """Serve a stored request profile: summary JSON, .pstats or .collapsed."""
+    if not authorized(request.headers, request.args):
+        return jsonify({'error': 'Unknown profile'}), 404
+    profile_id, _, kind = name.partition('.')
+    stored = profiles.lookup(profile_id, kind or 'json')
+    if not stored:
+        return jsonify({'error': 'Unknown profile'}), 404
+    path, mimetype = stored
+    return send_file(path, mimetype=mimetype, as_attachment=bool(kind), download_name=name)
+
+@app.route('/image/<rid>', methods=['GET'])
+def image(rid):
+    """Stream a rendered AST image from the render store."""
+    stored = restore_render(result_cache, render_store, rid)
+    if not stored:
+        return jsonify({'error': 'Unknown render id'}), 404
+    path, mimetype = stored
+    return send_file(path, mimetype=mimetype, max_age=86400)
+
 if __name__ == "__main__":
     app.run(debug=True, port=5000, host='127.0.0.1')
\ No newline at end of file
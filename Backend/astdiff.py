@@ -0,0 +1,253 @@
+import difflib
+from collections import deque
+
+from graphviz import Digraph
+
+from layout import flatten, node_label
+from merkle import subtree_hashes
+
+# Structural diff between two parser.py ASTs.
+#
+# 1. Every subtree gets a structural hash (see merkle.py). Subtrees of two or
+#    more nodes that occur unchanged in both versions are matched wholesale,
+#    largest first, so a file where most functions are untouched is almost
+#    entirely matched in this linear step.
+# 2. The remainder is matched bottom-up: an unmatched old node is paired with
+#    the same-typed new node that most of its matched children ended up
+#    under. Unmatched children of matched pairs are then paired, identical
+#    ones first and then by type in order.
+# 3. The edit script is read off the matching: unmatched old subtrees are
+#    deletes, unmatched new subtrees inserts, matched pairs with different
+#    values updates, and matched nodes that changed parent or left the
+#    common order among their siblings moves.
+#
+# Node ids in operations are preorder ids of the old and new trees.
+
+COLORS = {'insert': 'palegreen', 'delete': 'lightcoral', 'update': 'orange', 'move': 'lightskyblue3'}
+
+
+class _Tree:
+    def __init__(self, ast):
+        self.nodes, self.parent, self.children, _ = flatten(ast)
+        self.hash, self.size = subtree_hashes(self.nodes, self.parent, self.children)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def label(self, i):
+        return node_label(self.nodes[i])
+
+
+def _take(queue, used):
+    """Pop the first id from `queue` that isn't in `used`, or None."""
+    while queue:
+        candidate = queue.popleft()
+        if candidate not in used:
+            return candidate
+    return None
+
+
+class ASTDiff:
+    def __init__(self, old_ast, new_ast):
+        self.old = _Tree(old_ast)
+        self.new = _Tree(new_ast)
+        self.old_to_new = {}
+        self.new_to_old = {}
+        self._match_identical()
+        self._match_bottom_up()
+        self._match_children()
+        self.operations = self._edit_script()
+
+    def _pair(self, a, b):
+        self.old_to_new[a] = b
+        self.new_to_old[b] = a
+
+    def _match_identical(self):
+        old, new = self.old, self.new
+        by_hash = {}
+        by_hash_parent = {}
+        for b in range(len(new)):
+            if new.size[b] > 1:
+                by_hash.setdefault(new.hash[b], deque()).append(b)
+                by_hash_parent.setdefault((new.hash[b], new.parent[b]), deque()).append(b)
+
+        for a in sorted((i for i in range(len(old)) if old.size[i] > 1), key=lambda i: -old.size[i]):
+            if a in self.old_to_new:
+                continue
+            # Prefer the copy under this node's parent's partner, then the first free one
+            parent = self.old_to_new.get(old.parent[a], -2)
+            b = _take(by_hash_parent.get((old.hash[a], parent), deque()), self.new_to_old)
+            if b is None:
+                b = _take(by_hash.get(old.hash[a], deque()), self.new_to_old)
+            if b is None:
+                continue
+            # Identical subtrees have identical preorder shapes
+            for k in range(old.size[a]):
+                self._pair(a + k, b + k)
+
+    def _match_bottom_up(self):
+        old, new = self.old, self.new
+        for a in range(len(old) - 1, -1, -1):
+            if a in self.old_to_new:
+                continue
+            votes = {}
+            for child in old.children[a]:
+                partner = self.old_to_new.get(child)
+                if partner is None:
+                    continue
+                b = new.parent[partner]
+                if b >= 0 and b not in self.new_to_old and new.nodes[b].node_type == old.nodes[a].node_type:
+                    votes[b] = votes.get(b, 0) + 1
+            if votes:
+                self._pair(a, max(votes, key=votes.get))
+        if 0 not in self.old_to_new and 0 not in self.new_to_old and \
+                old.nodes[0].node_type == new.nodes[0].node_type:
+            self._pair(0, 0)
+
+    def _match_children(self):
+        old, new = self.old, self.new
+        stack = [0]
+        while stack:
+            a = stack.pop()
+            b = self.old_to_new.get(a)
+            if b is not None:
+                free = [c for c in new.children[b] if c not in self.new_to_old]
+                if free:
+                    by_hash = {}
+                    by_type = {}
+                    for c in free:
+                        by_hash.setdefault(new.hash[c], deque()).append(c)
+                        by_type.setdefault(new.nodes[c].node_type, deque()).append(c)
+                    unmatched = [c for c in old.children[a] if c not in self.old_to_new]
+                    for child in unmatched:
+                        match = _take(by_hash.get(old.hash[child], deque()), self.new_to_old)
+                        if match is not None:
+                            for k in range(old.size[child]):
+                                self._pair(child + k, match + k)
+                    for child in unmatched:
+                        if child not in self.old_to_new:
+                            match = _take(by_type.get(old.nodes[child].node_type, deque()), self.new_to_old)
+                            if match is not None:
+                                self._pair(child, match)
+            stack.extend(old.children[a])
+
+    def _edit_script(self):
+        old, new = self.old, self.new
+        operations = []
+        for a in range(len(old)):
+            # Only the roots of deleted subtrees are reported
+            if a not in self.old_to_new and (old.parent[a] < 0 or old.parent[a] in self.old_to_new):
+                operations.append({'op': 'delete', 'old': a, 'label': old.label(a), 'size': old.size[a],
+                                   'parent': old.parent[a]})
+
+        moved = set()
+        for b in range(len(new)):
+            a = self.new_to_old.get(b)
+            if a is None:
+                if new.parent[b] < 0 or new.parent[b] in self.new_to_old:
+                    operations.append({'op': 'insert', 'new': b, 'label': new.label(b), 'size': new.size[b],
+                                       'parent': new.parent[b]})
+                continue
+            if old.nodes[a].value != new.nodes[b].value:
+                operations.append({'op': 'update', 'old': a, 'new': b, 'type': new.nodes[b].node_type,
+                                   'from': old.nodes[a].value, 'to': new.nodes[b].value})
+            if b > 0 and self.new_to_old.get(new.parent[b]) != old.parent[a]:
+                moved.add(b)
+
+            # Children kept under the same parent that left the common order moved too
+            kept_old = [self.old_to_new[c] for c in old.children[a]
+                        if c in self.old_to_new and new.parent[self.old_to_new[c]] == b]
+            kept_new = [c for c in new.children[b] if c in self.new_to_old and old.parent[self.new_to_old[c]] == a]
+            if kept_old != kept_new:
+                matcher = difflib.SequenceMatcher(None, kept_old, kept_new, autojunk=False)
+                in_order = set()
+                for block in matcher.get_matching_blocks():
+                    in_order.update(kept_new[block.b:block.b + block.size])
+                moved.update(c for c in kept_new if c not in in_order)
+
+        for b in sorted(moved):
+            a = self.new_to_old[b]
+            operations.append({'op': 'move', 'old': a, 'new': b, 'label': new.label(b),
+                               'from_parent': old.parent[a], 'to_parent': new.parent[b]})
+        return operations
+
+    def summary(self):
+        counts = {op: 0 for op in COLORS}
+        for operation in self.operations:
+            counts[operation['op']] += 1
+        return {'old_nodes': len(self.old), 'new_nodes': len(self.new), 'matched': len(self.old_to_new), **counts}
+
+    def to_json(self):
+        return {'summary': self.summary(), 'operations': self.operations}
+
+    def to_dot(self):
+        """The new tree with changes highlighted and deleted subtrees hung off their old parent's partner.
+
+        Subtrees without any change below them are collapsed into a single
+        node, so the render stays small when most of the file is unchanged.
+        """
+        new = self.new
+        status = {}
+        for operation in self.operations:
+            if 'new' in operation:
+                status.setdefault(operation['new'], operation['op'])
+        changed = [False] * len(new)
+        for operation in self.operations:
+            if operation['op'] == 'delete' and operation['parent'] >= 0:
+                changed[self.old_to_new[operation['parent']]] = True
+        for b in range(len(new) - 1, -1, -1):
+            if b in status:
+                changed[b] = True
+            if changed[b] and new.parent[b] >= 0:
+                changed[new.parent[b]] = True
+
+        dot = Digraph(
+            graph_attr={'rankdir': 'TB', 'nodesep': '0.3', 'ranksep': '0.5'},
+            node_attr={'shape': 'box', 'style': 'filled', 'fillcolor': 'lightblue', 'fontsize': '12',
+                       'fontname': 'Helvetica'},
+            edge_attr={'color': 'black'}
+        )
+        stack = [0] if len(new) else []
+        while stack:
+            b = stack.pop()
+            if isinstance(b, tuple):
+                nodes = sum(new.size[r] for r in b)
+                dot.node(f'u{b[0]}', f'{len(b)} unchanged subtrees ({nodes} nodes)', style='filled,dashed')
+                dot.edge(f'n{new.parent[b[0]]}', f'u{b[0]}')
+                continue
+            if status.get(b) == 'insert':
+                dot.node(f'n{b}', f'{new.label(b)} [insert, {new.size[b]} nodes]', fillcolor=COLORS['insert'])
+            elif b in status:
+                dot.node(f'n{b}', f'{new.label(b)} [{status[b]}]', fillcolor=COLORS[status[b]])
+            elif not changed[b] and new.size[b] > 1:
+                dot.node(f'n{b}', f'{new.label(b)} (unchanged, {new.size[b]} nodes)', style='filled,dashed')
+            else:
+                dot.node(f'n{b}', new.label(b))
+            if new.parent[b] >= 0:
+                dot.edge(f'n{new.parent[b]}', f'n{b}')
+            if not changed[b] or status.get(b) == 'insert':
+                continue
+            # Runs of unchanged siblings (e.g. untouched functions) become one node
+            expand = []
+            run = []
+            for c in new.children[b] + [None]:
+                if c is not None and not changed[c]:
+                    run.append(c)
+                    continue
+                if len(run) > 1:
+                    expand.append(tuple(run))
+                else:
+                    expand.extend(run)
+                run = []
+                if c is not None:
+                    expand.append(c)
+            stack.extend(reversed(expand))
+
+        for operation in self.operations:
+            if operation['op'] == 'delete':
+                a = operation['old']
+                dot.node(f'd{a}', f"{operation['label']} [delete, {operation['size']} nodes]",
+                         fillcolor=COLORS['delete'], style='filled,dashed')
+                if operation['parent'] >= 0:
+                    dot.edge(f"n{self.old_to_new[operation['parent']]}", f'd{a}', style='dashed', color='red')
+        return dot
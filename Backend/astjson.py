@@ -0,0 +1,39 @@
+from layout import flatten, layout_tree
+from parser import ASTNode
+
+# Compact AST JSON for client-side rendering.
+#
+# Nodes are numbered in preorder (the same order layout.py uses), so node i
+# is described by type[i], value[i] and children[i]. Node types are sent once
+# in a `types` dictionary and referenced by index. Layout coordinates, when
+# requested, are parallel arrays over the same ids.
+
+
+def ast_to_compact(ast, with_layout=False):
+    nodes, _, children, _ = flatten(ast)
+    type_codes = {}
+    data = {
+        'count': len(nodes),
+        'type': [type_codes.setdefault(node.node_type, len(type_codes)) for node in nodes],
+        'value': [node.value for node in nodes],
+        'children': children
+    }
+    data['types'] = list(type_codes)
+    if with_layout:
+        layout = layout_tree(ast)
+        data['layout'] = {
+            'width': round(layout.total_width, 1),
+            'height': round(layout.total_height, 1),
+            'x': layout.x.round(1).tolist(),
+            'y': layout.y.round(1).tolist(),
+            'w': layout.width.round(1).tolist()
+        }
+    return data
+
+
+def compact_to_ast(data):
+    """Rebuild ASTNodes from ast_to_compact output."""
+    nodes = [ASTNode(data['types'][code], value) for code, value in zip(data['type'], data['value'])]
+    for node, children in zip(nodes, data['children']):
+        node.children = [nodes[child] for child in children]
+    return nodes[0]
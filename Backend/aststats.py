@@ -0,0 +1,155 @@
+import itertools
+import operator
+
+import numpy as np
+
+# Complexity metrics for one AST, computed over flat arrays.
+#
+# The tree is flattened once, breadth first, into a type code and a parent
+# index per node. In that order every depth level is a contiguous range and
+# the parents of one level are non-decreasing ids in the level above, so
+# every metric is a few NumPy operations per level:
+#
+#   subtree sizes     levels bottom-up, summing children into parents
+#   control nesting   levels top-down, parent's count plus one at If/While/For
+#
+# and the rest (type counts, depths, branching) are single whole-array
+# reductions. A snapshot (see snapshot.py) already holds type ids and parents
+# in preorder and is converted without touching any node objects.
+
+CONTROL_TYPES = ('If', 'While', 'For')
+PERCENTILES = (50, 90, 99)
+
+
+class LevelArrays:
+    def __init__(self, types, codes, parent, level_starts):
+        self.types = types                # type names indexed by code
+        self.codes = codes                # type code per node, breadth-first order
+        self.parent = parent              # parent id per node, -1 for the root
+        self.level_starts = level_starts  # first id of each depth level, plus len
+
+    def __len__(self):
+        return len(self.codes)
+
+    @classmethod
+    def from_ast(cls, ast):
+        # Each level is handled with C-level passes (map, chain, np.repeat)
+        # rather than a Python loop over its nodes
+        get_type = operator.attrgetter('node_type')
+        get_children = operator.attrgetter('children')
+        type_codes = {}
+        codes = []
+        parents = [np.full(1, -1, dtype=np.int64)]
+        level_starts = [0]
+        level = [ast]
+        while level:
+            names = list(map(get_type, level))
+            for name in sorted(set(names).difference(type_codes)):
+                type_codes[name] = len(type_codes)
+            codes += map(type_codes.__getitem__, names)
+            start = level_starts[-1]
+            level_starts.append(start + len(level))
+            children = list(map(get_children, level))
+            next_level = list(itertools.chain.from_iterable(children))
+            parent = np.repeat(np.arange(start, start + len(level)), list(map(len, children)))
+            if None in next_level:
+                keep = np.fromiter((child is not None for child in next_level), dtype=bool, count=len(next_level))
+                next_level = [child for child in next_level if child is not None]
+                parent = parent[keep]
+            parents.append(parent)
+            level = next_level
+        return cls(list(type_codes), np.asarray(codes, dtype=np.int32), np.concatenate(parents), level_starts)
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        codes = snapshot.nodes['type'].astype(np.int32)
+        parent = snapshot.nodes['parent'].astype(np.int64)
+        n = len(codes)
+        # Depth by pointer jumping: log2(depth) whole-array passes
+        depth = (parent >= 0).astype(np.int64)
+        jump = parent.copy()
+        while True:
+            active = np.flatnonzero(jump >= 0)
+            active = active[jump[active] >= 0]
+            if not len(active):
+                break
+            depth[active] += depth[jump[active]]
+            jump[active] = jump[jump[active]]
+        # A stable sort keeps preorder within each level, which keeps parents sorted
+        order = np.argsort(depth, kind='stable')
+        position = np.empty(n, dtype=np.int64)
+        position[order] = np.arange(n)
+        level_parent = parent[order]
+        level_parent[1:] = position[level_parent[1:]]
+        counts = np.bincount(depth, minlength=1)
+        level_starts = [0] + np.cumsum(counts).tolist()
+        used, codes = np.unique(codes[order], return_inverse=True)
+        types = [snapshot.string(int(code)) for code in used]
+        return cls(types, codes.astype(np.int32), level_parent, level_starts)
+
+
+def _distribution(values):
+    if not len(values):
+        return {'mean': 0.0, 'max': 0, **{f'p{p}': 0 for p in PERCENTILES}}
+    marks = np.percentile(values, PERCENTILES)
+    return {
+        'mean': round(float(values.mean()), 3),
+        'max': int(values.max()),
+        **{f'p{p}': round(float(mark), 3) for p, mark in zip(PERCENTILES, marks)}
+    }
+
+
+def subtree_sizes(arrays):
+    """Node count of every subtree, indexed like `arrays.codes`."""
+    parent, starts = arrays.parent, arrays.level_starts
+    size = np.ones(len(arrays.codes), dtype=np.int64)
+    for level in range(len(starts) - 2, 0, -1):
+        ids = slice(starts[level], starts[level + 1])
+        # Parents are sorted, so each parent's children form one run
+        runs = np.flatnonzero(np.diff(parent[ids], prepend=-1))
+        size[parent[ids][runs]] += np.add.reduceat(size[ids], runs)
+    return size
+
+
+def compute_stats(arrays):
+    """Every metric for one tree, as a JSON-serialisable dict."""
+    codes, parent, starts = arrays.codes, arrays.parent, arrays.level_starts
+    n = len(codes)
+    levels = len(starts) - 1
+
+    depth = np.repeat(np.arange(levels), np.diff(starts))
+
+    children = np.bincount(parent[1:], minlength=n)
+    internal = children[children > 0]
+
+    size = subtree_sizes(arrays)
+
+    control_codes = [code for code, name in enumerate(arrays.types) if name in CONTROL_TYPES]
+    is_control = np.isin(codes, control_codes)
+    nesting = is_control.astype(np.int32)
+    for level in range(1, levels):
+        ids = slice(starts[level], starts[level + 1])
+        nesting[ids] += nesting[parent[ids]]
+    control_nesting = nesting[is_control]
+
+    type_counts = np.bincount(codes, minlength=len(arrays.types))
+    return {
+        'nodes': n,
+        'types': {arrays.types[code]: int(type_counts[code]) for code in np.argsort(-type_counts, kind='stable')},
+        'depth': {'max': int(depth.max()), 'mean': round(float(depth.mean()), 3)},
+        'branching': {
+            'internal_nodes': len(internal),
+            'leaves': n - len(internal),
+            'mean': round(float(internal.mean()), 3) if len(internal) else 0.0,
+            'max': int(internal.max()) if len(internal) else 0
+        },
+        'subtree_sizes': _distribution(size[children > 0]),
+        'control_nesting': {
+            'max': int(control_nesting.max()) if len(control_nesting) else 0,
+            'levels': {int(level): int(count) for level, count in
+                       enumerate(np.bincount(control_nesting)) if level and count},
+            'max_by_type': {
+                arrays.types[code]: int(nesting[codes == code].max()) for code in control_codes
+            }
+        }
+    }
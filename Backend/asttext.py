@@ -0,0 +1,63 @@
+# Indented text form of an AST, one node per line:
+#
+#   Program
+#     Function: int main
+#       Block
+#
+# Lines are produced by an explicit-stack preorder walk and joined once, so
+# the cost is linear in the output and deep trees don't hit the recursion
+# limit. iter_ast_chunks() groups the same lines into blocks for streaming
+# huge trees as a chunked HTTP response instead of building one string.
+
+CHUNK_SIZE = 64 * 1024
+
+
+def iter_ast_lines(ast, max_depth=None, max_lines=None):
+    """Yield one line per node (without newlines), honouring depth and line limits.
+
+    Children below `max_depth` are summarised as a single "..." line, and
+    output stops with a "... truncated" line once `max_lines` lines have
+    been produced.
+    """
+    indents = ['']
+    emitted = 0
+    stack = [(ast, 0)]
+    while stack:
+        node, depth = stack.pop()
+        if max_lines is not None and emitted >= max_lines:
+            yield f"... truncated after {emitted} lines"
+            return
+        if depth >= len(indents):
+            indents.append("  " * depth)
+        yield indents[depth] + str(node)
+        emitted += 1
+        if not node.children:
+            continue
+        if max_depth is not None and depth >= max_depth:
+            hidden = sum(child is not None for child in node.children)
+            yield "  " * (depth + 1) + f"... {hidden} children hidden"
+            emitted += 1
+            continue
+        for child in reversed(node.children):
+            if child is not None:
+                stack.append((child, depth + 1))
+
+
+def ast_to_string(ast, max_depth=None, max_lines=None):
+    return "\n".join(iter_ast_lines(ast, max_depth, max_lines))
+
+
+def iter_ast_chunks(ast, max_depth=None, max_lines=None, chunk_size=CHUNK_SIZE):
+    """Yield the text form in blocks of roughly `chunk_size` characters."""
+    lines = []
+    size = 0
+    for line in iter_ast_lines(ast, max_depth, max_lines):
+        lines.append(line)
+        size += len(line) + 1
+        if size >= chunk_size:
+            lines.append('')
+            yield "\n".join(lines)
+            lines = []
+            size = 0
+    if lines:
+        yield "\n".join(lines) + "\n"
@@ -0,0 +1,336 @@
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from lexer import Tokenizer
+from parser import Parser
+from main2 import count_nodes, generate_dot
+
+# Benchmarks for the backend pipeline. Each subcommand prints a small table;
+# inputs are synthetic C sources built from a fixed function template so runs
+# are reproducible across machines.
+
+FUNCTION_TEMPLATE = """int f{i}(int a, int b) {{
+    int x = a + b * {i};
+    if (x > {i}) {{
+        x = x - 1;
+        printf("%d", x);
+    }} else {{
+        x = g{i}(a, b);
+    }}
+    while (x < 100) {{
+        x++;
+    }}
+    for (i = 0; i < b; i++) {{
+        a = a + i;
+    }}
+    return x;
+}}
+"""
+
+
+def synthetic_source(functions):
+    return ''.join(FUNCTION_TEMPLATE.format(i=i) for i in range(functions))
+
+
+def synthetic_ast(target_nodes):
+    """Parse a synthetic program with roughly `target_nodes` AST nodes."""
+    per_function = count_nodes(Parser(Tokenizer(synthetic_source(1)).tokenize()).parse()) - 1
+    functions = max(1, round(target_nodes / per_function))
+    code = synthetic_source(functions)
+    return code, Parser(Tokenizer(code).tokenize()).parse()
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def bench_layout(options):
+    from layout import layout_tree
+
+    have_dot = shutil.which('dot') is not None
+    print(f"{'nodes':>8} {'tidy layout':>12} {'tidy svg':>10} {'dot -Tsvg':>10}")
+    for size in options.sizes:
+        _, ast = synthetic_ast(size)
+        layout, layout_time = timed(layout_tree, ast)
+        _, svg_time = timed(layout.to_svg)
+        dot_time = None
+        if have_dot and size <= options.dot_limit:
+            with tempfile.TemporaryDirectory() as tmp:
+                dot_path = os.path.join(tmp, 'ast.dot')
+                with open(dot_path, 'w') as dot_file:
+                    dot_file.write(generate_dot(ast).source)
+                _, dot_time = timed(subprocess.run, ['dot', '-Tsvg', dot_path, '-o', os.devnull])
+        dot_column = f"{dot_time * 1000:.0f}ms" if dot_time is not None else 'skipped'
+        print(f"{len(layout):>8} {layout_time * 1000:>10.0f}ms {svg_time * 1000:>8.0f}ms {dot_column:>10}")
+
+
+def bench_tokens(options):
+    import json
+    from wire import TOKEN_FORMATS, decode_tokens, encode_tokens
+
+    functions = 1
+    while True:
+        tokens = Tokenizer(synthetic_source(functions)).tokenize()
+        if len(tokens) >= options.tokens:
+            break
+        functions = functions * 2
+    tokens = tokens[:options.tokens]
+    print(f"{len(tokens)} tokens")
+    print(f"{'format':>16} {'bytes':>10} {'encode':>9} {'dumps':>9} {'total':>9}")
+    reference = encode_tokens(tokens, 'rows')
+    for fmt in TOKEN_FORMATS:
+        encoded, encode_time = timed(encode_tokens, tokens, fmt)
+        payload, dumps_time = timed(json.dumps, encoded)
+        assert decode_tokens(encoded) == reference
+        print(f"{fmt:>16} {len(payload):>10} {encode_time * 1000:>7.1f}ms "
+              f"{dumps_time * 1000:>7.1f}ms {(encode_time + dumps_time) * 1000:>7.1f}ms")
+
+
+def bench_load(options):
+    import json
+    import urllib.error
+    import urllib.request
+    from concurrent.futures import ThreadPoolExecutor
+
+    base = synthetic_source(options.functions)
+    run = os.getpid()
+
+    def one(i):
+        # A unique trailing declaration defeats render reuse between requests
+        code = base + (f"int unique_{run}_{i};\n" if options.unique else '')
+        body = json.dumps({'code': code, 'token_format': 'columnar'}).encode('utf-8')
+        req = urllib.request.Request(options.url, data=body, headers={'Content-Type': 'application/json'})
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=options.timeout) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        return status, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=options.concurrency) as pool:
+        results = list(pool.map(one, range(options.requests)))
+    elapsed = time.perf_counter() - start
+    latencies = sorted(latency for _, latency in results)
+    errors = sum(1 for status, _ in results if status != 200)
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000
+
+    print(f"{options.url}: {options.requests} requests, concurrency {options.concurrency}, {errors} errors")
+    print(f"  {options.requests / elapsed:.1f} req/s  p50 {pct(50):.0f}ms  p95 {pct(95):.0f}ms  p99 {pct(99):.0f}ms")
+
+
+def bench_modes(options):
+    import logging
+    import resource
+    from main2 import app
+
+    logging.disable(logging.CRITICAL)
+    client = app.test_client()
+    base = synthetic_source(options.functions)
+    run = os.getpid()
+    modes = [
+        ('dot', {}),
+        ('json', {'renderer': 'json'}),
+        ('json+layout', {'renderer': 'json', 'layout': True})
+    ]
+    print(f"{options.functions} functions, {options.requests} requests per mode (CPU ms per request)")
+    print(f"{'mode':>12} {'server':>9} {'dot':>9} {'total':>9} {'bytes':>9}")
+    for mode, body in modes:
+        if mode == 'dot' and shutil.which('dot') is None:
+            print(f"{mode:>12} {'skipped (Graphviz not installed)':>30}")
+            continue
+        cpu_start = time.process_time()
+        children_start = resource.getrusage(resource.RUSAGE_CHILDREN)
+        size = 0
+        for i in range(options.requests):
+            # Unique code per request so nothing is served from the render store
+            response = client.post('/parse', json={'code': base + f"int unique_{run}_{i};\n", **body})
+            size += len(response.data)
+        server = (time.process_time() - cpu_start) / options.requests * 1000
+        children_end = resource.getrusage(resource.RUSAGE_CHILDREN)
+        dot = ((children_end.ru_utime + children_end.ru_stime) -
+               (children_start.ru_utime + children_start.ru_stime)) / options.requests * 1000
+        print(f"{mode:>12} {server:>7.1f}ms {dot:>7.1f}ms {server + dot:>7.1f}ms {size // options.requests:>9}")
+
+
+def bench_project(options):
+    from project import ingest_directory
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tree = os.path.join(tmp, 'tree')
+        for i in range(options.files):
+            directory = os.path.join(tree, f'module{i % 20}')
+            os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, f'file{i}.c'), 'w') as f:
+                f.write(synthetic_source(options.functions))
+        print(f"{'backend':>10} {'workers':>8} {'wall':>8} {'files/s':>8} {'failed':>7}")
+        for backend in options.backends:
+            for workers in options.workers:
+                # A fresh store each run so nothing is served from a previous ingestion
+                root = tempfile.mkdtemp(dir=tmp)
+                manifest = ingest_directory(tree, backend, workers, root)
+                totals = manifest['totals']
+                print(f"{backend:>10} {workers:>8} {totals['wall_seconds'] * 1000:>6.0f}ms "
+                      f"{totals['files_per_second']:>8.0f} {totals['failed']:>7}")
+
+
+def bench_symbols(options):
+    from symbols import SymbolIndex
+
+    tokens = Tokenizer(synthetic_source(options.functions)).tokenize()
+
+    def parse_only():
+        return Parser(tokens, collect_symbols=False).parse()
+
+    def parse_and_index():
+        parser = Parser(tokens)
+        # Return the AST too so freeing it isn't timed here but not in parse_only
+        return parser.parse(), SymbolIndex.from_records(parser.symbols)
+
+    # Interleave the two and keep the best of each; GC pauses would swamp a
+    # difference of a few percent
+    import gc
+    plain = indexed = float('inf')
+    gc.disable()
+    try:
+        for _ in range(options.repeat):
+            plain = min(plain, timed(parse_only)[1])
+            indexed = min(indexed, timed(parse_and_index)[1])
+    finally:
+        gc.enable()
+    print(f"{len(tokens)} tokens, {len(parse_and_index()[1])} symbols")
+    print(f"parse {plain * 1000:.1f}ms, parse+index {indexed * 1000:.1f}ms, "
+          f"overhead {(indexed / plain - 1) * 100:.1f}%")
+
+
+def bench_dotcache(options):
+    import main2
+    from dotcache import DotFragmentCache
+
+    code = synthetic_source(options.functions)
+    edited = code.replace(f'x = a + b * {options.functions // 2};', f'x = a - b * {options.functions // 2};')
+    original = Parser(Tokenizer(code).tokenize()).parse()
+    changed = Parser(Tokenizer(edited).tokenize()).parse()
+
+    main2.dot_fragments = cache = DotFragmentCache()
+    cold = min(timed(lambda: (cache.__init__(), generate_dot(original).source))[1] for _ in range(options.repeat))
+    generate_dot(original)
+    unchanged = min(timed(lambda: generate_dot(original).source)[1] for _ in range(options.repeat))
+    edit = float('inf')
+    for _ in range(options.repeat):
+        # Forget the edited function so every round re-emits it
+        generate_dot(original)
+        cache.__init__()
+        generate_dot(original)
+        edit = min(edit, timed(lambda: generate_dot(changed).source)[1])
+    print(f"{options.functions} functions, {count_nodes(original)} nodes")
+    print(f"{'cold':>10} {'unchanged':>10} {'one edit':>10}")
+    print(f"{cold * 1000:>8.1f}ms {unchanged * 1000:>8.1f}ms {edit * 1000:>8.1f}ms")
+    print(cache.stats())
+
+
+def bench_snapshot(options):
+    from snapshot import Snapshot, write_snapshot
+
+    code = synthetic_source(options.functions)
+
+    def parse_all():
+        parser = Parser(Tokenizer(code).tokenize())
+        return parser, parser.parse()
+
+    (parser, ast), parse = timed(parse_all)
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, 'bench.astsnap')
+        _, write = timed(write_snapshot, path, code, ast, parser.tokens, parser.symbols)
+        snapshot, load = timed(Snapshot, path)
+        _, first = timed(lambda: [str(child) for child in snapshot.root.children])
+        _, restore = timed(lambda: (snapshot.tokens(), snapshot.to_ast(), snapshot.symbols()))
+        size = os.path.getsize(path)
+    print(f"{len(snapshot)} nodes, {len(parser.tokens)} tokens, snapshot {size / 1e6:.1f} MB")
+    print(f"{'parse':>10} {'write':>10} {'map':>10} {'top level':>10} {'restore':>10}")
+    print(f"{parse * 1000:>8.1f}ms {write * 1000:>8.1f}ms {load * 1000:>8.1f}ms "
+          f"{first * 1000:>8.1f}ms {restore * 1000:>8.1f}ms")
+
+
+def bench_stats(options):
+    from aststats import LevelArrays, compute_stats
+
+    print(f"{'nodes':>8} {'flatten':>10} {'metrics':>10}")
+    for size in options.sizes:
+        _, ast = synthetic_ast(size)
+        arrays, flatten = timed(LevelArrays.from_ast, ast)
+        _, metrics = timed(compute_stats, arrays)
+        print(f"{len(arrays):>8} {flatten * 1000:>8.1f}ms {metrics * 1000:>8.1f}ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Backend benchmarks')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    layout = sub.add_parser('layout', help='tidy-tree layout vs. Graphviz dot')
+    layout.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    layout.add_argument('--dot-limit', type=int, default=100000,
+                        help='skip dot above this many nodes')
+    layout.set_defaults(func=bench_layout)
+
+    tokens = sub.add_parser('tokens', help='token wire formats: payload size and serialization time')
+    tokens.add_argument('--tokens', type=int, default=50000)
+    tokens.set_defaults(func=bench_tokens)
+
+    load = sub.add_parser('load', help='concurrent /parse load against a running server')
+    load.add_argument('--url', default='http://127.0.0.1:5050/parse')
+    load.add_argument('--requests', type=int, default=200)
+    load.add_argument('--concurrency', type=int, default=32)
+    load.add_argument('--functions', type=int, default=20, help='synthetic functions per request')
+    load.add_argument('--unique', action='store_true', help='make every request render afresh')
+    load.add_argument('--timeout', type=float, default=120)
+    load.set_defaults(func=bench_load)
+
+    modes = sub.add_parser('modes', help='CPU per /parse request: server-side dot vs. client-side JSON')
+    modes.add_argument('--functions', type=int, default=50)
+    modes.add_argument('--requests', type=int, default=20)
+    modes.set_defaults(func=bench_modes)
+
+    project = sub.add_parser('project', help='multi-file project ingestion throughput')
+    project.add_argument('--files', type=int, default=1000)
+    project.add_argument('--functions', type=int, default=5, help='functions per file')
+    project.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count() or 1])
+    project.add_argument('--backends', nargs='+', default=['parser', 'pycparser'])
+    project.set_defaults(func=bench_project)
+
+    symbols = sub.add_parser('symbols', help='symbol index overhead on parse time')
+    symbols.add_argument('--functions', type=int, default=500)
+    symbols.add_argument('--repeat', type=int, default=20)
+    symbols.set_defaults(func=bench_symbols)
+
+    dotcache = sub.add_parser('dotcache', help='DOT emission with the subtree fragment cache')
+    dotcache.add_argument('--functions', type=int, default=200)
+    dotcache.add_argument('--repeat', type=int, default=5)
+    dotcache.set_defaults(func=bench_dotcache)
+
+    snapshot = sub.add_parser('snapshot', help='binary AST snapshot write/map/restore vs. parsing')
+    snapshot.add_argument('--functions', type=int, default=3000)
+    snapshot.set_defaults(func=bench_snapshot)
+
+    stats = sub.add_parser('stats', help='vectorized AST statistics')
+    stats.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    stats.set_defaults(func=bench_stats)
+
+    options = parser.parse_args(argv)
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 100000))
+    options.func(options)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+import threading
+from collections import OrderedDict
+
+from graphviz import Digraph
+
+# Call graph of one source file.
+#
+# Each top-level Function is walked once and its FunctionCall nodes become
+# caller -> callee edges. Callee lists are cached per function, keyed by the
+# function's structural (Merkle) hash, which covers every node of its
+# subtree, so an edit anywhere in a function changes its key. The hashes are
+# the ones the DOT fragment cache keeps per source; when a source was already
+# rendered they cost nothing, otherwise computing them costs about as much
+# as the walks they replace. The graph renders as a small DOT graph of
+# functions only, a tiny fraction of the full AST image.
+
+FUNCTION_CACHE_SIZE = 4096
+
+
+class CallGraph:
+    def __init__(self, functions, calls):
+        # functions: defined names in source order
+        # calls: caller -> [(callee, count), ...] in first-call order
+        self.functions = functions
+        self.calls = calls
+
+    def edges(self):
+        return [(caller, callee, count) for caller in self.functions for callee, count in self.calls[caller]]
+
+    def external(self):
+        """Callees that are not defined in this file (e.g. printf)."""
+        defined = set(self.functions)
+        seen = OrderedDict()
+        for _, callee, _ in self.edges():
+            if callee not in defined:
+                seen[callee] = None
+        return list(seen)
+
+    def to_json(self):
+        return {
+            'functions': self.functions,
+            'external': self.external(),
+            'edges': [list(edge) for edge in self.edges()]
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        calls = {name: [] for name in data['functions']}
+        for caller, callee, count in data['edges']:
+            calls[caller].append((callee, count))
+        return cls(data['functions'], calls)
+
+    def to_dot(self):
+        dot = Digraph(
+            graph_attr={'rankdir': 'LR', 'nodesep': '0.3', 'ranksep': '0.6'},
+            node_attr={'shape': 'box', 'style': 'filled', 'fillcolor': 'lightblue', 'fontsize': '12',
+                       'fontname': 'Helvetica'},
+            edge_attr={'color': 'black', 'fontsize': '10'}
+        )
+        for name in self.functions:
+            dot.node(f'f_{name}', name)
+        for name in self.external():
+            dot.node(f'f_{name}', name, shape='ellipse', style='dashed', fillcolor='white')
+        for caller, callee, count in self.edges():
+            dot.edge(f'f_{caller}', f'f_{callee}', label=str(count) if count > 1 else None)
+        return dot
+
+
+def _function_calls(function):
+    """Callees of one Function node with call counts, in first-call order."""
+    counts = OrderedDict()
+    stack = [function]
+    while stack:
+        node = stack.pop()
+        if node.node_type == 'FunctionCall':
+            counts[node.value] = counts.get(node.value, 0) + 1
+        # Reversed so the walk (and so the edge order) follows the source
+        stack.extend(child for child in reversed(node.children) if child is not None)
+    return list(counts.items())
+
+
+class CallGraphBuilder:
+    def __init__(self, cache_size=FUNCTION_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.walked = 0
+        self.reused = 0
+
+    def build(self, ast, keys=None):
+        """Call graph of a parsed file.
+
+        `keys` are the structural hashes of the root's (non-None) children in
+        order; without them every function is walked and nothing is cached.
+        """
+        children = [child for child in ast.children if child is not None]
+        if keys is None or len(keys) != len(children):
+            keys = [None] * len(children)
+
+        names = []
+        calls = {}
+        walked = reused = 0
+        for function, key in zip(children, keys):
+            if function.node_type != 'Function':
+                continue
+            name = function.value.split(' ', 1)[-1]
+            with self._lock:
+                cached = self._cache.get(key) if key else None
+                if cached is not None:
+                    self._cache.move_to_end(key)
+            if cached is None:
+                cached = _function_calls(function)
+                walked += 1
+                if key:
+                    with self._lock:
+                        self._cache[key] = cached
+                        if len(self._cache) > self.cache_size:
+                            self._cache.popitem(last=False)
+            else:
+                reused += 1
+            if name not in calls:
+                names.append(name)
+                calls[name] = cached
+        with self._lock:
+            self.walked += walked
+            self.reused += reused
+        return CallGraph(names, calls), {'walked': walked, 'reused': reused}
@@ -0,0 +1,263 @@
+import argparse
+import json
+import os
+import signal
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from aststats import LevelArrays, subtree_sizes
+from lexer import Tokenizer, remove_preprocessor_directives
+from parser import Parser
+from project import SOURCE_SUFFIXES
+
+# Corpus-wide analytics over thousands of source files.
+#
+# Every .c/.h file under the given paths is tokenized and parsed in a process
+# pool. Workers take files in batches and reduce each batch to a Histograms
+# record of fixed size: counts per token type and per node type over fixed
+# vocabularies, a node depth histogram with a capped top bin, and a log2
+# histogram of function sizes (nodes per Function subtree). Only these
+# records travel back to the parent, which adds them up as they arrive.
+#
+# Paths are walked lazily and only a few batches per worker are in flight at
+# once, so memory stays flat however large the corpus is; nothing per file is
+# kept apart from a bounded sample of failures.
+#
+# Each file gets FILE_TIMEOUT seconds (a SIGALRM timer in the worker) as a
+# backstop: truncated files are rejected by the parser, but a pathological
+# input must not stall the whole run. A file that runs over is counted as
+# failed and as a timeout and the batch moves on.
+#
+#   python corpus.py path/to/tree another/tree --workers 4 --output report.json
+
+TOKEN_TYPES = ('KEYWORD', 'IDENTIFIER', 'NUMBER', 'OPERATOR', 'PUNCTUATION', 'STRING', 'CHAR', 'EOF')
+NODE_TYPES = ('Program', 'Function', 'Parameter', 'Block', 'Declaration', 'Assignment', 'ExpressionStatement',
+              'If', 'While', 'For', 'Return', 'FunctionCall', 'BinaryOp', 'UnaryOp',
+              'IDENTIFIER', 'NUMBER', 'STRING', 'CHAR', 'Type')
+# Anything outside a vocabulary is counted in one extra trailing bin
+OTHER = 'other'
+DEPTH_BINS = 256
+SIZE_BINS = 32
+MAX_ERROR_SAMPLES = 20
+FILE_TIMEOUT = float(os.environ.get('AST_CORPUS_FILE_TIMEOUT', 10))
+
+_TOKEN_INDEX = {name: i for i, name in enumerate(TOKEN_TYPES)}
+_NODE_INDEX = {name: i for i, name in enumerate(NODE_TYPES)}
+_FUNCTION = _NODE_INDEX['Function']
+
+
+class Histograms:
+    """Fixed-size aggregates for any number of files; merged with +=."""
+
+    COUNTERS = ('files', 'parsed', 'failed', 'timeouts', 'bytes', 'tokens', 'nodes', 'functions')
+
+    def __init__(self):
+        self.token_types = np.zeros(len(TOKEN_TYPES) + 1, dtype=np.int64)
+        self.node_types = np.zeros(len(NODE_TYPES) + 1, dtype=np.int64)
+        self.depths = np.zeros(DEPTH_BINS, dtype=np.int64)
+        self.function_sizes = np.zeros(SIZE_BINS, dtype=np.int64)
+        for name in self.COUNTERS:
+            setattr(self, name, 0)
+        self.seconds = 0.0
+        self.errors = []
+
+    def __iadd__(self, other):
+        self.token_types += other.token_types
+        self.node_types += other.node_types
+        self.depths += other.depths
+        self.function_sizes += other.function_sizes
+        for name in self.COUNTERS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.seconds += other.seconds
+        self.errors.extend(other.errors[:MAX_ERROR_SAMPLES - len(self.errors)])
+        return self
+
+    def add_tokens(self, tokens):
+        index = _TOKEN_INDEX.get
+        other = len(TOKEN_TYPES)
+        codes = np.fromiter((index(token.type, other) for token in tokens), dtype=np.int64, count=len(tokens))
+        self.token_types += np.bincount(codes, minlength=len(self.token_types))
+        self.tokens += len(tokens)
+
+    def add_tree(self, ast):
+        arrays = LevelArrays.from_ast(ast)
+        other = len(NODE_TYPES)
+        # Local type codes to vocabulary bins
+        to_bin = np.array([_NODE_INDEX.get(name, other) for name in arrays.types], dtype=np.int64)
+        self.node_types += np.bincount(to_bin[arrays.codes], minlength=len(self.node_types))
+        # Breadth-first order: the nodes at depth d are one range of level_starts
+        per_level = np.diff(arrays.level_starts)
+        self.depths += np.bincount(np.minimum(np.arange(len(per_level)), DEPTH_BINS - 1),
+                                   weights=per_level, minlength=DEPTH_BINS).astype(np.int64)
+        function_code = np.flatnonzero(to_bin == _FUNCTION)
+        if len(function_code):
+            sizes = subtree_sizes(arrays)[arrays.codes == function_code[0]]
+            bins = np.minimum(np.log2(sizes).astype(np.int64), SIZE_BINS - 1)
+            self.function_sizes += np.bincount(bins, minlength=SIZE_BINS)
+            self.functions += len(sizes)
+        self.nodes += len(arrays)
+
+    def rates(self, wall):
+        return {
+            'files_per_second': round(self.files / wall, 1) if wall else None,
+            'mb_per_second': round(self.bytes / wall / 1e6, 3) if wall else None
+        }
+
+    def report(self, wall):
+        levels = np.arange(DEPTH_BINS)
+        deepest = np.flatnonzero(self.depths)
+        return {
+            'totals': {
+                **{name: getattr(self, name) for name in self.COUNTERS},
+                'wall_seconds': round(wall, 3),
+                'worker_seconds': round(self.seconds, 3),
+                **self.rates(wall)
+            },
+            'token_types': dict(zip(TOKEN_TYPES + (OTHER,), self.token_types.tolist())),
+            'node_types': dict(zip(NODE_TYPES + (OTHER,), self.node_types.tolist())),
+            'depth': {
+                'max': int(deepest[-1]) if len(deepest) else 0,
+                'mean': round(float((levels * self.depths).sum() / self.nodes), 3) if self.nodes else 0.0,
+                # The last bin holds every depth from DEPTH_BINS - 1 down
+                'histogram': self.depths[:deepest[-1] + 1].tolist() if len(deepest) else []
+            },
+            'function_sizes': {
+                f'{1 << k}-{(1 << k + 1) - 1}': int(count)
+                for k, count in enumerate(self.function_sizes) if count
+            },
+            'errors': self.errors
+        }
+
+
+class FileTimeout(Exception):
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise FileTimeout()
+
+
+def analyze_files(paths, timeout=FILE_TIMEOUT):
+    """Worker: tokenize and parse a batch of files, reduced to one Histograms."""
+    partial = Histograms()
+    start = time.perf_counter()
+    previous = signal.signal(signal.SIGALRM, _on_alarm)
+    try:
+        for path in paths:
+            partial.files += 1
+            try:
+                signal.setitimer(signal.ITIMER_REAL, timeout)
+                try:
+                    with open(path, encoding='utf-8', errors='replace') as f:
+                        code = f.read()
+                    partial.bytes += len(code)
+                    tokens = Tokenizer(remove_preprocessor_directives(code)).tokenize()
+                    ast = Parser(tokens, collect_symbols=False).parse()
+                finally:
+                    signal.setitimer(signal.ITIMER_REAL, 0)
+            except FileTimeout:
+                partial.timeouts += 1
+                error = f'Timed out after {timeout}s'
+            except Exception as e:
+                error = str(e)
+            else:
+                partial.add_tokens(tokens)
+                partial.add_tree(ast)
+                partial.parsed += 1
+                continue
+            partial.failed += 1
+            if len(partial.errors) < MAX_ERROR_SAMPLES:
+                partial.errors.append({'path': path, 'error': error})
+    finally:
+        signal.signal(signal.SIGALRM, previous)
+    partial.seconds = time.perf_counter() - start
+    return partial
+
+
+def iter_sources(paths):
+    """Every .c/.h file under `paths`, walked lazily in sorted order."""
+    for root in paths:
+        if os.path.isfile(root):
+            yield root
+            continue
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if filename.endswith(SOURCE_SUFFIXES):
+                    yield os.path.join(dirpath, filename)
+
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def analyze_corpus(paths, workers=None, batch_size=32, progress=None, interval=2.0, timeout=FILE_TIMEOUT):
+    """Aggregate histograms for every source file under `paths`.
+
+    `progress`, if given, is called with (Histograms so far, elapsed seconds)
+    at most every `interval` seconds and once at the end.
+    """
+    workers = workers or os.cpu_count() or 1
+    total = Histograms()
+    batches = _batches(iter_sources(paths), batch_size)
+    start = last_report = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # A few batches per worker keep the pool busy without queueing the corpus
+        pending = set()
+        for batch in batches:
+            pending.add(executor.submit(analyze_files, batch, timeout))
+            if len(pending) < workers * 2:
+                continue
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                total += future.result()
+            now = time.perf_counter()
+            if progress and now - last_report >= interval:
+                progress(total, now - start)
+                last_report = now
+        for future in pending:
+            total += future.result()
+    wall = time.perf_counter() - start
+    if progress:
+        progress(total, wall)
+    return total, wall
+
+
+def print_progress(total, elapsed):
+    rates = total.rates(elapsed)
+    print(f"{total.files} files ({total.failed} failed, {total.timeouts} timed out), {total.bytes / 1e6:.1f} MB in {elapsed:.1f}s: "
+          f"{rates['files_per_second']} files/s, {rates['mb_per_second']} MB/s", file=sys.stderr)
+
+
+def main(argv=None):
+    cli = argparse.ArgumentParser(description='Token, node, depth and function size histograms for a C corpus')
+    cli.add_argument('paths', nargs='+', help='directories or files')
+    cli.add_argument('--workers', type=int)
+    cli.add_argument('--batch', type=int, default=32, help='files per worker task')
+    cli.add_argument('--interval', type=float, default=2.0, help='seconds between progress lines')
+    cli.add_argument('--timeout', type=float, default=FILE_TIMEOUT, help='seconds allowed per file')
+    cli.add_argument('--output', help='write the JSON report here instead of stdout')
+    options = cli.parse_args(argv)
+
+    total, wall = analyze_corpus(options.paths, options.workers, options.batch, print_progress, options.interval,
+                                 options.timeout)
+    report = total.report(wall)
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
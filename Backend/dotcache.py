@@ -0,0 +1,160 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from graphviz.quoting import quote
+
+from layout import flatten, node_label
+from merkle import subtree_hashes
+
+# Cache of emitted DOT fragments, keyed by subtree Merkle hash.
+#
+# The tree is split into units: maximal subtrees of at most UNIT_NODES nodes
+# (typically whole functions, or the statements of a very long one). The few
+# nodes above them form a spine that is emitted fresh every time. Each unit's
+# DOT text is cached under its structural hash with node names written as
+# PLACEHOLDER + offset into the unit, so one cached fragment serves every
+# occurrence of that subtree, in this file or any other: assembling it is a
+# single str.replace of the placeholder with a per-occurrence prefix. After
+# editing one function of a large file only that function is emitted again.
+# The flattened tree and its hashes are also kept for the last few sources,
+# so rendering the same source again (the pruned fallback, a later request)
+# doesn't flatten and hash it a second time.
+
+DOT_FRAGMENT_BYTES = int(os.environ.get('AST_DOT_FRAGMENT_BYTES', 64 * 1024 * 1024))
+UNIT_NODES = int(os.environ.get('AST_DOT_FRAGMENT_NODES', 256))
+HASHED_TREES = int(os.environ.get('AST_DOT_HASHED_TREES', 8))
+
+# Never produced by the tokenizer; stripped from labels to be sure
+PLACEHOLDER = '\x00'
+
+
+class DotFragmentCache:
+    def __init__(self, max_bytes=DOT_FRAGMENT_BYTES, unit_nodes=UNIT_NODES, max_trees=HASHED_TREES):
+        self.max_bytes = max_bytes
+        self.unit_nodes = unit_nodes
+        self.max_trees = max_trees
+        self._fragments = OrderedDict()
+        self._trees = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.emit_seconds = 0.0
+        self.saved_seconds = 0.0
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._fragments.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._fragments.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += entry[1]
+            return entry[0]
+
+    def _put(self, key, text, seconds):
+        with self._lock:
+            self.emit_seconds += seconds
+            if key in self._fragments or len(text) > self.max_bytes:
+                return
+            self._fragments[key] = (text, seconds)
+            self.bytes += len(text)
+            while self.bytes > self.max_bytes:
+                _, (evicted, _) = self._fragments.popitem(last=False)
+                self.bytes -= len(evicted)
+                self.evictions += 1
+
+    def _unit(self, nodes, parent, children, depth, sizes, root, max_depth):
+        """DOT text of the subtree at `root`, with placeholder-relative node names."""
+        # Same statement syntax Digraph.node/edge produce; names become valid
+        # IDs once the placeholder is replaced, so only labels need quoting
+        lines = []
+        end = root + sizes[root]
+        i = root
+        while i < end:
+            name = f'{PLACEHOLDER}{i - root}'
+            lines.append(f'\t{name} [label={quote(node_label(nodes[i]).replace(PLACEHOLDER, ""))}]\n')
+            if i != root:
+                lines.append(f'\t{PLACEHOLDER}{parent[i] - root} -> {name}\n')
+            if max_depth is not None and depth[i] >= max_depth and children[i]:
+                # Collapse everything below the cut-off into a single marker node
+                lines.append(f'\t{name}_more [label="... {sizes[i] - 1} more" style=dashed]\n')
+                lines.append(f'\t{name} -> {name}_more\n')
+                i += sizes[i]
+            else:
+                i += 1
+        return ''.join(lines)
+
+    def _hashed_tree(self, ast, source_hash):
+        """Flattened tree plus subtree hashes and sizes, cached by source hash when given."""
+        if source_hash is not None:
+            with self._lock:
+                tree = self._trees.get(source_hash)
+                if tree is not None:
+                    self._trees.move_to_end(source_hash)
+                    return tree
+        nodes, parent, children, depth = flatten(ast)
+        tree = (nodes, parent, children, depth, *subtree_hashes(nodes, parent, children))
+        if source_hash is not None:
+            with self._lock:
+                self._trees[source_hash] = tree
+                while len(self._trees) > self.max_trees:
+                    self._trees.popitem(last=False)
+        return tree
+
+    def child_hashes(self, ast, source_hash=None):
+        """Structural hashes of the root's children, in order, sharing the per-source cache."""
+        _, _, children, _, hashes, _ = self._hashed_tree(ast, source_hash)
+        return [hashes[child] for child in children[0]]
+
+    def emit(self, dot, ast, max_depth=None, source_hash=None):
+        """Append the DOT body for `ast` to `dot`, reusing cached fragments.
+
+        `source_hash` identifies the source `ast` was parsed from; the same
+        source always parses to the same tree, so its hashes are reused.
+        """
+        nodes, parent, children, depth, hashes, sizes = self._hashed_tree(ast, source_hash)
+        stack = [0]
+        while stack:
+            i = stack.pop()
+            if sizes[i] > self.unit_nodes:
+                dot.node(f'n{i}', node_label(nodes[i]))
+                if parent[i] >= 0:
+                    dot.edge(f'n{parent[i]}', f'n{i}')
+                if max_depth is not None and depth[i] >= max_depth:
+                    dot.node(f'n{i}_more', f'... {sizes[i] - 1} more', style='dashed')
+                    dot.edge(f'n{i}', f'n{i}_more')
+                else:
+                    stack.extend(reversed(children[i]))
+                continue
+
+            # The same subtree prunes differently at different depths
+            key = (hashes[i], None if max_depth is None else max_depth - depth[i])
+            text = self._get(key)
+            if text is None:
+                start = time.perf_counter()
+                text = self._unit(nodes, parent, children, depth, sizes, i, max_depth)
+                self._put(key, text, time.perf_counter() - start)
+            if parent[i] >= 0:
+                dot.edge(f'n{parent[i]}', f'n{i}_0')
+            dot.body.append(text.replace(PLACEHOLDER, f'n{i}_'))
+        return dot
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'fragments': len(self._fragments),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'evictions': self.evictions,
+                'emit_seconds': round(self.emit_seconds, 3),
+                'saved_seconds': round(self.saved_seconds, 3)
+            }
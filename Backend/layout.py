@@ -0,0 +1,241 @@
+import numpy as np
+from xml.sax.saxutils import escape
+
+# Tidy-tree layout for the ASTs produced by parser.Parser.
+#
+# This is the linear-time Walker algorithm as corrected by Buchheim, Juenger
+# and Leipert ("Improving Walker's Algorithm to Run in Linear Time"). Trees
+# from the parser are always rooted and ordered, so the general layered layout
+# that `dot` performs is unnecessary work for them. Both walks are iterative
+# so very deep expression chains do not hit the recursion limit.
+
+CHAR_WIDTH = 7.0
+NODE_PADDING = 16.0
+NODE_HEIGHT = 28.0
+SIBLING_GAP = 12.0
+LEVEL_GAP = 48.0
+MARGIN = 20.0
+
+
+def node_label(node):
+    label = node.node_type
+    if node.value:
+        label += f": {node.value}"
+    return label
+
+
+class Layout:
+    def __init__(self, labels, parent, depth, x, y, width):
+        self.labels = labels
+        self.parent = parent
+        self.depth = depth
+        self.x = x
+        self.y = y
+        self.width = width
+        self.total_width = float((x + width / 2).max() + MARGIN) if len(x) else 0.0
+        self.total_height = float(y.max() + NODE_HEIGHT / 2 + MARGIN) if len(y) else 0.0
+
+    def __len__(self):
+        return len(self.labels)
+
+    def to_json(self):
+        """Return node coordinates as a JSON-serialisable dict (node centres, preorder ids)."""
+        x = np.round(self.x, 1).tolist()
+        y = np.round(self.y, 1).tolist()
+        w = np.round(self.width, 1).tolist()
+        parent = self.parent.tolist()
+        return {
+            'width': round(self.total_width, 1),
+            'height': round(self.total_height, 1),
+            'node_height': NODE_HEIGHT,
+            'nodes': [
+                {'id': i, 'label': self.labels[i], 'x': x[i], 'y': y[i], 'w': w[i], 'parent': parent[i]}
+                for i in range(len(self.labels))
+            ]
+        }
+
+    def to_svg(self):
+        """Render the layout as a standalone SVG document."""
+        half_h = NODE_HEIGHT / 2
+        x = self.x.tolist()
+        y = self.y.tolist()
+        w = self.width.tolist()
+        parent = self.parent.tolist()
+        parts = [
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{self.total_width:.0f}" '
+            f'height="{self.total_height:.0f}" viewBox="0 0 {self.total_width:.1f} {self.total_height:.1f}" '
+            f'font-family="Helvetica" font-size="12">',
+            '<g stroke="black" fill="none">'
+        ]
+        for i in range(1, len(x)):
+            p = parent[i]
+            parts.append(f'<line x1="{x[p]:.1f}" y1="{y[p] + half_h:.1f}" x2="{x[i]:.1f}" y2="{y[i] - half_h:.1f}"/>')
+        parts.append('</g>')
+        parts.append('<g stroke="black" fill="lightblue">')
+        for i in range(len(x)):
+            parts.append(f'<rect x="{x[i] - w[i] / 2:.1f}" y="{y[i] - half_h:.1f}" width="{w[i]:.1f}" height="{NODE_HEIGHT}"/>')
+        parts.append('</g>')
+        parts.append('<g text-anchor="middle" dominant-baseline="central" fill="black">')
+        for i in range(len(x)):
+            parts.append(f'<text x="{x[i]:.1f}" y="{y[i]:.1f}">{escape(self.labels[i])}</text>')
+        parts.append('</g></svg>')
+        return '\n'.join(parts)
+
+
+def flatten(ast):
+    """Flatten an AST into preorder arrays: (nodes, parent, children, depth)."""
+    nodes = []
+    parent = []
+    depth = []
+    children = []
+    stack = [(ast, -1, 0)]
+    while stack:
+        node, parent_index, node_depth = stack.pop()
+        index = len(nodes)
+        nodes.append(node)
+        parent.append(parent_index)
+        depth.append(node_depth)
+        children.append([])
+        if parent_index >= 0:
+            children[parent_index].append(index)
+        for child in reversed(node.children):
+            if child is not None:
+                stack.append((child, index, node_depth + 1))
+    return nodes, parent, children, depth
+
+
+def layout_tree(ast):
+    """Compute tidy-tree coordinates for every node of the AST."""
+    nodes, parent, children, depth = flatten(ast)
+    labels = [node_label(node) for node in nodes]
+    n = len(nodes)
+    width = [len(label) * CHAR_WIDTH + NODE_PADDING for label in labels]
+
+    # Position among siblings and the left sibling of each node
+    number = [0] * n
+    left_sibling = [-1] * n
+    leftmost_sibling = list(range(n))
+    for kids in children:
+        for k, child in enumerate(kids):
+            number[child] = k
+            leftmost_sibling[child] = kids[0]
+            if k:
+                left_sibling[child] = kids[k - 1]
+
+    prelim = [0.0] * n
+    mod = [0.0] * n
+    shift = [0.0] * n
+    change = [0.0] * n
+    thread = [-1] * n
+    ancestor = list(range(n))
+    default_ancestor = [kids[0] if kids else -1 for kids in children]
+
+    def separation(a, b):
+        return (width[a] + width[b]) / 2 + SIBLING_GAP
+
+    def next_left(v):
+        return children[v][0] if children[v] else thread[v]
+
+    def next_right(v):
+        return children[v][-1] if children[v] else thread[v]
+
+    def move_subtree(wl, wr, amount):
+        subtrees = number[wr] - number[wl]
+        change[wr] -= amount / subtrees
+        shift[wr] += amount
+        change[wl] += amount / subtrees
+        prelim[wr] += amount
+        mod[wr] += amount
+
+    def apportion(v, default):
+        w = left_sibling[v]
+        if w < 0:
+            return default
+        vir = vor = v
+        vil = w
+        vol = leftmost_sibling[v]
+        sir = mod[vir]
+        sor = mod[vor]
+        sil = mod[vil]
+        sol = mod[vol]
+        nr = next_right(vil)
+        nl = next_left(vir)
+        while nr >= 0 and nl >= 0:
+            vil = nr
+            vir = nl
+            vol = next_left(vol)
+            vor = next_right(vor)
+            ancestor[vor] = v
+            amount = (prelim[vil] + sil) - (prelim[vir] + sir) + separation(vil, vir)
+            if amount > 0:
+                a = ancestor[vil]
+                if parent[a] != parent[v]:
+                    a = default
+                move_subtree(a, v, amount)
+                sir += amount
+                sor += amount
+            sil += mod[vil]
+            sir += mod[vir]
+            sol += mod[vol]
+            sor += mod[vor]
+            nr = next_right(vil)
+            nl = next_left(vir)
+        if nr >= 0 and next_right(vor) < 0:
+            thread[vor] = nr
+            mod[vor] += sil - sor
+        if nl >= 0 and next_left(vol) < 0:
+            thread[vol] = nl
+            mod[vol] += sir - sol
+            default = v
+        return default
+
+    # First walk: children are finished left to right before their parent
+    stack = [(0, False)] if n else []
+    while stack:
+        v, visited = stack.pop()
+        if not visited:
+            stack.append((v, True))
+            for child in reversed(children[v]):
+                stack.append((child, False))
+            continue
+        kids = children[v]
+        w = left_sibling[v]
+        if kids:
+            s = 0.0
+            c = 0.0
+            for child in reversed(kids):
+                prelim[child] += s
+                mod[child] += s
+                c += change[child]
+                s += shift[child] + c
+            midpoint = (prelim[kids[0]] + prelim[kids[-1]]) / 2
+            if w >= 0:
+                prelim[v] = prelim[w] + separation(w, v)
+                mod[v] = prelim[v] - midpoint
+            else:
+                prelim[v] = midpoint
+        elif w >= 0:
+            prelim[v] = prelim[w] + separation(w, v)
+        p = parent[v]
+        if p >= 0:
+            default_ancestor[p] = apportion(v, default_ancestor[p])
+
+    # Second walk: accumulate ancestor modifiers one level at a time
+    parent_arr = np.array(parent, dtype=np.int64)
+    depth_arr = np.array(depth, dtype=np.int64)
+    prelim_arr = np.array(prelim)
+    mod_arr = np.array(mod)
+    acc = np.zeros(n)
+    if n:
+        order = np.argsort(depth_arr, kind='stable')
+        bounds = np.searchsorted(depth_arr[order], np.arange(1, depth_arr.max() + 2))
+        for level in range(1, len(bounds)):
+            level_nodes = order[bounds[level - 1]:bounds[level]]
+            p = parent_arr[level_nodes]
+            acc[level_nodes] = acc[p] + mod_arr[p]
+    width_arr = np.array(width)
+    x = prelim_arr + acc
+    if n:
+        x += MARGIN - (x - width_arr / 2).min()
+    y = MARGIN + NODE_HEIGHT / 2 + depth_arr * (NODE_HEIGHT + LEVEL_GAP)
+    return Layout(labels, parent_arr, depth_arr, x, y.astype(float), width_arr)
@@ -1,3 +1,195 @@
+import re
+
+# Table-driven C89/C99 scanner.
+#
+# The source is first mapped, one C-level pass, to a byte string of
+# character classes. Tokens are then recognised by a DFA over those classes:
+# TRANSITIONS[state][class] is the next state (or DEAD) and ACCEPTS[state] is
+# the token kind a state accepts, if any. Each token is the longest prefix
+# that ends in an accepting state, so "<<=" is one operator and "a+++b" is
+# "a ++ + b". The operator states are built from a trie of every C
+# punctuator; identifiers, numbers, string and character literals,
+# whitespace and both comment forms are hand-written states on top of it.
+# Whitespace and comments are accepted as SKIP and never become tokens.
+#
+# Numbers are scanned as preprocessing numbers (digits, letters, dots and
+# signed exponents), the way a C compiler's lexer does, and the spelling is
+# then checked against the integer and floating constant grammar: decimal,
+# octal and hex integers with u/l/ll suffixes, decimal floats with exponents
+# and f/l suffixes, and C99 hex floats.
+
+KEYWORDS = frozenset({
+    'auto', 'break', 'case', 'char', 'const', 'continue', 'default', 'do', 'double', 'else', 'enum',
+    'extern', 'float', 'for', 'goto', 'if', 'inline', 'int', 'long', 'register', 'restrict', 'return',
+    'short', 'signed', 'sizeof', 'static', 'struct', 'switch', 'typedef', 'union', 'unsigned', 'void',
+    'volatile', 'while', '_Bool', '_Complex', '_Imaginary'
+})
+PUNCTUATION = frozenset({'(', ')', '[', ']', '{', '}', ';', ',', '...', '#', '##'})
+OPERATORS = frozenset({
+    '+', '-', '*', '/', '%', '=', '==', '!=', '<', '>', '<=', '>=', '&&', '||', '!', '~', '&', '|', '^',
+    '<<', '>>', '+=', '-=', '*=', '/=', '%=', '&=', '|=', '^=', '<<=', '>>=', '->', '.', '++', '--',
+    '?', ':'
+})
+# Alternative spellings, reported as the punctuator they stand for
+DIGRAPHS = {'<:': '[', ':>': ']', '<%': '{', '%>': '}', '%:': '#', '%:%:': '##'}
+
+SKIP = 'SKIP'
+
+_NUMBER_RE = re.compile(r'''
+    (?:0[xX][0-9a-fA-F]+|0[0-7]*|[1-9][0-9]*)(?:[uU](?:ll|LL|[lL])?|(?:ll|LL|[lL])[uU]?)?
+  | (?:(?:[0-9]*\.[0-9]+|[0-9]+\.)(?:[eE][+-]?[0-9]+)?|[0-9]+[eE][+-]?[0-9]+)[fFlL]?
+  | 0[xX](?:[0-9a-fA-F]*\.[0-9a-fA-F]+|[0-9a-fA-F]+\.?)[pP][+-]?[0-9]+[fFlL]?
+''', re.VERBOSE)
+
+
+# Character classes. Every punctuator character is a class of its own so the
+# operator trie can branch on it; E (eEpP) and L are letters with extra
+# meaning in numbers and wide literals.
+_SPELLINGS = sorted(OPERATORS | PUNCTUATION | set(DIGRAPHS))
+_CLASS_NAMES = ['OTHER', 'LETTER', 'E', 'L', 'DIGIT', 'SPACE', 'NEWLINE', 'DQUOTE', 'SQUOTE', 'BACKSLASH'] + \
+    sorted(set(''.join(_SPELLINGS)))
+_CLASS = {name: i for i, name in enumerate(_CLASS_NAMES)}
+
+
+class _ClassTable(dict):
+    def __missing__(self, codepoint):
+        # Non-ASCII characters are only valid inside literals and comments
+        return _CLASS['OTHER']
+
+
+def _class_table():
+    table = _ClassTable()
+    for codepoint in range(128):
+        char = chr(codepoint)
+        if char in _CLASS:
+            name = char
+        elif char in 'eEpP':
+            name = 'E'
+        elif char == 'L':
+            name = 'L'
+        elif char.isalpha() or char == '_':
+            name = 'LETTER'
+        elif char.isdigit():
+            name = 'DIGIT'
+        elif char == '\n':
+            name = 'NEWLINE'
+        elif char in ' \t\r\f\v':
+            name = 'SPACE'
+        else:
+            name = {'"': 'DQUOTE', "'": 'SQUOTE', '\\': 'BACKSLASH'}.get(char, 'OTHER')
+        table[codepoint] = _CLASS[name]
+    return table
+
+
+CLASS_TABLE = _class_table()
+DEAD = -1
+
+
+def _build_dfa():
+    transitions = []
+    accepts = []
+    errors = {}
+
+    def state(accept=None, error=None):
+        transitions.append([DEAD] * len(_CLASS_NAMES))
+        accepts.append(accept)
+        if error:
+            errors[len(transitions) - 1] = error
+        return len(transitions) - 1
+
+    def on(source, classes, target):
+        for name in classes:
+            transitions[source][_CLASS[name]] = target
+
+    everything = _CLASS_NAMES
+    start = state()
+
+    # Operators and punctuation: one state per trie node
+    trie = {'': start}
+    for spelling in _SPELLINGS:
+        for length in range(1, len(spelling) + 1):
+            prefix = spelling[:length]
+            if prefix not in trie:
+                canonical = DIGRAPHS.get(prefix, prefix)
+                kind = None
+                if prefix in _SPELLINGS:
+                    kind = 'PUNCTUATION' if canonical in PUNCTUATION else 'OPERATOR'
+                trie[prefix] = state(kind)
+                on(trie[prefix[:-1]], prefix[-1], trie[prefix])
+
+    # Whitespace
+    space = state(SKIP)
+    on(start, ['SPACE', 'NEWLINE'], space)
+    on(space, ['SPACE', 'NEWLINE'], space)
+
+    # Comments, branching off the '/' operator state
+    line_comment = state(SKIP)
+    on(trie['/'], '/', line_comment)
+    on(line_comment, [name for name in everything if name != 'NEWLINE'], line_comment)
+    block = state(error='Unterminated comment')
+    block_star = state(error='Unterminated comment')
+    block_end = state(SKIP)
+    on(trie['/'], '*', block)
+    on(block, everything, block)
+    on(block, '*', block_star)
+    on(block_star, everything, block)
+    on(block_star, '*', block_star)
+    on(block_star, '/', block_end)
+
+    # Identifiers and keywords; L may start a wide literal
+    identifier_chars = ['LETTER', 'E', 'L', 'DIGIT']
+    identifier = state('IDENTIFIER')
+    wide_prefix = state('IDENTIFIER')
+    on(start, ['LETTER', 'E'], identifier)
+    on(start, ['L'], wide_prefix)
+    on(identifier, identifier_chars, identifier)
+    on(wide_prefix, identifier_chars, identifier)
+
+    # Preprocessing numbers: a digit or a dot and a digit, then digits,
+    # letters, dots, and a sign right after an exponent letter
+    number = state('NUMBER')
+    exponent = state('NUMBER')
+    on(start, ['DIGIT'], number)
+    on(trie['.'], ['DIGIT'], number)
+    for source in (number, exponent):
+        on(source, ['LETTER', 'L', 'DIGIT', '.'], number)
+        on(source, ['E'], exponent)
+    on(exponent, '+-', number)
+
+    # String and character literals; an escaped newline continues the literal
+    for quote, kind, what in (('DQUOTE', 'STRING', 'string'), ('SQUOTE', 'CHAR', 'character constant')):
+        error = f'Unterminated {what}'
+        opening = state(error=error)
+        body = state(error=error)
+        escape = state(error=error)
+        closing = state(kind)
+        on(start, [quote], opening)
+        on(wide_prefix, [quote], opening)
+        plain = [name for name in everything if name not in (quote, 'BACKSLASH', 'NEWLINE')]
+        on(opening, plain, body)
+        on(opening, ['BACKSLASH'], escape)
+        on(body, plain, body)
+        on(body, ['BACKSLASH'], escape)
+        on(escape, everything, body)
+        on(body, [quote], closing)
+        if kind == 'STRING':
+            on(opening, [quote], closing)
+        else:
+            errors[opening] = 'Empty character constant'
+
+    return start, transitions, accepts, errors
+
+
+START, TRANSITIONS, ACCEPTS, ERRORS = _build_dfa()
+# Kinds whose text may span lines
+_MULTILINE = (SKIP, 'STRING', 'CHAR')
+
+
+def remove_preprocessor_directives(code):
+    # Blank the lines instead of dropping them so token lines match the source
+    return '\n'.join('' if line.lstrip().startswith('#') else line for line in code.split('\n'))
+
+
 class Token:
     def __init__(self, type, value, line, column):
         self.type = type
@@ -14,109 +206,83 @@ class Tokenizer:
         self.pos = 0
         self.line = 1
         self.column = 0  # Start at 0 to match character positions
-        self.keywords = {
-            'int', 'char', 'float', 'double', 'void', 'if', 'else', 'while', 'for',
-            'return', 'struct', 'typedef', 'switch', 'case', 'default', 'break', 'continue'
-        }
-        self.operators = {
-            '+', '-', '*', '/', '%', '=', '==', '!=', '<', '>', '<=', '>=', '&&', '||',
-            '!', '&', '|', '^', '<<', '>>', '+=', '-=', '*=', '/=', '%=', '&=', '|=', '^=',
-            '<<=', '>>=', '->', '.', '++', '--'
-        }
 
     def tokenize(self):
+        code = self.code
+        length = len(code)
+        classes = code.translate(CLASS_TABLE).encode('latin-1')
+        transitions, accepts = TRANSITIONS, ACCEPTS
         tokens = []
-        while self.pos < len(self.code):
-            char = self.code[self.pos]
-            
-            # Skip whitespace
-            if char.isspace():
-                if char == '\n':
-                    self.line += 1
-                    self.column = 0
-                else:
-                    self.column += 1
-                self.pos += 1
-                continue
-            
-            # Identifiers and keywords
-            if char.isalpha() or char == '_':
-                start_column = self.column
-                value = self._read_identifier()
-                token_type = 'KEYWORD' if value in self.keywords else 'IDENTIFIER'
-                tokens.append(Token(token_type, value, self.line, start_column))
-                continue
-            
-            # Numbers
-            if char.isdigit():
-                start_column = self.column
-                value = self._read_number()
-                tokens.append(Token('NUMBER', value, self.line, start_column))
-                continue
-            
-            # Operators and punctuation
-            if char in self.operators or char in '();,{}[]':
-                start_column = self.column
-                value = self._read_operator_or_punctuation()
-                token_type = 'OPERATOR' if value in self.operators else 'PUNCTUATION'
-                tokens.append(Token(token_type, value, self.line, start_column))
-                continue
-            
-            # Strings
-            if char == '"':
-                start_column = self.column
-                value = self._read_string()
-                tokens.append(Token('STRING', value, self.line, start_column))
-                continue
-            
-            # Handle unexpected characters
-            raise ValueError(f"Unexpected character '{char}' at line {self.line}, column {self.column}")
-        
+        append = tokens.append
+        line = self.line
+        line_start = self.pos - self.column
+        pos = self.pos
+        while pos < length:
+            # Run the DFA until it dies; almost every token ends in an
+            # accepting state, otherwise back off to the last one passed
+            state = START
+            end = pos
+            while end < length:
+                next_state = transitions[state][classes[end]]
+                if next_state == DEAD:
+                    break
+                state = next_state
+                end += 1
+            kind = accepts[state]
+            if kind is None:
+                # Inside an unterminated literal or comment there's nothing to back off to
+                if state not in ERRORS:
+                    end, kind = self._last_accept(classes, pos, end)
+                if kind is None:
+                    self.line, self.column = line, pos - line_start
+                    raise ValueError(self._error(state, code[pos]))
+
+            if kind in _MULTILINE:
+                newlines = code.count('\n', pos, end)
+                if newlines:
+                    if kind == SKIP:
+                        line += newlines
+                        line_start = code.rfind('\n', pos, end) + 1
+                        pos = end
+                        continue
+                    token_line, token_column = line, pos - line_start
+                    line += newlines
+                    line_start = code.rfind('\n', pos, end) + 1
+                    append(Token(kind, code[pos:end], token_line, token_column))
+                    pos = end
+                    continue
+                if kind == SKIP:
+                    pos = end
+                    continue
+
+            value = code[pos:end]
+            if kind == 'IDENTIFIER':
+                if value in KEYWORDS:
+                    kind = 'KEYWORD'
+            elif kind == 'NUMBER':
+                if not _NUMBER_RE.fullmatch(value):
+                    self.line, self.column = line, pos - line_start
+                    raise ValueError(f"Invalid number '{value}' at line {line}, column {pos - line_start}")
+            elif value in DIGRAPHS:
+                value = DIGRAPHS[value]
+            append(Token(kind, value, line, pos - line_start))
+            pos = end
+
+        self.pos, self.line, self.column = pos, line, pos - line_start
         tokens.append(Token('EOF', '', self.line, self.column))
         return tokens
 
-    def _read_identifier(self):
-        start = self.pos
-        while self.pos < len(self.code) and (self.code[self.pos].isalnum() or self.code[self.pos] == '_'):
-            self.pos += 1
-            self.column += 1
-        return self.code[start:self.pos]
-
-    def _read_number(self):
-        start = self.pos
-        while self.pos < len(self.code) and (self.code[self.pos].isdigit() or self.code[self.pos] == '.'):
-            self.pos += 1
-            self.column += 1
-        return self.code[start:self.pos]
-
-    def _read_operator_or_punctuation(self):
-        start = self.pos
-        # Only look for multi-character operators, not punctuation
-        if self.pos + 1 < len(self.code):
-            candidate = self.code[self.pos:self.pos + 2]
-            if candidate in self.operators:
-                self.pos += 2
-                self.column += 2
-                return candidate
-        # Single character operator or punctuation
-        char = self.code[self.pos]
-        self.pos += 1
-        self.column += 1
-        return char
-
-    def _read_string(self):
-        start = self.pos
-        self.pos += 1  # Skip opening quote
-        self.column += 1
-        while self.pos < len(self.code):
-            if self.code[self.pos] == '"' and self.code[self.pos - 1] != '\\':
-                self.pos += 1
-                self.column += 1
-                return self.code[start:self.pos]
-            if self.code[self.pos] == '\n':
-                self.line += 1
-                self.column = 0
-            else:
-                self.column += 1
-            self.pos += 1
-        raise ValueError(f"Unterminated string at line {self.line}, column {self.column}")
\ No newline at end of file
+    def _last_accept(self, classes, pos, end):
+        """(end, kind) of the longest accepted prefix of code[pos:end], or (pos, None)."""
+        state = START
+        last = (pos, None)
+        for i in range(pos, end):
+            state = TRANSITIONS[state][classes[i]]
+            if ACCEPTS[state] is not None:
+                last = (i + 1, ACCEPTS[state])
+        return last
+
+    def _error(self, state, char):
+        if state in ERRORS:
+            return f"{ERRORS[state]} at line {self.line}, column {self.column}"
+        return f"Unexpected character '{char}' at line {self.line}, column {self.column}"
@@ -0,0 +1,146 @@
+import difflib
+import hashlib
+import json
+
+from layout import layout_tree
+from lexer import Tokenizer, remove_preprocessor_directives
+from parser import Parser
+from wire import TOKEN_FORMATS, encode_tokens
+
+# Per-connection state for the live-editing WebSocket.
+#
+# A session keeps the last source, tokens and AST. Clients send text edits
+# as character ranges; after each batch of edits the session re-lexes and
+# re-parses (both single linear passes) and replies with only what changed:
+# the token range that differs, the top-level AST nodes that differ, and a
+# re-rendered SVG for each changed top-level node. Unchanged top-level
+# subtrees are recognised by a structural hash and never re-rendered.
+
+
+class SessionError(Exception):
+    pass
+
+
+def node_to_json(node):
+    return {
+        'type': node.node_type,
+        'value': node.value,
+        'children': [node_to_json(child) for child in node.children if child is not None]
+    }
+
+
+class LiveSession:
+    def __init__(self, token_format='rows'):
+        if token_format not in TOKEN_FORMATS:
+            raise SessionError(f"Unknown token format: {token_format}")
+        self.token_format = token_format
+        self.source = ''
+        self.tokens = []
+        self.ast = None
+        self.keys = []
+        self.version = 0
+
+    def handle(self, message):
+        kind = message.get('type')
+        if kind == 'open':
+            self.source = message.get('code', '')
+            return self._snapshot()
+        if kind == 'edit':
+            edits = message.get('edits', [message])
+            for edit in edits:
+                self._apply(edit)
+            return self._update()
+        raise SessionError(f"Unknown message type: {kind}")
+
+    def _apply(self, edit):
+        try:
+            start = int(edit['start'])
+            end = int(edit.get('end', start))
+            text = edit.get('text', '')
+        except (KeyError, TypeError, ValueError):
+            raise SessionError("Edits need integer 'start'/'end' offsets and a 'text' string")
+        if not 0 <= start <= end <= len(self.source):
+            raise SessionError(f"Edit range {start}..{end} outside source of length {len(self.source)}")
+        self.source = self.source[:start] + text + self.source[end:]
+
+    def _analyse(self):
+        tokens = Tokenizer(remove_preprocessor_directives(self.source)).tokenize()
+        ast = Parser(tokens, collect_symbols=False).parse()
+        keys = [self._key(child) for child in ast.children]
+        return tokens, ast, keys
+
+    def _key(self, node):
+        data = json.dumps(node_to_json(node), separators=(',', ':'))
+        return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+    def _region(self, index, node):
+        return {'index': index, 'svg': layout_tree(node).to_svg()}
+
+    def _snapshot(self):
+        try:
+            self.tokens, self.ast, self.keys = self._analyse()
+        except (ValueError, RecursionError) as e:
+            return {'type': 'error', 'version': self.version, 'error': str(e)}
+        self.version += 1
+        return {
+            'type': 'snapshot',
+            'version': self.version,
+            'tokens': encode_tokens(self.tokens, self.token_format),
+            'ast': node_to_json(self.ast),
+            'regions': [self._region(i, child) for i, child in enumerate(self.ast.children)]
+        }
+
+    def _update(self):
+        if self.ast is None:
+            return self._snapshot()
+        try:
+            tokens, ast, keys = self._analyse()
+        except (ValueError, RecursionError) as e:
+            # Keep the last good AST while the user is mid-edit
+            return {'type': 'error', 'version': self.version, 'error': str(e)}
+
+        token_delta = self._token_delta(self.tokens, tokens)
+        ast_delta = []
+        regions = []
+        matcher = difflib.SequenceMatcher(None, self.keys, keys, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == 'equal':
+                continue
+            ast_delta.append({
+                'op': tag,
+                'old': [i1, i2],
+                'new': [j1, j2],
+                'nodes': [node_to_json(child) for child in ast.children[j1:j2]]
+            })
+            regions.extend(self._region(j, ast.children[j]) for j in range(j1, j2))
+
+        self.tokens, self.ast, self.keys = tokens, ast, keys
+        self.version += 1
+        return {
+            'type': 'delta',
+            'version': self.version,
+            'tokens': token_delta,
+            'ast': ast_delta,
+            'regions': regions
+        }
+
+    def _token_delta(self, old, new):
+        limit = min(len(old), len(new))
+        prefix = 0
+        while prefix < limit and (old[prefix].type, old[prefix].value, old[prefix].line, old[prefix].column) == \
+                (new[prefix].type, new[prefix].value, new[prefix].line, new[prefix].column):
+            prefix += 1
+        # The unchanged tail may have moved down or up by whole lines
+        line_shift = new[-1].line - old[-1].line
+        suffix = 0
+        while suffix < limit - prefix:
+            a, b = old[-1 - suffix], new[-1 - suffix]
+            if (a.type, a.value, a.line + line_shift, a.column) != (b.type, b.value, b.line, b.column):
+                break
+            suffix += 1
+        return {
+            'start': prefix,
+            'old_end': len(old) - suffix,
+            'line_shift': line_shift,
+            'replacement': encode_tokens(new[prefix:len(new) - suffix], self.token_format)
+        }
@@ -1,15 +1,16 @@
-from flask import Flask, request, jsonify
-import base64
-import os
-import tempfile
+from flask import Flask, request, jsonify, send_file
+import hashlib
 from flask_cors import CORS
 from graphviz import Digraph
 from lexer import tokenize
 from parser import parse_root
+from renders import RenderStore, render_id
 
 app = Flask(__name__)
 CORS(app)
 
+render_store = RenderStore()
+
 def remove_preprocessor_directives(code):
     lines = code.split('\n')
     filtered_lines = [line for line in lines if not line.lstrip().startswith('#')]
@@ -65,15 +66,26 @@ def parse():
         if isinstance(result, dict) and 'error' in result:
             return jsonify(result)
         dot = generate_dot(result)
-        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as temp_image:
-            temp_image_path = temp_image.name
-            dot.render(temp_image_path, format='png', view=False)
-            with open(temp_image_path, 'rb') as image_file:
-                image_data = base64.b64encode(image_file.read()).decode('utf-8')
-            os.unlink(temp_image_path)
-        return jsonify({'image': f'data:image/png;base64,{image_data}'})
+        rid = render_id(hashlib.sha256(code.encode('utf-8')).hexdigest(), 'legacy', 'png')
+        if not render_store.lookup(rid):
+            # Render into the store; the PNG is streamed by /image/<render-id>
+            scratch = render_store.scratch_path(rid, '')
+            image_path = dot.render(scratch, format='png', view=False, cleanup=True)
+            render_store.commit(rid, 'png', image_path)
+        metadata = render_store.metadata(rid)
+        if metadata is None:
+            return jsonify({'error': 'Render was evicted before it could be served; retry'})
+        return jsonify(metadata)
     except Exception as e:
         return jsonify({'error': f'Parsing or rendering failed: {str(e)}'})
 
+@app.route('/image/<rid>', methods=['GET'])
+def image(rid):
+    stored = render_store.lookup(rid)
+    if not stored:
+        return jsonify({'error': 'Unknown render id'}), 404
+    path, mimetype = stored
+    return send_file(path, mimetype=mimetype, max_age=86400)
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
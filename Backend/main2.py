@@ -1,94 +1,254 @@
 #latest version
-from flask import Flask, request, jsonify
-import base64
+from flask import Flask, Response, request, jsonify, send_file, stream_with_context
+import functools
+import hashlib
 import os
 import subprocess
+import time
 from flask_cors import CORS
 from graphviz import Digraph
-from lexer import Tokenizer
+from lexer import Tokenizer, remove_preprocessor_directives
 from parser import Parser
+from layout import layout_tree
+from astjson import ast_to_compact
+from tiles import PyramidCache, TilePyramid, TileError, TileRenderError
+from renders import RenderStore, render_id, render_with_deadline, PRUNE_DEPTH
+from wire import TOKEN_FORMATS, encode_tokens
+from admission import AdmissionController, Rejected, estimate_cost
+from resultcache import ResultCache, cache_render, restore_render
+from singleflight import SingleFlight
+from project import MAX_PROJECT_BYTES, Project, ProjectError, ingest_archive
+from symbols import SYMBOL_KINDS, SymbolIndex
+from callgraph import CallGraph, CallGraphBuilder
+from query import QueryError, QueryIndex, QueryIndexCache
+from astdiff import ASTDiff
+from dotcache import DotFragmentCache
+from asttext import ast_to_string, iter_ast_chunks
+from snapshot import SnapshotStore
+from aststats import LevelArrays, compute_stats
+from profiling import PROFILE_TOKEN, ProfileStore, authorized, profile_urls
 import logging
 
 app = Flask(__name__)
-CORS(app, resources={r"/parse": {"origins": "*"}})
+CORS(app, resources={r"/parse": {"origins": "*"}, r"/image/*": {"origins": "*"}, r"/tiles/*": {"origins": "*"},
+                     r"/projects*": {"origins": "*"}, r"/symbols/*": {"origins": "*"},
+                     r"/callgraph": {"origins": "*"}, r"/query": {"origins": "*"},
+                     r"/diff": {"origins": "*"}, r"/ast": {"origins": "*"},
+                     r"/stats": {"origins": "*"}, r"/profiles/*": {"origins": "*"}})
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-def remove_preprocessor_directives(code):
-    lines = code.split('\n')
-    filtered_lines = []
-    for line in lines:
-        stripped_line = line.lstrip()
-        if not stripped_line.startswith('#'):
-            filtered_lines.append(line)
-        else:
-            logger.debug(f"Removed preprocessor directive: {stripped_line}")
-    filtered_code = '\n'.join(filtered_lines)
-    if not filtered_code.strip():
-        logger.warning("Code only contains preprocessor directives")
-    return filtered_code
+RENDERERS = ('dot', 'tidy', 'tiles', 'json')
+RENDER_BUDGET = float(os.environ.get('AST_RENDER_BUDGET', 20))
+PROJECT_WORKERS = int(os.environ.get('AST_PROJECT_WORKERS', os.cpu_count() or 1))
+
+render_store = RenderStore()
+admission = AdmissionController(
+    max_concurrent=int(os.environ.get('AST_MAX_RENDERS', 4)),
+    max_queued_cost=int(os.environ.get('AST_MAX_QUEUED_COST', 200000))
+)
+result_cache = ResultCache()
+inflight = SingleFlight()
+callgraphs = CallGraphBuilder()
+query_indexes = QueryIndexCache()
+dot_fragments = DotFragmentCache()
+snapshots = SnapshotStore()
+pyramids = PyramidCache()
+profiles = ProfileStore() if PROFILE_TOKEN else None
+
+def source_hash(code):
+    return hashlib.sha256(code.encode('utf-8')).hexdigest()[:32]
+
+def request_key(code, token_format, renderer, with_layout):
+    """Cache key for a /parse request: filtered source plus output options."""
+    return render_id(source_hash(remove_preprocessor_directives(code).rstrip()), token_format, renderer, with_layout)
+
+def cached_response(key):
+    """Return a cached /parse response whose image is still available, or None."""
+    response = result_cache.get_json(f'parse:{key}')
+    if response is None:
+        return None
+    if 'render_id' in response and not restore_render(result_cache, render_store, response['render_id']):
+        return None
+    if 'tiles' in response and not TilePyramid(response['tiles']['hash']).exists():
+        return None
+    return response
 
-def generate_dot(ast):
+def generate_dot(ast, max_depth=None, source_hash=None):
     dot = Digraph(
         graph_attr={'rankdir': 'TB', 'dpi': '300', 'size': '8,10', 'nodesep': '0.5', 'ranksep': '1.0'},
         node_attr={'shape': 'box', 'style': 'filled', 'fillcolor': 'lightblue', 'fontsize': '14', 'font': 'Helvetica'},
         edge_attr={'color': 'black'}
     )
-    def add_node(node, parent_id=None):
-        node_id = str(id(node))
-        label = node.node_type
-        if node.value:
-            label += f": {node.value}"
-        dot.node(node_id, label)
-        if parent_id:
-            dot.edge(parent_id, node_id)
-        for child in node.children:
-            add_node(child, node_id)
-    add_node(ast)
-    return dot
-
-def ast_to_string(node, depth=0):
-    result = "  " * depth + str(node) + "\n"
-    for child in node.children:
-        result += ast_to_string(child, depth + 1)
-    return result
-
-def parse_code(code):
-    code = remove_preprocessor_directives(code).strip()
+    # Unchanged subtrees are pasted from the fragment cache instead of re-emitted
+    return dot_fragments.emit(dot, ast, max_depth, source_hash)
+
+def count_nodes(node):
+    count = 0
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        count += 1
+        stack.extend(child for child in current.children if child is not None)
+    return count
+
+def parse_code(code, token_format='rows'):
+    # Directive lines are blanked, not dropped, and leading lines kept, so
+    # token and symbol positions are those of the submitted source
+    code = remove_preprocessor_directives(code).rstrip()
     logger.debug(f"Filtered Code: {repr(code)}")
-    if not code:
+    if not code.strip():
         logger.error("No valid code provided after filtering")
         return {'error': 'No valid code provided after filtering'}
 
-    tokenizer = Tokenizer(code)
-    tokens = tokenizer.tokenize()
+    code_hash = source_hash(code)
+    # Large files parsed before (by any worker, or before a restart) come
+    # back from their memory-mapped snapshot instead of being parsed again
+    snapshot = snapshots.load(code_hash, code)
+    if snapshot is not None:
+        logger.debug(f"Loaded snapshot of {len(snapshot)} nodes for {code_hash}")
+        tokens = snapshot.tokens()
+    else:
+        tokenizer = Tokenizer(code)
+        tokens = tokenizer.tokenize()
     logger.debug("Tokens:")
     for i, token in enumerate(tokens):
         logger.debug(f"  {i}: {token.type} = '{token.value}' (Line {token.line}, Col {token.column})")
 
     try:
-        parser = Parser(tokens)
-        ast = parser.parse()
-        logger.debug(f"AST:\n{ast_to_string(ast)}")
+        if snapshot is not None:
+            ast = snapshot.to_ast()
+            records = snapshot.symbols()
+            node_count = len(snapshot)
+        else:
+            parser = Parser(tokens)
+            ast = parser.parse()
+            records = parser.symbols
+            node_count = count_nodes(ast)
+            try:
+                snapshots.save(code_hash, code, ast, tokens, records, node_count)
+            except OSError as e:
+                logger.warning(f"Could not write AST snapshot: {e}")
+        ast_text = ast_to_string(ast)
+        logger.debug(f"AST:\n{ast_text}")
         return {
-            'tokens': [
-                {
-                    "index": i,
-                    "type": token.type,
-                    "value": token.value,
-                    "line": token.line,
-                    "column": token.column
-                }
-                for i, token in enumerate(tokens)
-            ],
-            'ast': ast_to_string(ast).strip(),
-            'ast_node': ast
+            'tokens': encode_tokens(tokens, token_format),
+            'ast': ast_text,
+            'ast_node': ast,
+            'hash': code_hash,
+            'token_count': len(tokens),
+            'node_count': node_count,
+            'symbols': SymbolIndex.from_records(records)
         }
     except Exception as e:
         logger.error(f"Parsing Error: {str(e)}")
         return {'error': f'Parsing failed: {str(e)}'}
 
+def render_evicted(rid):
+    # Another worker's renders pushed this one out of the store before it was served
+    logger.error(f"Render {rid} was evicted before it could be served")
+    return {'error': 'Render was evicted before it could be served; retry'}, 503
+
+def render_result(result, renderer, budget=RENDER_BUDGET):
+    """Render a parse_code result; returns (payload, status)."""
+    # Plain AST views can skip Graphviz and use the built-in tidy-tree layout
+    if renderer == 'tidy':
+        layout = layout_tree(result['ast_node'])
+        rid = render_id(result['hash'], 'tidy', 'svg')
+        if not render_store.lookup(rid):
+            render_store.write(rid, 'svg', layout.to_svg())
+            cache_render(result_cache, render_store, rid)
+        logger.debug(f"Laid out {len(layout)} nodes without Graphviz")
+        metadata = render_store.metadata(rid)
+        if metadata is None:
+            return render_evicted(rid)
+        return {'layout': layout.to_json(), **metadata}, 200
+
+    # Large trees: lay out once and let the client fetch tiles for its viewport
+    if renderer == 'tiles':
+        tiles = TilePyramid(result['hash']).build(result['ast_node'])
+        logger.debug(f"Tile pyramid {tiles['hash']} with max zoom {tiles['max_zoom']}")
+        return {'tiles': tiles}, 200
+
+    rid = render_id(result['hash'], 'dot', 'full')
+    if restore_render(result_cache, render_store, rid):
+        metadata = render_store.metadata(rid)
+        if metadata is not None:
+            logger.debug(f"Reusing stored render {rid}")
+            return {'degradation': 'full', **metadata}, 200
+
+    dot = generate_dot(result['ast_node'], source_hash=result['hash'])
+    logger.debug(f"DOT content:\n{dot.source}")
+
+    # Render straight into the render store, degrading to cheaper output
+    # rather than letting one huge AST hold a worker past its deadline
+    try:
+        rid, level = render_with_deadline(
+            render_store, result['hash'], dot.source,
+            lambda: generate_dot(result['ast_node'], max_depth=PRUNE_DEPTH, source_hash=result['hash']).source,
+            budget
+        )
+    except subprocess.CalledProcessError as e:
+        logger.error(f"Failed to render PNG with dot command: {e.stderr}")
+        return {'error': 'Failed to render AST image'}, 500
+    except FileNotFoundError:
+        logger.error("dot command not found. Ensure Graphviz is installed and in PATH.")
+        return {'error': 'Graphviz dot command not found'}, 500
+
+    if rid is None:
+        logger.warning(f"All renders missed the {budget}s deadline; serving text AST only")
+        return {'degradation': level}, 200
+    logger.debug(f"Rendered {level} image using dot command as render {rid}")
+    cache_render(result_cache, render_store, rid)
+    metadata = render_store.metadata(rid)
+    if metadata is None:
+        return render_evicted(rid)
+    return {'degradation': level, **metadata}, 200
+
+def build_response(code, token_format, renderer, with_layout, budget, key):
+    """Parse and render one /parse request; returns (body, status, headers)."""
+    result = parse_code(code, token_format)
+    if 'error' in result:
+        return result, 400, {}
+    # The symbol index is stored next to the cached response, by source hash
+    result_cache.put_json(f"symbols:{result['hash']}", result['symbols'].to_json())
+    symbols_url = f"/symbols/{result['hash']}"
+
+    # Client-side rendering: ship the tree itself and skip dot entirely
+    if renderer == 'json':
+        response = {
+            'tokens': result['tokens'],
+            'ast': result['ast'],
+            'tree': ast_to_compact(result['ast_node'], with_layout=with_layout),
+            'symbols_url': symbols_url
+        }
+        result_cache.put_json(f'parse:{key}', response)
+        return response, 200, {}
+
+    # Cost is known once tokens and AST exist, before any DOT is generated
+    cost = estimate_cost(result['token_count'], result['node_count'])
+    try:
+        with admission.admit(cost):
+            payload, status = render_result(result, renderer, budget)
+    except Rejected as e:
+        logger.warning(f"Rejected render of cost {cost}; retry after {e.retry_after}s")
+        body = {'error': 'Server busy, retry later', 'retry_after': e.retry_after}
+        return body, 429, {'Retry-After': str(e.retry_after)}
+    if status != 200:
+        return payload, status, {}
+
+    response = {
+        'tokens': result['tokens'],
+        'ast': result['ast'],
+        'symbols_url': symbols_url,
+        **payload
+    }
+    # Degraded renders depend on this request's deadline; don't hand them to others
+    if payload.get('degradation', 'full') == 'full':
+        result_cache.put_json(f'parse:{key}', response)
+    return response, 200, {}
+
 @app.route('/parse', methods=['POST'])
 def parse():
     try:
@@ -105,46 +265,362 @@ def parse():
             return jsonify({'error': 'No code provided'}), 400
         
         logger.debug(f"Received code: {repr(code)}")
+
+        token_format = data.get('token_format', 'rows')
+        if token_format not in TOKEN_FORMATS:
+            logger.error(f"Unknown token format: {token_format}")
+            return jsonify({'error': f'Unknown token format: {token_format}'}), 400
         
-        result = parse_code(code)
-        if 'error' in result:
-            return jsonify(result), 400
-        
-        dot = generate_dot(result['ast_node'])
-        logger.debug(f"DOT content:\n{dot.source}")
-        
-        # Save the DOT file
-        dot_path = 'ast.dot'
-        with open(dot_path, 'w') as dot_file:
-            dot_file.write(dot.source)
-        logger.debug("Saved DOT file as ast.dot")
-
-        # Use the dot command to render the PNG
-        png_path = 'ast-rendered.png'
+        renderer = data.get('renderer', 'dot')
+        if renderer not in RENDERERS:
+            logger.error(f"Unknown renderer: {renderer}")
+            return jsonify({'error': f'Unknown renderer: {renderer}'}), 400
+
         try:
-            subprocess.run(['dot', '-Tpng', dot_path, '-o', png_path], check=True)
-            logger.debug("Rendered PNG using dot command as ast-rendered.png")
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Failed to render PNG with dot command: {e}")
-            return jsonify({'error': 'Failed to render AST image'}), 500
-        except FileNotFoundError:
-            logger.error("dot command not found. Ensure Graphviz is installed and in PATH.")
-            return jsonify({'error': 'Graphviz dot command not found'}), 500
-
-        # Read and encode the PNG
-        with open(png_path, 'rb') as image_file:
-            image_data = base64.b64encode(image_file.read()).decode('utf-8')
-            logger.debug(f"Base64 image length: {len(image_data)}")
-        
-        return jsonify({
-            'tokens': result['tokens'],
-            'ast': result['ast'],
-            'image': f'data:image/png;base64,{image_data}'
-        })
+            budget = min(float(data.get('deadline', RENDER_BUDGET)), RENDER_BUDGET)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'deadline must be a number of seconds'}), 400
+
+        key = request_key(code, token_format, renderer, bool(data.get('layout')))
+        if authorized(request.headers, request.args):
+            # Profiled requests skip the cache and coalescing so the pipeline really runs
+            (body, status, headers), profile_id = profiles.run(
+                '/parse', build_response, code, token_format, renderer, bool(data.get('layout')), budget, key
+            )
+            logger.info(f"Profiled /parse as {profile_id}")
+            return jsonify({**body, 'profile': profile_urls(profile_id)}), status, {**headers, 'X-Profile-Id': profile_id}
+
+        # Identical requests from any worker are answered from the shared cache
+        cached = cached_response(key)
+        if cached is not None:
+            logger.debug(f"Serving cached response {key}")
+            return jsonify(cached)
+
+        # Concurrent duplicates (a class parsing the same example) wait for
+        # the first request's answer instead of repeating the work
+        (body, status, headers), shared = inflight.do(
+            f'{key}:{budget}', build_response, code, token_format, renderer, bool(data.get('layout')), budget, key
+        )
+        if shared:
+            logger.debug(f"Coalesced duplicate request {key}")
+        return jsonify(body), status, headers
     
     except Exception as e:
         logger.error(f"Parsing or rendering failed: {str(e)}")
         return jsonify({'error': f'Parsing or rendering failed: {str(e)}'}), 500
 
+@functools.lru_cache(maxsize=256)
+def load_symbols(source_hash):
+    """Symbol index for a parsed source; raises LookupError if none is stored."""
+    names = result_cache.get_json(f'symbols:{source_hash}')
+    if names is None:
+        raise LookupError(source_hash)
+    return SymbolIndex(names)
+
+@app.route('/symbols/<source_hash>', methods=['GET'])
+def symbols(source_hash):
+    """Name-to-location lookups in the symbol index of a parsed source."""
+    try:
+        index = load_symbols(source_hash)
+    except LookupError:
+        return jsonify({'error': 'Unknown source hash; parse the code first'}), 404
+    name = request.args.get('name')
+    if name is None:
+        return jsonify({'hash': source_hash, 'count': len(index), 'symbols': index.to_json()})
+    kind = request.args.get('kind')
+    if kind is not None and kind not in SYMBOL_KINDS:
+        return jsonify({'error': f'Unknown symbol kind: {kind}'}), 400
+    return jsonify({'name': name, 'locations': index.lookup(name, kind)})
+
+def render_svg(rid, dot, what):
+    """Render a small DOT graph to SVG under `rid`, reusing a cached render; its metadata, or None on failure."""
+    if restore_render(result_cache, render_store, rid):
+        metadata = render_store.metadata(rid)
+        if metadata is not None:
+            return metadata
+    out_path = render_store.scratch_path(rid, '.svg')
+    try:
+        subprocess.run(['dot', '-Tsvg', '-o', out_path], input=dot.source,
+                       capture_output=True, text=True, check=True, timeout=RENDER_BUDGET)
+        render_store.commit(rid, 'svg', out_path)
+    except subprocess.CalledProcessError as e:
+        logger.error(f"Failed to render {what} with dot command: {e.stderr}")
+        return None
+    except subprocess.TimeoutExpired:
+        logger.error(f"{what.capitalize()} render exceeded {RENDER_BUDGET}s")
+        return None
+    except FileNotFoundError:
+        logger.error("dot command not found. Ensure Graphviz is installed and in PATH.")
+        return None
+    finally:
+        if os.path.exists(out_path):
+            os.unlink(out_path)
+    cache_render(result_cache, render_store, rid)
+    return render_store.metadata(rid)
+
+@app.route('/callgraph', methods=['POST'])
+def callgraph():
+    """Caller -> callee graph of the submitted code, as JSON, DOT or an SVG render."""
+    data = request.get_json(silent=True)
+    if not data or not data.get('code', '').strip():
+        return jsonify({'error': 'No code provided'}), 400
+    fmt = data.get('format', 'svg')
+    if fmt not in ('json', 'dot', 'svg'):
+        return jsonify({'error': f'Unknown call graph format: {fmt}'}), 400
+
+    code = remove_preprocessor_directives(data['code']).rstrip()
+    code_hash = source_hash(code)
+    graph_json = result_cache.get_json(f'callgraph:{code_hash}')
+    if graph_json is not None:
+        graph = CallGraph.from_json(graph_json)
+        stats = {'cached': True}
+    else:
+        # Only the AST is needed; none of parse_code's token and text encoding
+        snapshot = snapshots.load(code_hash, code)
+        try:
+            ast = snapshot.to_ast() if snapshot is not None else \
+                Parser(Tokenizer(code).tokenize(), collect_symbols=False).parse()
+        except ValueError as e:
+            logger.error(f"Parsing Error: {str(e)}")
+            return jsonify({'error': f'Parsing failed: {str(e)}'}), 400
+        # Functions whose subtree hash was seen before reuse their callee lists
+        graph, stats = callgraphs.build(ast, dot_fragments.child_hashes(ast, code_hash))
+        graph_json = graph.to_json()
+        result_cache.put_json(f'callgraph:{code_hash}', graph_json)
+    response = {'hash': code_hash, **graph_json, 'incremental': stats}
+
+    if fmt == 'dot':
+        response['dot'] = graph.to_dot().source
+    elif fmt == 'svg':
+        rid = render_id(code_hash, 'callgraph', 'svg')
+        metadata = render_svg(rid, graph.to_dot(), 'call graph')
+        if metadata is None:
+            return jsonify({'error': 'Failed to render call graph'}), 500
+        response.update(metadata)
+    return jsonify(response)
+
+@app.route('/query', methods=['POST'])
+def query():
+    """Run a selector such as `For:has(FunctionCall=printf)` over the code's AST."""
+    data = request.get_json(silent=True)
+    if not data or not data.get('code', '').strip():
+        return jsonify({'error': 'No code provided'}), 400
+    try:
+        limit = int(data.get('limit', 1000))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'limit must be an integer'}), 400
+
+    code = remove_preprocessor_directives(data['code']).rstrip()
+    code_hash = source_hash(code)
+    try:
+        # Indexes are kept per source, so repeated queries on one file skip the parse
+        index = query_indexes.get(code_hash, lambda: QueryIndex(Parser(Tokenizer(code).tokenize(), collect_symbols=False).parse()))
+        ids = index.select(data.get('selector', ''))
+    except QueryError as e:
+        return jsonify({'error': f'Invalid selector: {e}'}), 400
+    except ValueError as e:
+        logger.error(f"Parsing Error: {str(e)}")
+        return jsonify({'error': f'Parsing failed: {str(e)}'}), 400
+    return jsonify({
+        'hash': code_hash,
+        'selector': data['selector'],
+        'nodes': len(index),
+        'count': len(ids),
+        'truncated': len(ids) > limit,
+        'matches': [index.describe(i) for i in ids[:limit]]
+    })
+
+@app.route('/diff', methods=['POST'])
+def diff():
+    """Structural diff of two versions of a file: edit operations plus a highlighted render."""
+    data = request.get_json(silent=True)
+    if not data or not data.get('old', '').strip() or not data.get('new', '').strip():
+        return jsonify({'error': 'Both old and new code are required'}), 400
+    fmt = data.get('format', 'svg')
+    if fmt not in ('json', 'dot', 'svg'):
+        return jsonify({'error': f'Unknown diff format: {fmt}'}), 400
+
+    old = remove_preprocessor_directives(data['old']).rstrip()
+    new = remove_preprocessor_directives(data['new']).rstrip()
+    diff_key = hashlib.sha256(f'{source_hash(old)}:{source_hash(new)}'.encode('utf-8')).hexdigest()
+    try:
+        changes = ASTDiff(Parser(Tokenizer(old).tokenize(), collect_symbols=False).parse(),
+                          Parser(Tokenizer(new).tokenize(), collect_symbols=False).parse())
+    except ValueError as e:
+        logger.error(f"Parsing Error: {str(e)}")
+        return jsonify({'error': f'Parsing failed: {str(e)}'}), 400
+    response = {'hash': diff_key, **changes.to_json()}
+
+    if fmt == 'dot':
+        response['dot'] = changes.to_dot().source
+    elif fmt == 'svg':
+        rid = render_id(diff_key, 'diff', 'svg')
+        metadata = render_svg(rid, changes.to_dot(), 'diff')
+        if metadata is None:
+            return jsonify({'error': 'Failed to render diff'}), 500
+        response.update(metadata)
+    return jsonify(response)
+
+@app.route('/ast', methods=['POST'])
+def ast_text():
+    """Stream the indented text AST of the code as a chunked text/plain response."""
+    data = request.get_json(silent=True)
+    if not data or not data.get('code', '').strip():
+        return jsonify({'error': 'No code provided'}), 400
+    try:
+        max_depth = int(data['max_depth']) if data.get('max_depth') is not None else None
+        max_lines = int(data['max_lines']) if data.get('max_lines') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'max_depth and max_lines must be integers'}), 400
+
+    code = remove_preprocessor_directives(data['code']).rstrip()
+    try:
+        ast = Parser(Tokenizer(code).tokenize(), collect_symbols=False).parse()
+    except ValueError as e:
+        logger.error(f"Parsing Error: {str(e)}")
+        return jsonify({'error': f'Parsing failed: {str(e)}'}), 400
+    # No Content-Length, so the text goes out with chunked transfer encoding
+    # as it is produced rather than being built in memory first
+    return Response(stream_with_context(iter_ast_chunks(ast, max_depth, max_lines)), mimetype='text/plain')
+
+@app.route('/stats', methods=['POST'])
+def stats():
+    """Complexity metrics of the code's AST: type counts, depth, branching, subtree sizes, nesting."""
+    data = request.get_json(silent=True)
+    if not data or not data.get('code', '').strip():
+        return jsonify({'error': 'No code provided'}), 400
+
+    code = remove_preprocessor_directives(data['code']).rstrip()
+    code_hash = source_hash(code)
+    metrics = result_cache.get_json(f'stats:{code_hash}')
+    if metrics is not None:
+        return jsonify({'hash': code_hash, **metrics, 'cached': True})
+
+    start = time.perf_counter()
+    snapshot = snapshots.load(code_hash, code)
+    if snapshot is None:
+        try:
+            tokens = Tokenizer(code).tokenize()
+            # Symbols are collected so the snapshot also serves later /parse requests
+            parser = Parser(tokens)
+            ast = parser.parse()
+        except ValueError as e:
+            logger.error(f"Parsing Error: {str(e)}")
+            return jsonify({'error': f'Parsing failed: {str(e)}'}), 400
+        node_count = count_nodes(ast)
+        try:
+            if snapshots.save(code_hash, code, ast, tokens, parser.symbols, node_count):
+                snapshot = snapshots.load(code_hash, code)
+        except OSError as e:
+            logger.warning(f"Could not write AST snapshot: {e}")
+    if snapshot is not None:
+        # Type ids and parents come straight from the mapped node table
+        arrays = LevelArrays.from_snapshot(snapshot)
+    else:
+        arrays = LevelArrays.from_ast(ast)
+    flattened = time.perf_counter()
+    metrics = compute_stats(arrays)
+    logger.debug(f"Stats for {len(arrays)} nodes: {flattened - start:.3f}s to flatten, "
+                 f"{time.perf_counter() - flattened:.3f}s to compute")
+    result_cache.put_json(f'stats:{code_hash}', metrics)
+    return jsonify({'hash': code_hash, **metrics, 'cached': False})
+
+@app.route('/projects', methods=['POST'])
+def create_project():
+    """Parse every .c/.h file of an uploaded tar/zip archive; returns the manifest."""
+    # Checked before the form is parsed, which would read the whole body
+    if request.content_length is None:
+        return jsonify({'error': 'Content-Length required'}), 411
+    if request.content_length > MAX_PROJECT_BYTES:
+        return jsonify({'error': f'Upload exceeds {MAX_PROJECT_BYTES} bytes'}), 413
+    upload = request.files.get('archive')
+    if upload is None:
+        return jsonify({'error': "Upload the project as an 'archive' file field"}), 400
+    try:
+        manifest = ingest_archive(upload.read(), request.form.get('backend', 'parser'), PROJECT_WORKERS)
+    except ProjectError as e:
+        logger.error(f"Project ingestion failed: {e}")
+        return jsonify({'error': str(e)}), 400
+    logger.debug(f"Ingested project {manifest['project']}: {manifest['totals']}")
+    return jsonify(manifest)
+
+@app.route('/projects/<project_id>', methods=['GET'])
+def project_manifest(project_id):
+    try:
+        return jsonify(Project(project_id).manifest())
+    except ProjectError as e:
+        return jsonify({'error': str(e)}), 404
+
+@app.route('/projects/<project_id>/files/<path:name>', methods=['GET'])
+def project_file(project_id, name):
+    """Render one file of an ingested project from its stored AST."""
+    renderer = request.args.get('renderer', 'tidy')
+    if renderer not in RENDERERS:
+        return jsonify({'error': f'Unknown renderer: {renderer}'}), 400
+    try:
+        ast = Project(project_id).file_ast(name)
+    except ProjectError as e:
+        return jsonify({'error': str(e)}), 404
+
+    response = {'path': name, 'ast': ast_to_string(ast)}
+    if renderer == 'json':
+        response['tree'] = ast_to_compact(ast, with_layout=request.args.get('layout') == 'true')
+        return jsonify(response)
+    result = {'ast_node': ast, 'hash': render_id(project_id, name)}
+    cost = estimate_cost(0, count_nodes(ast))
+    try:
+        with admission.admit(cost):
+            payload, status = render_result(result, renderer)
+    except Rejected as e:
+        response = jsonify({'error': 'Server busy, retry later', 'retry_after': e.retry_after})
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 429
+    if status != 200:
+        return jsonify(payload), status
+    return jsonify({**response, **payload})
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return jsonify({'admission': admission.stats(), 'cache': result_cache.stats(), 'coalescing': inflight.stats(),
+                    'dot_fragments': dot_fragments.stats()})
+
+@app.route('/profiles/<name>', methods=['GET'])
+def profile(name):
+    # Profiles expose source details, so they're only served to token holders
+    if not authorized(request.headers, request.args):
+        return jsonify({'error': 'Unknown profile'}), 404
+    profile_id, _, kind = name.partition('.')
+    stored = profiles.lookup(profile_id, kind or 'json')
+    if not stored:
+        return jsonify({'error': 'Unknown profile'}), 404
+    path, mimetype = stored
+    return send_file(path, mimetype=mimetype, as_attachment=bool(kind), download_name=name)
+
+@app.route('/image/<rid>', methods=['GET'])
+def image(rid):
+    stored = restore_render(result_cache, render_store, rid)
+    if not stored:
+        return jsonify({'error': 'Unknown render id'}), 404
+    path, mimetype = stored
+    return send_file(path, mimetype=mimetype, max_age=86400)
+
+@app.route('/tiles/<source_hash>/<int:z>/<int:x>/<int:y>.png', methods=['GET'])
+def tile(source_hash, z, x, y):
+    try:
+        pyramid = pyramids.get(source_hash)
+        if pyramid is None:
+            return jsonify({'error': 'Unknown tile set'}), 404
+        path = pyramid.tile_path(z, x, y)
+    except TileRenderError as e:
+        logger.error(str(e))
+        return jsonify({'error': str(e)}), 500
+    except TileError as e:
+        logger.error(str(e))
+        return jsonify({'error': str(e)}), 404
+    except FileNotFoundError:
+        logger.error("neato command not found. Ensure Graphviz is installed and in PATH.")
+        return jsonify({'error': 'Graphviz neato command not found'}), 500
+    return send_file(path, mimetype='image/png', max_age=86400)
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5050)
\ No newline at end of file
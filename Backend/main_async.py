@@ -0,0 +1,276 @@
+# ASGI variant of main2.py
+#
+# Same /parse pipeline and response shape, but nothing blocks the event loop:
+# tokenize/parse/DOT generation run in a process pool and the Graphviz render
+# is awaited via asyncio.create_subprocess_exec, so one process can keep many
+# slow renders in flight. Renders go through main2's admission control and
+# the same deadline ladder: a dot process that overruns its share of the
+# budget, or whose request is cancelled, is killed and reaped before the
+# next cheaper level is tried. Run with `hypercorn main_async:app` or directly.
+import asyncio
+import contextlib
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from quart import Quart, request, jsonify, send_file, websocket
+from quart_cors import cors
+from layout import layout_tree
+from livesession import LiveSession, SessionError
+from astjson import ast_to_compact
+from admission import Rejected, estimate_cost
+from main2 import RENDERERS, RENDER_BUDGET, admission, parse_code, generate_dot, pyramids, render_store
+from renders import DEGRADATION_LADDER, PRUNE_DEPTH, TEXT_ONLY, known_overrun, record_overrun, render_id
+from tiles import TilePyramid, TileError, TileRenderError
+from wire import TOKEN_FORMATS
+
+app = cors(Quart(__name__), allow_origin="*")
+
+logger = logging.getLogger(__name__)
+
+PARSE_WORKERS = int(os.environ.get('AST_PARSE_WORKERS', os.cpu_count() or 1))
+
+executor = None
+
+class RenderError(Exception):
+    pass
+
+def prepare(code, token_format, renderer, with_layout=False):
+    """CPU-bound half of the pipeline; runs in a worker process."""
+    result = parse_code(code, token_format)
+    if 'error' in result:
+        return result
+    ast = result.pop('ast_node')
+    if renderer == 'tidy':
+        layout = layout_tree(ast)
+        rid = render_id(result['hash'], 'tidy', 'svg')
+        if not render_store.lookup(rid):
+            render_store.write(rid, 'svg', layout.to_svg())
+        result['render_id'] = rid
+        result['layout'] = layout.to_json()
+    elif renderer == 'tiles':
+        result['tiles'] = TilePyramid(result['hash']).build(ast)
+    elif renderer == 'json':
+        result['tree'] = ast_to_compact(ast, with_layout)
+    else:
+        rid = render_id(result['hash'], 'dot', 'full')
+        result['render_id'] = rid
+        if not render_store.lookup(rid):
+            # The AST stays in the worker, so the pruned fallback is generated up front
+            result['dot'] = generate_dot(ast, source_hash=result['hash']).source
+            result['pruned_dot'] = generate_dot(ast, max_depth=PRUNE_DEPTH, source_hash=result['hash']).source
+    return result
+
+async def render_dot(source, rid, fmt='png', args=(), timeout=RENDER_BUDGET):
+    """Render DOT source into the render store without blocking the loop.
+
+    Raises asyncio.TimeoutError after `timeout` seconds; the dot process is
+    killed and reaped on timeout and on cancellation alike.
+    """
+    out_path = render_store.scratch_path(rid, f'.{fmt}')
+    process = None
+    try:
+        process = await asyncio.create_subprocess_exec(
+            'dot', f'-T{fmt}', *args, '-o', out_path,
+            stdin=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        _, stderr = await asyncio.wait_for(process.communicate(source.encode('utf-8')), timeout)
+        if process.returncode != 0:
+            raise RenderError(stderr.decode('utf-8', 'replace'))
+        render_store.commit(rid, fmt, out_path)
+    finally:
+        if process is not None and process.returncode is None:
+            process.kill()
+            await process.wait()
+        if os.path.exists(out_path):
+            os.unlink(out_path)
+
+async def render_with_deadline(key, dot_source, pruned_source, budget):
+    """Async counterpart of renders.render_with_deadline; returns (render_id or None, level)."""
+    deadline = time.monotonic() + budget
+    last = len(DEGRADATION_LADDER) - 1
+    for i, (level, fmt, args) in enumerate(DEGRADATION_LADDER):
+        rid = render_id(key, 'dot', level)
+        if render_store.lookup(rid):
+            return rid, level
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        # Leave half of what is left for the cheaper levels
+        timeout = remaining if i == last else remaining / 2
+        if known_overrun(rid, timeout):
+            continue
+        try:
+            await render_dot(pruned_source if level == 'pruned' else dot_source, rid, fmt, args, timeout)
+            return rid, level
+        except asyncio.TimeoutError:
+            record_overrun(rid, timeout)
+            continue
+    return None, TEXT_ONLY
+
+@contextlib.asynccontextmanager
+async def admitted(cost):
+    """Hold one of main2's render slots without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    slot = admission.admit(cost)
+    # Queued requests wait for a slot on a thread
+    acquire = loop.run_in_executor(None, slot.__enter__)
+    try:
+        await asyncio.shield(acquire)
+    except asyncio.CancelledError:
+        # The thread still takes the slot eventually; hand it straight back
+        acquire.add_done_callback(lambda f: f.cancelled() or f.exception() or slot.__exit__(None, None, None))
+        raise
+    try:
+        yield
+    finally:
+        slot.__exit__(None, None, None)
+
+@app.before_serving
+async def start_executor():
+    global executor
+    # Server workers spawned as daemon processes (e.g. by the hypercorn CLI)
+    # cannot fork a process pool; fall back to threads there
+    if multiprocessing.current_process().daemon:
+        executor = ThreadPoolExecutor(max_workers=PARSE_WORKERS)
+    else:
+        executor = ProcessPoolExecutor(max_workers=PARSE_WORKERS)
+
+@app.after_serving
+async def stop_executor():
+    executor.shutdown(wait=False, cancel_futures=True)
+
+@app.route('/parse', methods=['POST'])
+async def parse():
+    try:
+        data = await request.get_json(silent=True)
+        if not data:
+            logger.error("No JSON data received")
+            return jsonify({'error': 'Invalid JSON payload'}), 400
+
+        code = data.get('code', '')
+        if not code.strip():
+            logger.error("No code provided in request")
+            return jsonify({'error': 'No code provided'}), 400
+
+        token_format = data.get('token_format', 'rows')
+        if token_format not in TOKEN_FORMATS:
+            return jsonify({'error': f'Unknown token format: {token_format}'}), 400
+        renderer = data.get('renderer', 'dot')
+        if renderer not in RENDERERS:
+            return jsonify({'error': f'Unknown renderer: {renderer}'}), 400
+
+        try:
+            budget = min(float(data.get('deadline', RENDER_BUDGET)), RENDER_BUDGET)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'deadline must be a number of seconds'}), 400
+
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(executor, prepare, code, token_format, renderer,
+                                            bool(data.get('layout')))
+        if 'error' in result:
+            return jsonify(result), 400
+
+        response = {
+            'tokens': result['tokens'],
+            'ast': result['ast']
+        }
+        if renderer == 'tiles':
+            response['tiles'] = result['tiles']
+            return jsonify(response)
+        if renderer == 'json':
+            response['tree'] = result['tree']
+            return jsonify(response)
+
+        if 'layout' in result:
+            response['layout'] = result['layout']
+        rid = result['render_id']
+        if renderer == 'dot':
+            level = 'full'
+            if 'dot' in result:
+                cost = estimate_cost(result['token_count'], result['node_count'])
+                try:
+                    async with admitted(cost):
+                        rid, level = await render_with_deadline(result['hash'], result['dot'],
+                                                                result['pruned_dot'], budget)
+                except Rejected as e:
+                    logger.warning(f"Rejected render of cost {cost}; retry after {e.retry_after}s")
+                    return (jsonify({'error': 'Server busy, retry later', 'retry_after': e.retry_after}), 429,
+                            {'Retry-After': str(e.retry_after)})
+                except RenderError as e:
+                    logger.error(f"Failed to render PNG with dot command: {e}")
+                    return jsonify({'error': 'Failed to render AST image'}), 500
+                except FileNotFoundError:
+                    logger.error("dot command not found. Ensure Graphviz is installed and in PATH.")
+                    return jsonify({'error': 'Graphviz dot command not found'}), 500
+            response['degradation'] = level
+            if rid is None:
+                logger.warning(f"All renders missed the {budget}s deadline; serving text AST only")
+                return jsonify(response)
+            logger.debug(f"Rendered {level} image using dot command as render {rid}")
+        metadata = render_store.metadata(rid)
+        if metadata is None:
+            logger.error(f"Render {rid} was evicted before it could be served")
+            return jsonify({'error': 'Render was evicted before it could be served; retry'}), 503
+        response.update(metadata)
+        return jsonify(response)
+
+    except Exception as e:
+        logger.error(f"Parsing or rendering failed: {str(e)}")
+        return jsonify({'error': f'Parsing or rendering failed: {str(e)}'}), 500
+
+@app.websocket('/live')
+async def live():
+    """Live-editing session: receives text edits, pushes AST/token deltas."""
+    loop = asyncio.get_running_loop()
+    session = None
+    while True:
+        try:
+            message = json.loads(await websocket.receive())
+            if session is None:
+                session = LiveSession(message.get('token_format', 'rows'))
+            # Session state is per connection, so re-parse on a thread rather
+            # than shipping it to the process pool
+            reply = await loop.run_in_executor(None, session.handle, message)
+        except (ValueError, AttributeError) as e:
+            reply = {'type': 'error', 'error': f'Invalid message: {e}'}
+        except SessionError as e:
+            reply = {'type': 'error', 'error': str(e)}
+        except Exception as e:
+            # Anything else the pipeline throws ends this message, not the connection
+            logger.error(f"Live session failed: {str(e)}")
+            reply = {'type': 'error', 'error': f'Parsing failed: {str(e)}'}
+        await websocket.send(json.dumps(reply))
+
+@app.route('/image/<rid>', methods=['GET'])
+async def image(rid):
+    stored = render_store.lookup(rid)
+    if not stored:
+        return jsonify({'error': 'Unknown render id'}), 404
+    path, mimetype = stored
+    return await send_file(path, mimetype=mimetype, cache_timeout=86400)
+
+@app.route('/tiles/<source_hash>/<int:z>/<int:x>/<int:y>.png', methods=['GET'])
+async def tile(source_hash, z, x, y):
+    try:
+        pyramid = pyramids.get(source_hash)
+        if pyramid is None:
+            return jsonify({'error': 'Unknown tile set'}), 404
+        # Tile rendering shells out to neato; keep it off the event loop
+        path = await asyncio.get_running_loop().run_in_executor(None, pyramid.tile_path, z, x, y)
+    except TileRenderError as e:
+        logger.error(str(e))
+        return jsonify({'error': str(e)}), 500
+    except TileError as e:
+        logger.error(str(e))
+        return jsonify({'error': str(e)}), 404
+    except FileNotFoundError:
+        logger.error("neato command not found. Ensure Graphviz is installed and in PATH.")
+        return jsonify({'error': 'Graphviz neato command not found'}), 500
+    return await send_file(path, mimetype='image/png', cache_timeout=86400)
+
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=5051)
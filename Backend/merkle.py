@@ -0,0 +1,24 @@
+import hashlib
+
+# Structural (Merkle) hashes of AST subtrees.
+#
+# A node's hash covers its type, its value and the hashes of its children in
+# order, so two subtrees have the same hash exactly when they are the same
+# shape with the same labels, wherever they sit in the tree and whichever
+# source they came from. astdiff.py matches unchanged subtrees with them and
+# dotcache.py keys cached DOT fragments by them.
+
+
+def subtree_hashes(nodes, parent, children):
+    """Hash and size of every subtree, given the preorder arrays from layout.flatten."""
+    n = len(nodes)
+    hashes = [None] * n
+    sizes = [1] * n
+    # Reversed preorder finishes every child before its parent
+    for i in range(n - 1, -1, -1):
+        node = nodes[i]
+        key = '\0'.join([node.node_type, str(node.value)] + [hashes[c] for c in children[i]])
+        hashes[i] = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        if parent[i] >= 0:
+            sizes[parent[i]] += sizes[i]
+    return hashes, sizes
@@ -1,5 +1,18 @@
 from lexer import Token
 
+# Declaration specifiers, accepted as any run of these keywords
+# ("unsigned long", "static const int") and kept as written
+TYPE_SPECIFIERS = {'void', 'char', 'short', 'int', 'long', 'float', 'double', 'signed', 'unsigned',
+                   '_Bool', '_Complex', '_Imaginary'}
+QUALIFIERS = {'const', 'volatile', 'restrict', 'static', 'extern', 'register', 'auto', 'inline'}
+SPECIFIERS = TYPE_SPECIFIERS | QUALIFIERS
+# Type keywords that need grammar this parser doesn't have; rejected rather
+# than skipped so they can't silently turn into a different tree
+UNSUPPORTED_TYPES = {'struct', 'union', 'enum', 'typedef'}
+# Likewise the conditional operator and labels ("case 1:"): the binary
+# operator path would otherwise build "a ? 1 : 2" as nested BinaryOps
+UNSUPPORTED_OPERATORS = {'?', ':'}
+
 class ASTNode:
     def __init__(self, node_type, value=None, children=None):
         self.node_type = node_type
@@ -10,9 +23,13 @@ class ASTNode:
         return f"{self.node_type}: {self.value}" if self.value else self.node_type
 
 class Parser:
-    def __init__(self, tokens):
+    def __init__(self, tokens, collect_symbols=True):
         self.tokens = tokens
         self.pos = 0
+        # (name, kind, line, column, scope) for every symbol seen while parsing;
+        # see symbols.SymbolIndex
+        self.symbols = [] if collect_symbols else None
+        self._scope = None
 
     def parse(self):
         root = ASTNode("Program")
@@ -34,52 +51,90 @@ class Parser:
         self.pos += 1
         return token
 
+    def _record(self, kind, token):
+        if self.symbols is not None:
+            self.symbols.append((token.value, kind, token.line, token.column, self._scope))
+
+    def _is_specifier(self, token):
+        return token.type == 'KEYWORD' and token.value in SPECIFIERS
+
+    def _reject_unsupported(self, token):
+        if (token.type == 'KEYWORD' and token.value in UNSUPPORTED_TYPES or
+                token.type == 'OPERATOR' and token.value in UNSUPPORTED_OPERATORS):
+            raise ValueError(f"Unsupported '{token.value}' at line {token.line}")
+
+    def _parse_specifiers(self):
+        token = self._peek()
+        if not self._is_specifier(token):
+            raise ValueError(f"Expected a type, got {token.type} at line {token.line}")
+        words = []
+        while self._is_specifier(self._peek()):
+            words.append(self._consume('KEYWORD').value)
+        self._reject_unsupported(self._peek())
+        return ' '.join(words)
+
     def _parse_top_level(self):
         token = self._peek()
-        if token.type == 'KEYWORD' and token.value in {'int', 'char', 'float', 'double', 'void'}:
-            if (self.pos + 2 < len(self.tokens) and 
-                self.tokens[self.pos + 1].type == 'IDENTIFIER' and 
-                self.tokens[self.pos + 2].value == '('):
+        if self._is_specifier(token):
+            end = self.pos
+            while end < len(self.tokens) and self._is_specifier(self.tokens[end]):
+                end += 1
+            if (end + 1 < len(self.tokens) and
+                self.tokens[end].type == 'IDENTIFIER' and
+                self.tokens[end + 1].value == '('):
                 return self._parse_function()
             else:
                 return self._parse_declaration()
+        self._reject_unsupported(token)
         self.pos += 1
         return None
 
     def _parse_function(self):
-        return_type = self._consume('KEYWORD').value
-        name = self._consume('IDENTIFIER').value
+        return_type = self._parse_specifiers()
+        name_token = self._consume('IDENTIFIER')
+        name = name_token.value
+        self._record('Function', name_token)
+        self._scope = name
         self._consume('PUNCTUATION', '(')
         params = []
-        if self._peek().value == 'void':
+        if self._peek().value == 'void' and self.pos + 1 < len(self.tokens) and \
+                self.tokens[self.pos + 1].value == ')':
             self._consume('KEYWORD', 'void')
         elif self._peek().value != ')':
             while True:
-                param_type = self._consume('KEYWORD').value
-                param_name = self._consume('IDENTIFIER').value
+                param_type = self._parse_specifiers()
+                param_token = self._consume('IDENTIFIER')
+                param_name = param_token.value
+                self._record('Parameter', param_token)
                 params.append(ASTNode("Parameter", value=f"{param_type} {param_name}"))
                 if self._peek().value == ')':
                     break
                 self._consume('PUNCTUATION', ',')
         self._consume('PUNCTUATION', ')')
         body = self._parse_block()
+        self._scope = None
         return ASTNode("Function", value=f"{return_type} {name}", children=params + [body])
 
     def _parse_declaration(self):
-        type_token = self._consume('KEYWORD')
-        name = self._consume('IDENTIFIER').value
+        type_name = self._parse_specifiers()
+        name_token = self._consume('IDENTIFIER')
+        name = name_token.value
+        self._record('Declaration', name_token)
         if self._peek().value == '=':
             self._consume('OPERATOR', '=')
             value = self._parse_expression()
             self._consume('PUNCTUATION', ';')
-            return ASTNode("Declaration", value=f"{type_token.value} {name}", children=[value])
+            return ASTNode("Declaration", value=f"{type_name} {name}", children=[value])
         self._consume('PUNCTUATION', ';')
-        return ASTNode("Declaration", value=f"{type_token.value} {name}")
+        return ASTNode("Declaration", value=f"{type_name} {name}")
 
     def _parse_block(self):
         self._consume('PUNCTUATION', '{')
         block = ASTNode("Block")
         while self._peek().value != '}':
+            if self._peek().type == 'EOF':
+                # A block cut off mid-edit; statements at EOF would never end the loop
+                raise ValueError(f"Expected '}}' before end of input at line {self.tokens[-1].line}")
             stmt = self._parse_statement()
             if stmt:
                 block.children.append(stmt)
@@ -97,12 +152,16 @@ class Parser:
                 return self._parse_for()
             elif token.value == 'return':
                 return self._parse_return()
-            elif token.value in {'int', 'char', 'float', 'double', 'void'}:
+            elif token.value in SPECIFIERS:
                 return self._parse_declaration()
+            elif token.value == 'sizeof':
+                return self._parse_expression_statement()
+            self._reject_unsupported(token)
         elif token.type == 'PUNCTUATION' and token.value == '{':
             return self._parse_block()
         elif token.type == 'IDENTIFIER':
             return self._parse_expression_statement()
+        self._reject_unsupported(token)
         self.pos += 1
         return None
 
@@ -166,9 +225,11 @@ class Parser:
             # Otherwise, it's a simple identifier
             self.pos += 1
             left = ASTNode("IDENTIFIER", value=token.value)
-        elif token.type in ('NUMBER', 'STRING'):
+        elif token.type in ('NUMBER', 'STRING', 'CHAR'):
             self.pos += 1
             left = ASTNode(token.type, value=token.value)
+        elif token.type == 'KEYWORD' and token.value == 'sizeof':
+            left = self._parse_sizeof()
         else:
             return None
 
@@ -178,7 +239,9 @@ class Parser:
         return left
 
     def _parse_function_call(self):
-        name = self._consume('IDENTIFIER').value
+        name_token = self._consume('IDENTIFIER')
+        name = name_token.value
+        self._record('FunctionCall', name_token)
         self._consume('PUNCTUATION', '(')
         args = []
         # Parse arguments (comma-separated expressions)
@@ -193,8 +256,28 @@ class Parser:
         self._consume('PUNCTUATION', ')')
         return ASTNode("FunctionCall", value=name, children=args)
 
+    def _parse_sizeof(self):
+        # Shaped like the call it used to be parsed as: sizeof(x) -> FunctionCall sizeof [x]
+        sizeof_token = self._consume('KEYWORD', 'sizeof')
+        if self._peek().value == '(':
+            self._consume('PUNCTUATION', '(')
+            if self._is_specifier(self._peek()):
+                operand = ASTNode("Type", value=self._parse_specifiers())
+            else:
+                operand = self._parse_expression()
+            self._consume('PUNCTUATION', ')')
+        elif self._peek().type == 'IDENTIFIER':
+            operand = ASTNode("IDENTIFIER", value=self._consume('IDENTIFIER').value)
+        else:
+            operand = None
+        if operand is None:
+            raise ValueError(f"Expected an operand for 'sizeof' at line {sizeof_token.line}")
+        return ASTNode("FunctionCall", value='sizeof', children=[operand])
+
     def _parse_assignment(self):
-        var = self._consume('IDENTIFIER').value
+        var_token = self._consume('IDENTIFIER')
+        var = var_token.value
+        self._record('Assignment', var_token)
         self._consume('OPERATOR', '=')
         value = self._parse_expression()
         return ASTNode("Assignment", value=var, children=[value])
@@ -205,6 +288,7 @@ class Parser:
         return ASTNode("UnaryOp", value=op, children=[ASTNode("IDENTIFIER", value=var)])
 
     def _parse_binary_op(self, left):
+        self._reject_unsupported(self._peek())
         op = self._consume('OPERATOR').value
         right = self._parse_expression()
         if right is None:
@@ -0,0 +1,201 @@
+# Pre-forking launcher for the Flask servers (main2.py or app.py).
+#
+# A zygote process pays every start-up cost once: it imports Flask,
+# graphviz, pycparser and PLY, builds the PLY tables in lexer2/parser2 and
+# app.py's CParser, and pushes a warm-up parse through the app. It then
+# moves everything that survived into the permanent GC generation
+# (gc.freeze) so the collector never touches - and copy-on-write never
+# duplicates - those pages, opens the listening socket, and forks workers
+# that all accept on it. Dead workers are replaced from the same warm image.
+#
+# Each worker logs how long after fork it was ready and how long until it
+# answered its first request, together with its RSS/PSS. Send SIGUSR1 to the
+# zygote for a memory report across all workers.
+#
+#   python prefork.py --app main2 --workers 4 --port 5050
+import argparse
+import gc
+import importlib
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+from werkzeug.serving import make_server
+
+logger = logging.getLogger('prefork')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WARMUP_SOURCE = """
+int add(int a, int b) {
+    return a + b;
+}
+
+int main() {
+    int total = 0;
+    int i = 0;
+    while (i < 10) {
+        if (i > 5) {
+            total = add(total, i);
+        }
+        i = i + 1;
+    }
+    printf("%d", total);
+    return 0;
+}
+"""
+
+
+def memory_usage(pid='self'):
+    """RSS, PSS and private/shared kB for a process, from /proc."""
+    usage = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                field, _, rest = line.partition(':')
+                if field in ('Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty'):
+                    usage[field] = int(rest.split()[0])
+    except OSError:
+        return usage
+    return {
+        'rss_kb': usage.get('Rss', 0),
+        'pss_kb': usage.get('Pss', 0),
+        'shared_kb': usage.get('Shared_Clean', 0) + usage.get('Shared_Dirty', 0),
+        'private_kb': usage.get('Private_Clean', 0) + usage.get('Private_Dirty', 0)
+    }
+
+
+def warm(app_name):
+    """Import and exercise everything a worker needs; returns the WSGI app."""
+    import graphviz  # noqa: F401
+    import pycparser  # noqa: F401
+    import ply.lex  # noqa: F401
+    import ply.yacc  # noqa: F401
+
+    # lexer2/parser2 build their PLY tables at import time
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    import Backend.lexer2  # noqa: F401
+    import Backend.parser2  # noqa: F401
+
+    module = importlib.import_module(app_name)
+    if app_name == 'app':
+        # app.py's /parse needs clang; warm the parser and DOT conversion directly
+        ast = module.get_parser().parse(WARMUP_SOURCE, filename='<warmup>')
+        module.ASTConverter().filter_and_convert(ast).source
+    else:
+        client = module.app.test_client()
+        for renderer in ('json', 'tidy'):
+            response = client.post('/parse', json={'code': WARMUP_SOURCE, 'renderer': renderer, 'layout': True})
+            if response.status_code != 200:
+                logger.warning(f"Warm-up parse with renderer {renderer} returned {response.status_code}")
+    return module.app
+
+
+class FirstRequestTimer:
+    """WSGI wrapper that logs time-to-first-request and memory once."""
+
+    def __init__(self, app, forked_at):
+        self.app = app
+        self.forked_at = forked_at
+        self.done = False
+
+    def __call__(self, environ, start_response):
+        start = time.perf_counter()
+        try:
+            return self.app(environ, start_response)
+        finally:
+            if not self.done:
+                self.done = True
+                end = time.perf_counter()
+                logger.info(f"Worker {os.getpid()} answered its first request in {(end - start) * 1000:.1f}ms "
+                            f"({(end - self.forked_at) * 1000:.1f}ms after fork), memory {memory_usage()}")
+
+
+class Zygote:
+    def __init__(self, app, host, port, workers):
+        self.app = app
+        self.workers = workers
+        self.children = {}
+        self.stopping = False
+        self.sock = socket.create_server((host, port), backlog=128)
+        self.sock.set_inheritable(True)
+        self.host = host
+        self.port = port
+
+    def spawn(self):
+        forked_at = time.perf_counter()
+        pid = os.fork()
+        if pid:
+            self.children[pid] = forked_at
+            return
+        # Worker: default signal handling, serve until killed
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+        try:
+            server = make_server(self.host, self.port, FirstRequestTimer(self.app, forked_at), fd=self.sock.fileno())
+            logger.info(f"Worker {os.getpid()} ready {(time.perf_counter() - forked_at) * 1000:.1f}ms after fork")
+            server.serve_forever()
+        finally:
+            os._exit(1)
+
+    def report(self, *_):
+        logger.info(f"Zygote {os.getpid()} memory {memory_usage()}")
+        for pid in self.children:
+            logger.info(f"Worker {pid} memory {memory_usage(pid)}")
+
+    def stop(self, *_):
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGUSR1, self.report)
+        for _ in range(self.workers):
+            self.spawn()
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            if self.children.pop(pid, None) is None:
+                continue
+            if not self.stopping:
+                logger.warning(f"Worker {pid} exited with status {status}; respawning")
+                self.spawn()
+        self.sock.close()
+
+
+def main():
+    cli = argparse.ArgumentParser(description='Serve the AST visualiser from pre-forked warm workers')
+    cli.add_argument('--app', choices=('main2', 'app'), default='main2')
+    cli.add_argument('--host', default='0.0.0.0')
+    cli.add_argument('--port', type=int)
+    cli.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = cli.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    start = time.perf_counter()
+    app = warm(args.app)
+    gc.collect()
+    gc.freeze()
+    logger.info(f"Zygote {os.getpid()} warmed {args.app} in {(time.perf_counter() - start) * 1000:.1f}ms, "
+                f"memory {memory_usage()}")
+
+    port = args.port or (5050 if args.app == 'main2' else 5000)
+    Zygote(app, args.host, port, args.workers).run()
+
+
+if __name__ == '__main__':
+    main()
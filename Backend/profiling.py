@@ -0,0 +1,216 @@
+import cProfile
+import hmac
+import json
+import os
+import pstats
+import re
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+
+# On-demand profiling of single requests.
+#
+# Setting AST_PROFILE_TOKEN enables it. A request that carries the token in
+# an X-Profile header (or a ?profile= query parameter) runs its parse and
+# render pipeline under cProfile and tracemalloc, and the response names a
+# profile id. Three files are kept per profile:
+#
+#   <id>.pstats     cProfile output, for pstats/snakeviz
+#   <id>.collapsed  "a;b;c <microseconds>" lines for flamegraph.pl/speedscope
+#   <id>.json       summary: wall time, peak traced memory, the top functions
+#                   by cumulative time and the top allocation sites
+#
+# Requests without the token take exactly the path they took before; the
+# only cost is the header lookup. Profiled requests run one at a time, since
+# tracemalloc is process-wide, and bypass the response cache and request
+# coalescing so the work being profiled actually happens.
+
+PROFILE_TOKEN = os.environ.get('AST_PROFILE_TOKEN') or None
+PROFILE_ROOT = os.environ.get('AST_PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'ast-profiles'))
+PROFILE_TOP = int(os.environ.get('AST_PROFILE_TOP', 25))
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_KINDS = {
+    'pstats': 'application/octet-stream',
+    'collapsed': 'text/plain',
+    'json': 'application/json'
+}
+
+_ID_RE = re.compile(r'[0-9a-f]{32}')
+
+# Paths carrying less than this share of the profiled time are left out of
+# the collapsed stacks, which bounds how many paths are enumerated
+MIN_STACK_SHARE = 1e-4
+
+
+def authorized(headers, args, token=PROFILE_TOKEN):
+    """Whether a request carries the profiling token; always False when profiling is off."""
+    if token is None:
+        return False
+    supplied = headers.get(PROFILE_HEADER) or args.get('profile')
+    return bool(supplied) and hmac.compare_digest(supplied.encode('utf-8'), token.encode('utf-8'))
+
+
+def _label(func):
+    filename, line, name = func
+    if filename == '~':
+        # Built-ins are reported as ('~', 0, '<built-in method ...>')
+        return name
+    return f'{name} ({os.path.basename(filename)}:{line})'
+
+
+def collapsed_stacks(stats):
+    """Flame graph lines reconstructed from a pstats caller graph.
+
+    cProfile records caller/callee pairs rather than whole stacks, so each
+    function's time is split among the paths reaching it in proportion to
+    the time each caller spent calling it.
+    """
+    callees = {}
+    roots = []
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        if not callers:
+            roots.append(func)
+        for caller, (_, _, _, cumulative) in callers.items():
+            callees.setdefault(caller, []).append((func, cumulative))
+
+    totals = {}
+    # (function, seconds reaching it along this path, path so far)
+    stack = [(func, stats.stats[func][3], ()) for func in roots]
+    cutoff = sum(seconds for _, seconds, _ in stack) * MIN_STACK_SHARE
+    while stack:
+        func, seconds, path = stack.pop()
+        _, _, own, cumulative, _ = stats.stats[func]
+        path = path + (_label(func),)
+        share = seconds / cumulative if cumulative else 0.0
+        if own * share >= cutoff:
+            key = ';'.join(path)
+            totals[key] = totals.get(key, 0.0) + own * share
+        for callee, edge in callees.get(func, ()):
+            # Recursion is folded into the first frame of the function
+            if _label(callee) not in path and edge * share >= cutoff:
+                stack.append((callee, edge * share, path))
+    return ''.join(f'{path} {round(seconds * 1e6)}\n' for path, seconds in sorted(totals.items())
+                   if round(seconds * 1e6))
+
+
+class ProfileStore:
+    def __init__(self, root=PROFILE_ROOT, max_entries=64, top=PROFILE_TOP):
+        self.root = root
+        self.max_entries = max_entries
+        self.top = top
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, profile_id, kind):
+        if not _ID_RE.fullmatch(profile_id) or kind not in PROFILE_KINDS:
+            raise ValueError(f"Invalid profile: {profile_id}.{kind}")
+        return os.path.join(self.root, f'{profile_id}.{kind}')
+
+    def lookup(self, profile_id, kind):
+        """Return (path, mimetype) for a stored profile file, or None."""
+        try:
+            path = self.path(profile_id, kind)
+        except ValueError:
+            return None
+        return (path, PROFILE_KINDS[kind]) if os.path.exists(path) else None
+
+    def run(self, label, func, *args, **kwargs):
+        """Call func(*args, **kwargs) under cProfile and tracemalloc; returns (result, profile id)."""
+        with self._lock:
+            was_tracing = tracemalloc.is_tracing()
+            if not was_tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            profiler = cProfile.Profile()
+            start = time.perf_counter()
+            try:
+                profiler.enable()
+                try:
+                    result = func(*args, **kwargs)
+                finally:
+                    profiler.disable()
+                wall = time.perf_counter() - start
+                allocations = tracemalloc.take_snapshot()
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                if not was_tracing:
+                    tracemalloc.stop()
+        profile_id = self._save(label, profiler, wall, peak, allocations)
+        return result, profile_id
+
+    def _save(self, label, profiler, wall, peak, allocations):
+        profile_id = uuid.uuid4().hex
+        stats = pstats.Stats(profiler)
+        functions = sorted(stats.stats.items(), key=lambda item: -item[1][3])[:self.top]
+        sites = allocations.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__)
+        ]).statistics('lineno')[:self.top]
+        summary = {
+            'id': profile_id,
+            'label': label,
+            'created': time.time(),
+            'wall_seconds': round(wall, 6),
+            'peak_traced_bytes': peak,
+            'functions': [
+                {'function': _label(func), 'calls': calls, 'own_seconds': round(own, 6),
+                 'cumulative_seconds': round(cumulative, 6)}
+                for func, (_, calls, own, cumulative, _) in functions
+            ],
+            'allocations': [
+                {'site': f'{os.path.basename(site.traceback[0].filename)}:{site.traceback[0].lineno}',
+                 'bytes': site.size, 'blocks': site.count}
+                for site in sites
+            ]
+        }
+        # The summary is written last; its presence marks a complete profile
+        self._write(profile_id, 'pstats', stats.dump_stats)
+        collapsed = collapsed_stacks(stats)
+        self._write(profile_id, 'collapsed', lambda path: _write_text(path, collapsed))
+        self._write(profile_id, 'json', lambda path: _write_text(path, json.dumps(summary)))
+        self._evict()
+        return profile_id
+
+    def _write(self, profile_id, kind, write):
+        path = self.path(profile_id, kind)
+        temp_path = f'{path}.{os.getpid()}-{uuid.uuid4().hex[:8]}.tmp'
+        try:
+            write(temp_path)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+
+    def _evict(self):
+        entries = []
+        with os.scandir(self.root) as it:
+            for entry in it:
+                name, _, suffix = entry.name.partition('.')
+                if suffix == 'json' and _ID_RE.fullmatch(name):
+                    entries.append((entry.stat().st_mtime, name))
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort()
+        for _, profile_id in entries[:len(entries) - self.max_entries]:
+            for kind in PROFILE_KINDS:
+                try:
+                    os.unlink(self.path(profile_id, kind))
+                except FileNotFoundError:
+                    pass
+
+
+def _write_text(path, text):
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+def profile_urls(profile_id):
+    return {
+        'id': profile_id,
+        'summary_url': f'/profiles/{profile_id}',
+        'pstats_url': f'/profiles/{profile_id}.pstats',
+        'collapsed_url': f'/profiles/{profile_id}.collapsed'
+    }
@@ -0,0 +1,267 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from astjson import ast_to_compact, compact_to_ast
+from lexer import Tokenizer, remove_preprocessor_directives
+from parser import ASTNode, Parser
+
+# Multi-file project ingestion.
+#
+# A project is a tar/zip upload or a local directory. Every .c/.h file in it
+# is parsed in a process pool, with the in-house parser.py or with pycparser,
+# and each worker writes its file's AST (compact JSON, see astjson.py) straight
+# into the project directory so only small per-file records travel back to
+# the parent. The manifest lists every file with its outcome and timings;
+# ASTs are loaded again on demand when a single file is rendered later.
+#
+#   python project.py path/to/tree-or-archive --backend pycparser --workers 4
+
+PROJECT_ROOT = os.environ.get('AST_PROJECT_DIR', os.path.join(tempfile.gettempdir(), 'ast-projects'))
+MAX_PROJECT_BYTES = int(os.environ.get('AST_PROJECT_MAX_BYTES', 64 * 1024 * 1024))
+MAX_PROJECT_FILES = int(os.environ.get('AST_PROJECT_MAX_FILES', 20000))
+
+BACKENDS = ('parser', 'pycparser')
+SOURCE_SUFFIXES = ('.c', '.h')
+
+
+class ProjectError(Exception):
+    pass
+
+
+def _safe_name(name):
+    """Normalised relative path for an archive member, or None to skip it."""
+    name = name.replace('\\', '/')
+    parts = [part for part in name.split('/') if part not in ('', '.')]
+    if not parts or '..' in parts or name.startswith('/') or not name.endswith(SOURCE_SUFFIXES):
+        return None
+    return '/'.join(parts)
+
+
+def _archive_members(data):
+    """Yield (name, size, read) for every regular file in a tar or zip archive."""
+    if zipfile.is_zipfile(io.BytesIO(data)):
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    yield info.filename, info.file_size, lambda info=info: archive.read(info)
+        return
+    try:
+        archive = tarfile.open(fileobj=io.BytesIO(data), mode='r:*')
+    except tarfile.TarError:
+        raise ProjectError("Upload is neither a zip nor a tar archive")
+    with archive:
+        for member in archive:
+            if member.isfile():
+                yield member.name, member.size, lambda member=member: archive.extractfile(member).read()
+
+
+def _check_limits(count, total):
+    if count > MAX_PROJECT_FILES:
+        raise ProjectError(f"Project has more than {MAX_PROJECT_FILES} source files")
+    if total > MAX_PROJECT_BYTES:
+        raise ProjectError(f"Project sources exceed {MAX_PROJECT_BYTES} bytes")
+
+
+def _pycparser_to_ast(node):
+    """Convert a pycparser node into the ASTNode shape used everywhere else."""
+    from pycparser import c_ast
+
+    def convert(current):
+        value = None
+        for attr in ('name', 'value', 'op'):
+            value = getattr(current, attr, None)
+            if isinstance(value, str) and value:
+                break
+            value = None
+        children = [convert(child) for _, child in current.children() if isinstance(child, c_ast.Node)]
+        return ASTNode(type(current).__name__, value, children)
+    return convert(node)
+
+
+def parse_file(task):
+    """Worker: parse one source file and store its AST; returns its manifest record."""
+    index, name, path, backend, ast_dir = task
+    start = time.perf_counter()
+    record = {'path': name, 'ok': False}
+    try:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            code = f.read()
+        record['bytes'] = len(code)
+        code = remove_preprocessor_directives(code)
+        if backend == 'pycparser':
+            from pycparser import c_parser
+            ast = _pycparser_to_ast(c_parser.CParser().parse(code, filename=name))
+        else:
+            tokens = Tokenizer(code).tokenize()
+            record['tokens'] = len(tokens)
+            ast = Parser(tokens, collect_symbols=False).parse()
+        tree = ast_to_compact(ast)
+        with open(os.path.join(ast_dir, f'{index}.json'), 'w') as out:
+            json.dump(tree, out, separators=(',', ':'))
+        record.update(ok=True, nodes=tree['count'], ast=index)
+    except Exception as e:
+        record['error'] = str(e)
+    record['seconds'] = round(time.perf_counter() - start, 6)
+    return record
+
+
+class Project:
+    def __init__(self, project_id, root=PROJECT_ROOT):
+        if not project_id or not all(c in '0123456789abcdef' for c in project_id):
+            raise ProjectError(f"Invalid project id: {project_id}")
+        self.id = project_id
+        self.path = os.path.join(root, project_id)
+        self.ast_dir = os.path.join(self.path, 'asts')
+        self.manifest_path = os.path.join(self.path, 'manifest.json')
+
+    def exists(self):
+        return os.path.exists(self.manifest_path)
+
+    def manifest(self):
+        if not self.exists():
+            raise ProjectError(f"Unknown project: {self.id}")
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    def file_ast(self, name):
+        """Rebuild the stored AST of one project file as ASTNodes."""
+        for record in self.manifest()['files']:
+            if record['path'] == name:
+                if not record['ok']:
+                    raise ProjectError(f"{name} failed to parse: {record['error']}")
+                with open(os.path.join(self.ast_dir, f"{record['ast']}.json")) as f:
+                    return compact_to_ast(json.load(f))
+        raise ProjectError(f"No file {name} in project {self.id}")
+
+
+def _project_id(sources, backend):
+    digest = hashlib.sha256(backend.encode('utf-8'))
+    for name, path in sources:
+        digest.update(name.encode('utf-8') + b'\0')
+        with open(path, 'rb') as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()[:32]
+
+
+def _ingest(sources, backend, workers, root, staging=None):
+    if backend not in BACKENDS:
+        raise ProjectError(f"Unknown backend: {backend}")
+    if not sources:
+        raise ProjectError("No .c or .h files found")
+    sources.sort()
+    project = Project(_project_id(sources, backend), root)
+    if project.exists():
+        if staging:
+            shutil.rmtree(staging, ignore_errors=True)
+        return project.manifest()
+
+    build = tempfile.mkdtemp(prefix=f'{project.id}.', dir=root)
+    ast_dir = os.path.join(build, 'asts')
+    os.makedirs(ast_dir)
+    if staging:
+        # Keep uploaded sources with the project, they're already on disk
+        os.replace(staging, os.path.join(build, 'src'))
+        sources = [(name, os.path.join(build, 'src', name)) for name, _ in sources]
+
+    tasks = [(i, name, path, backend, ast_dir) for i, (name, path) in enumerate(sources)]
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        chunksize = max(1, len(tasks) // ((workers or os.cpu_count() or 1) * 8))
+        records = list(executor.map(parse_file, tasks, chunksize=chunksize))
+    wall = time.perf_counter() - start
+
+    parsed = sum(record['ok'] for record in records)
+    manifest = {
+        'project': project.id,
+        'backend': backend,
+        'files': records,
+        'totals': {
+            'files': len(records),
+            'parsed': parsed,
+            'failed': len(records) - parsed,
+            'bytes': sum(record.get('bytes', 0) for record in records),
+            'nodes': sum(record.get('nodes', 0) for record in records),
+            'wall_seconds': round(wall, 3),
+            'parse_seconds': round(sum(record['seconds'] for record in records), 3),
+            'files_per_second': round(len(records) / wall, 1) if wall else None
+        }
+    }
+    with open(os.path.join(build, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f)
+    try:
+        os.rename(build, project.path)
+    except OSError:
+        # Another request ingested the same tree first
+        shutil.rmtree(build, ignore_errors=True)
+    return manifest
+
+
+def ingest_directory(directory, backend='parser', workers=None, root=PROJECT_ROOT):
+    """Parse every .c/.h file under a local directory; returns the manifest."""
+    os.makedirs(root, exist_ok=True)
+    sources = []
+    total = 0
+    for dirpath, dirnames, filenames in os.walk(directory):
+        dirnames.sort()
+        for filename in filenames:
+            if filename.endswith(SOURCE_SUFFIXES):
+                path = os.path.join(dirpath, filename)
+                sources.append((os.path.relpath(path, directory).replace(os.sep, '/'), path))
+                total += os.path.getsize(path)
+                _check_limits(len(sources), total)
+    return _ingest(sources, backend, workers, root)
+
+
+def ingest_archive(data, backend='parser', workers=None, root=PROJECT_ROOT):
+    """Parse every .c/.h file in a tar/zip archive given as bytes."""
+    os.makedirs(root, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix='upload.', dir=root)
+    try:
+        sources = {}
+        total = 0
+        for member, size, read in _archive_members(data):
+            name = _safe_name(member)
+            if name is None:
+                continue
+            total += size
+            sources[name] = os.path.join(staging, name)
+            _check_limits(len(sources), total)
+            os.makedirs(os.path.dirname(sources[name]), exist_ok=True)
+            with open(sources[name], 'wb') as out:
+                out.write(read())
+        return _ingest(list(sources.items()), backend, workers, root, staging)
+    finally:
+        if os.path.exists(staging):
+            shutil.rmtree(staging, ignore_errors=True)
+
+
+def main(argv=None):
+    cli = argparse.ArgumentParser(description='Parse every .c/.h file in a directory or archive')
+    cli.add_argument('source', help='directory, .zip or .tar[.gz] file')
+    cli.add_argument('--backend', choices=BACKENDS, default='parser')
+    cli.add_argument('--workers', type=int)
+    cli.add_argument('--root', default=PROJECT_ROOT, help='where projects are stored')
+    options = cli.parse_args(argv)
+
+    if os.path.isdir(options.source):
+        manifest = ingest_directory(options.source, options.backend, options.workers, options.root)
+    else:
+        with open(options.source, 'rb') as f:
+            manifest = ingest_archive(f.read(), options.backend, options.workers, options.root)
+    for record in manifest['files']:
+        if not record['ok']:
+            print(f"{record['path']}: {record['error']}")
+    print(json.dumps({'project': manifest['project'], **manifest['totals']}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from layout import flatten
+
+# Selector queries over a parsed AST.
+#
+# Selectors look like CSS over node types and values:
+#
+#   For                           every For node
+#   FunctionCall=printf           FunctionCall nodes whose value is printf
+#   Function="int main" Return    Return nodes anywhere under main
+#   If > Block                    Blocks that are direct children of an If
+#   For:has(FunctionCall=printf)  For loops containing a printf call
+#   While, For                    either
+#   *=x                           any node with value x
+#
+# QueryIndex numbers the nodes in preorder and keeps, per node, the last
+# preorder id in its subtree, so "d is a descendant of a" is the interval
+# test a < d <= end[a]. Per-type and per-(type, value) posting lists are
+# sorted id arrays, so each step of a selector is a posting-list lookup plus
+# a vectorised interval join rather than a walk over the tree.
+
+
+class QueryError(Exception):
+    pass
+
+
+_TOKEN_RE = re.compile(r'\s*(?:(?P<has>:has\()|(?P<punct>[>,()=])|"(?P<quoted>(?:[^"\\]|\\.)*)"|(?P<word>[^\s>,()=":]+))')
+
+
+def _tokenize(selector):
+    """Split a selector into (kind, text, preceded_by_whitespace) tokens."""
+    tokens = []
+    pos = 0
+    selector = selector.strip()
+    while pos < len(selector):
+        match = _TOKEN_RE.match(selector, pos)
+        if not match:
+            raise QueryError(f"Unexpected character {selector[pos]!r} at {pos}")
+        # Whitespace between two compounds is the descendant combinator
+        spaced = selector[pos].isspace()
+        pos = match.end()
+        if match.group('has'):
+            tokens.append(('has', ':has(', spaced))
+        elif match.group('punct'):
+            tokens.append((match.group('punct'), match.group('punct'), spaced))
+        elif match.group('quoted') is not None:
+            tokens.append(('value', re.sub(r'\\(.)', r'\1', match.group('quoted')), spaced))
+        else:
+            tokens.append(('word', match.group('word'), spaced))
+    tokens.append(('end', '', False))
+    return tokens
+
+
+class _SelectorParser:
+    """Recursive descent over the selector grammar:
+
+    list     := selector (',' selector)*
+    selector := compound (('>' | ' ') compound)*
+    compound := (TYPE | '*') ('=' VALUE)? (':has(' list ')')*
+    """
+
+    def __init__(self, selector):
+        self.tokens = _tokenize(selector)
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos]
+
+    def take(self, kind=None):
+        token = self.tokens[self.pos]
+        if kind is not None and token[0] != kind:
+            raise QueryError(f"Expected {kind}, got {token[1]!r}")
+        self.pos += 1
+        return token
+
+    def parse(self):
+        selectors = self.parse_list()
+        if self.peek()[0] != 'end':
+            raise QueryError(f"Unexpected {self.peek()[1]!r}")
+        return selectors
+
+    def parse_list(self):
+        selectors = [self.parse_selector()]
+        while self.peek()[0] == ',':
+            self.take(',')
+            selectors.append(self.parse_selector())
+        return selectors
+
+    def parse_selector(self):
+        steps = [(None, self.parse_compound())]
+        while True:
+            kind, _, spaced = self.peek()
+            if kind == '>':
+                self.take('>')
+                steps.append(('child', self.parse_compound()))
+            elif kind == 'word' and spaced:
+                steps.append(('descendant', self.parse_compound()))
+            else:
+                return steps
+
+    def parse_compound(self):
+        node_type = self.take('word')[1]
+        value = None
+        if self.peek()[0] == '=':
+            self.take('=')
+            kind, text, _ = self.take()
+            if kind not in ('word', 'value'):
+                raise QueryError(f"Expected a value after '=', got {text!r}")
+            value = text
+        has = []
+        while self.peek()[0] == 'has':
+            self.take('has')
+            has.append(self.parse_list())
+            self.take(')')
+        return node_type, value, has
+
+
+def parse_selector(selector):
+    """Parse a selector string into a list of step chains."""
+    if not selector or not selector.strip():
+        raise QueryError("Empty selector")
+    return _SelectorParser(selector).parse()
+
+
+class QueryIndex:
+    def __init__(self, ast):
+        self.nodes, parent, _, depth = flatten(ast)
+        n = len(self.nodes)
+        self.parent = np.asarray(parent, dtype=np.int64)
+        self.depth = np.asarray(depth, dtype=np.int64)
+
+        # Last preorder id inside each subtree, pushed up one level at a time
+        self.end = np.arange(n, dtype=np.int64)
+        for level in range(int(self.depth.max()) if n else 0, 0, -1):
+            ids = np.flatnonzero(self.depth == level)
+            np.maximum.at(self.end, self.parent[ids], self.end[ids])
+
+        by_type = {}
+        by_value = {}
+        for i, node in enumerate(self.nodes):
+            by_type.setdefault(node.node_type, []).append(i)
+            if node.value is not None:
+                by_value.setdefault((node.node_type, str(node.value)), []).append(i)
+                by_value.setdefault(('*', str(node.value)), []).append(i)
+        self.by_type = {key: np.asarray(ids, dtype=np.int64) for key, ids in by_type.items()}
+        self.by_value = {key: np.asarray(ids, dtype=np.int64) for key, ids in by_value.items()}
+        self.all = np.arange(n, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def _postings(self, node_type, value):
+        if value is not None:
+            ids = self.by_value.get((node_type, value))
+        elif node_type == '*':
+            ids = self.all
+        else:
+            ids = self.by_type.get(node_type)
+        return ids if ids is not None else np.empty(0, dtype=np.int64)
+
+    def _under(self, candidates, ancestors):
+        """Candidates that lie strictly inside the subtree of some ancestor."""
+        if not len(candidates) or not len(ancestors):
+            return candidates[:0]
+        # Subtree intervals are nested or disjoint; keep only the outermost
+        starts = ancestors
+        ends = self.end[ancestors]
+        outer = ends > np.concatenate(([-1], np.maximum.accumulate(ends)[:-1]))
+        starts, ends = starts[outer], ends[outer]
+        slot = np.searchsorted(starts, candidates, side='left') - 1
+        inside = (slot >= 0) & (candidates <= ends[np.maximum(slot, 0)])
+        return candidates[inside]
+
+    def _containing(self, candidates, descendants):
+        """Candidates with at least one of `descendants` strictly inside their subtree."""
+        if not len(candidates) or not len(descendants):
+            return candidates[:0]
+        slot = np.searchsorted(descendants, candidates, side='right')
+        found = slot < len(descendants)
+        first = descendants[np.minimum(slot, len(descendants) - 1)]
+        return candidates[found & (first <= self.end[candidates])]
+
+    def _compound(self, compound):
+        node_type, value, has = compound
+        ids = self._postings(node_type, value)
+        for selectors in has:
+            ids = self._containing(ids, self._select(selectors))
+        return ids
+
+    def _chain(self, steps):
+        current = None
+        for combinator, compound in steps:
+            ids = self._compound(compound)
+            if combinator == 'descendant':
+                ids = self._under(ids, current)
+            elif combinator == 'child':
+                ids = ids[np.isin(self.parent[ids], current)]
+            current = ids
+        return current
+
+    def _select(self, selectors):
+        results = [self._chain(steps) for steps in selectors]
+        return np.unique(np.concatenate(results)) if len(results) > 1 else results[0]
+
+    def select(self, selector):
+        """Preorder ids of all nodes matching `selector`, in document order."""
+        return self._select(parse_selector(selector))
+
+    def describe(self, node_id):
+        node = self.nodes[node_id]
+        path = []
+        ancestor = int(self.parent[node_id])
+        while ancestor >= 0:
+            parent = self.nodes[ancestor]
+            path.append(f"{parent.node_type}: {parent.value}" if parent.value else parent.node_type)
+            ancestor = int(self.parent[ancestor])
+        return {
+            'id': int(node_id),
+            'type': node.node_type,
+            'value': node.value,
+            'depth': int(self.depth[node_id]),
+            'subtree_size': int(self.end[node_id] - node_id + 1),
+            'path': ' > '.join(reversed(path))
+        }
+
+
+class QueryIndexCache:
+    """Small LRU of QueryIndex objects keyed by source hash."""
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, build):
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None:
+                self._indexes.move_to_end(key)
+                return index
+        index = build()
+        with self._lock:
+            self._indexes[key] = index
+            if len(self._indexes) > self.maxsize:
+                self._indexes.popitem(last=False)
+        return index
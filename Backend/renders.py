@@ -0,0 +1,178 @@
+import hashlib
+import os
+import re
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# On-disk store for rendered AST images.
+#
+# Renderers write straight into the store and the servers hand out a render
+# id; the bytes are later streamed from disk by GET /image/<render-id> rather
+# than being base64-encoded into the /parse JSON response.
+
+RENDER_ROOT = os.environ.get('AST_RENDER_DIR', os.path.join(tempfile.gettempdir(), 'ast-renders'))
+
+MIMETYPES = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml'
+}
+
+_ID_RE = re.compile(r'[0-9a-f]{32}')
+
+# Progressively cheaper ways to render a DOT graph as (level, format, extra
+# dot arguments); the "pruned" level renders the depth-pruned graph. When
+# every level misses the deadline the caller serves the text AST only.
+DEGRADATION_LADDER = [
+    ('full', 'png', []),
+    ('low-dpi', 'png', ['-Gdpi=72']),
+    ('svg', 'svg', []),
+    ('pruned', 'svg', [])
+]
+TEXT_ONLY = 'text'
+PRUNE_DEPTH = 6
+# Render ids whose dot process was killed, with the longest timeout it
+# overran. A level is only tried again once at least OVERRUN_RETRY times that
+# long is available, so repeat requests for a source too big for a full
+# render go straight to the cheaper level already in the store, while a
+# request with a much larger budget still gets a real attempt
+OVERRUN_MEMORY = 4096
+OVERRUN_RETRY = 2.0
+
+_overruns = OrderedDict()
+_overruns_lock = threading.Lock()
+
+
+def record_overrun(rid, timeout):
+    """Remember that rendering `rid` was killed after `timeout` seconds."""
+    with _overruns_lock:
+        _overruns[rid] = max(timeout, _overruns.get(rid, 0.0))
+        _overruns.move_to_end(rid)
+        if len(_overruns) > OVERRUN_MEMORY:
+            _overruns.popitem(last=False)
+
+
+def known_overrun(rid, timeout):
+    """Whether rendering `rid` is known not to fit in `timeout` seconds."""
+    with _overruns_lock:
+        overran = _overruns.get(rid)
+    return overran is not None and timeout < overran * OVERRUN_RETRY
+
+
+def render_id(*parts):
+    """Derive a stable render id from the source hash and render options."""
+    return hashlib.sha256('\0'.join(str(part) for part in parts).encode('utf-8')).hexdigest()[:32]
+
+
+class RenderStore:
+    def __init__(self, root=RENDER_ROOT, max_entries=256):
+        self.root = root
+        self.max_entries = max_entries
+        os.makedirs(root, exist_ok=True)
+
+    def output_path(self, render_id, fmt):
+        """Path a renderer should write `fmt` output for `render_id` to."""
+        if fmt not in MIMETYPES:
+            raise ValueError(f"Unsupported image format: {fmt}")
+        return os.path.join(self.root, f'{render_id}.{fmt}')
+
+    def scratch_path(self, render_id, suffix):
+        # Unique per call so concurrent renders of the same id never collide
+        return os.path.join(self.root, f'{render_id}.{os.getpid()}-{uuid.uuid4().hex[:8]}{suffix}')
+
+    def lookup(self, render_id):
+        """Return (path, mimetype) for a stored render, or None."""
+        if not _ID_RE.fullmatch(render_id):
+            return None
+        for fmt, mimetype in MIMETYPES.items():
+            path = os.path.join(self.root, f'{render_id}.{fmt}')
+            if os.path.exists(path):
+                return path, mimetype
+        return None
+
+    def commit(self, render_id, fmt, temp_path):
+        """Atomically move a finished render into place and evict old entries."""
+        path = self.output_path(render_id, fmt)
+        os.replace(temp_path, path)
+        self._evict()
+        return path
+
+    def write(self, render_id, fmt, data):
+        temp_path = self.scratch_path(render_id, f'.{fmt}')
+        mode = 'w' if isinstance(data, str) else 'wb'
+        with open(temp_path, mode) as out:
+            out.write(data)
+        return self.commit(render_id, fmt, temp_path)
+
+    def metadata(self, render_id):
+        """Response fields for a stored render, or None if it isn't (or is no longer) stored."""
+        stored = self.lookup(render_id)
+        if stored is None:
+            return None
+        path, mimetype = stored
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            # Evicted between the lookup and the stat
+            return None
+        return {
+            'render_id': render_id,
+            'image_url': f'/image/{render_id}',
+            'content_type': mimetype,
+            'size': size
+        }
+
+    def _evict(self):
+        entries = []
+        with os.scandir(self.root) as it:
+            for entry in it:
+                name, _, fmt = entry.name.partition('.')
+                if fmt in MIMETYPES and _ID_RE.fullmatch(name):
+                    entries.append((entry.stat().st_mtime, entry.path))
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort()
+        for _, path in entries[:len(entries) - self.max_entries]:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+
+def render_with_deadline(store, key, dot_source, pruned_source, budget):
+    """Render DOT into `store`, degrading to cheaper output to meet `budget` seconds.
+
+    `pruned_source` is a callable producing the depth-pruned DOT and is only
+    called if that level is reached. Returns (render_id or None, level).
+    A timed-out dot process is killed by subprocess.run before moving on.
+    """
+    deadline = time.monotonic() + budget
+    last = len(DEGRADATION_LADDER) - 1
+    for i, (level, fmt, args) in enumerate(DEGRADATION_LADDER):
+        rid = render_id(key, 'dot', level)
+        if store.lookup(rid):
+            return rid, level
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        # Leave half of what is left for the cheaper levels
+        timeout = remaining if i == last else remaining / 2
+        if known_overrun(rid, timeout):
+            continue
+        source = pruned_source() if level == 'pruned' else dot_source
+        out_path = store.scratch_path(rid, f'.{fmt}')
+        try:
+            subprocess.run(['dot', f'-T{fmt}', *args, '-o', out_path], input=source, text=True,
+                           check=True, capture_output=True, timeout=timeout)
+            store.commit(rid, fmt, out_path)
+            return rid, level
+        except subprocess.TimeoutExpired:
+            record_overrun(rid, timeout)
+            continue
+        finally:
+            if os.path.exists(out_path):
+                os.unlink(out_path)
+    return None, TEXT_ONLY
@@ -0,0 +1,219 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+
+# Result cache shared by every worker process on the host.
+#
+# Entries live in one SQLite database in WAL mode, so any number of worker
+# processes (prefork.py, several main2.py/app.py instances) read concurrently
+# while one writes, and the cache survives restarts. Values are raw bytes;
+# anything over `compress_over` bytes is zlib-compressed when that actually
+# saves space (SVG does, PNG mostly doesn't). When the stored size exceeds
+# `max_bytes` the least recently used entries are evicted. Hit/miss counters
+# are kept in the database too, so stats() covers all workers.
+#
+# Lookups are plain reads and never take the write lock. The hit/miss counts
+# and access times they produce are kept in process memory and written in
+# one batch with the next store, or once FLUSH_EVERY lookups or
+# FLUSH_INTERVAL seconds have gone by, so LRU order and the shared counters
+# lag by at most that much. The stored size is kept as a running total in
+# the counters table instead of being summed on every store.
+
+CACHE_PATH = os.environ.get('AST_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'ast-cache.sqlite3'))
+CACHE_MAX_BYTES = int(os.environ.get('AST_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+FLUSH_EVERY = int(os.environ.get('AST_CACHE_FLUSH_EVERY', 256))
+FLUSH_INTERVAL = float(os.environ.get('AST_CACHE_FLUSH_INTERVAL', 1.0))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    compressed INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    stored INTEGER NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+_COUNTERS = ('hits', 'misses', 'stores', 'evictions')
+
+
+class ResultCache:
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES, compress_over=4096):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.compress_over = compress_over
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._reset_pending()
+        db = self._connection()
+        db.executescript(_SCHEMA)
+        with self._transaction() as db:
+            db.executemany("INSERT OR IGNORE INTO counters VALUES (?, 0)", [(name,) for name in _COUNTERS])
+            # Databases from before the running total get it computed once
+            db.execute("INSERT OR IGNORE INTO counters SELECT 'stored_bytes', total(stored) FROM entries")
+
+    def _connection(self):
+        # One connection per thread, reopened in forked children
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    def _transaction(self):
+        return _Transaction(self._connection())
+
+    def _reset_pending(self):
+        self._pending_pid = os.getpid()
+        self._hits = 0
+        self._misses = 0
+        self._accessed = {}
+        self._flushed = time.monotonic()
+
+    def _take_pending(self):
+        """Unwritten (hits, misses, {key: accessed}), clearing them."""
+        with self._lock:
+            if self._pending_pid != os.getpid():
+                # A forked child starts with its parent's counts; they aren't its own
+                self._reset_pending()
+            pending = self._hits, self._misses, self._accessed
+            self._reset_pending()
+        return pending
+
+    def _write_pending(self, db):
+        hits, misses, accessed = self._take_pending()
+        if hits or misses:
+            db.executemany("UPDATE counters SET value = value + ? WHERE name = ?",
+                           [(hits, 'hits'), (misses, 'misses')])
+        if accessed:
+            db.executemany("UPDATE entries SET accessed = ? WHERE key = ?",
+                           [(when, key) for key, when in accessed.items()])
+
+    def flush(self):
+        """Write the hit/miss counts and access times buffered by get()."""
+        with self._transaction() as db:
+            self._write_pending(db)
+
+    def get(self, key):
+        """Return the bytes stored under `key`, or None."""
+        row = self._connection().execute("SELECT value, compressed FROM entries WHERE key = ?", (key,)).fetchone()
+        with self._lock:
+            if self._pending_pid != os.getpid():
+                self._reset_pending()
+            if row is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+                self._accessed[key] = time.time()
+            due = (self._hits + self._misses >= FLUSH_EVERY or
+                   time.monotonic() - self._flushed >= FLUSH_INTERVAL)
+        if due:
+            self.flush()
+        if row is None:
+            return None
+        value, compressed = row
+        return zlib.decompress(value) if compressed else value
+
+    def put(self, key, data):
+        size = len(data)
+        compressed = 0
+        if size > self.compress_over:
+            packed = zlib.compress(data, 6)
+            if len(packed) < size * 0.9:
+                data, compressed = packed, 1
+        with self._transaction() as db:
+            self._write_pending(db)
+            replaced = db.execute("SELECT stored FROM entries WHERE key = ?", (key,)).fetchone()
+            db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                       (key, data, compressed, size, len(data), time.time()))
+            db.execute("UPDATE counters SET value = value + 1 WHERE name = 'stores'")
+            db.execute("UPDATE counters SET value = value + ? WHERE name = 'stored_bytes'",
+                       (len(data) - (replaced[0] if replaced else 0),))
+            self._evict(db)
+
+    def get_json(self, key):
+        data = self.get(key)
+        return None if data is None else json.loads(data)
+
+    def put_json(self, key, value):
+        self.put(key, json.dumps(value, separators=(',', ':')).encode('utf-8'))
+
+    def _evict(self, db):
+        total = db.execute("SELECT value FROM counters WHERE name = 'stored_bytes'").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Evict down to 90% so a full cache doesn't evict on every store
+        target = total - self.max_bytes * 0.9
+        evicted = 0
+        freed = 0
+        for key, stored in db.execute("SELECT key, stored FROM entries ORDER BY accessed").fetchall():
+            if freed >= target:
+                break
+            db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            freed += stored
+            evicted += 1
+        db.execute("UPDATE counters SET value = value + ? WHERE name = 'evictions'", (evicted,))
+        db.execute("UPDATE counters SET value = value - ? WHERE name = 'stored_bytes'", (freed,))
+
+    def stats(self):
+        self.flush()
+        db = self._connection()
+        counters = {name: value for name, value in db.execute("SELECT name, value FROM counters").fetchall()
+                    if name in _COUNTERS}
+        entries, size, stored = db.execute("SELECT count(*), total(size), total(stored) FROM entries").fetchone()
+        lookups = counters['hits'] + counters['misses']
+        return {
+            **counters,
+            'hit_rate': round(counters['hits'] / lookups, 4) if lookups else 0.0,
+            'entries': entries,
+            'bytes': int(size),
+            'stored_bytes': int(stored),
+            'max_bytes': self.max_bytes
+        }
+
+
+class _Transaction:
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+def cache_render(cache, store, rid):
+    """Copy a committed render from the store into the shared cache."""
+    stored = store.lookup(rid)
+    if stored:
+        path, _ = stored
+        with open(path, 'rb') as f:
+            cache.put(f'image:{rid}:{os.path.splitext(path)[1][1:]}', f.read())
+
+
+def restore_render(cache, store, rid):
+    """Look a render up in the store, refilling it from the cache if needed."""
+    stored = store.lookup(rid)
+    if stored:
+        return stored
+    for fmt in ('png', 'svg'):
+        data = cache.get(f'image:{rid}:{fmt}')
+        if data is not None:
+            store.write(rid, fmt, data)
+            return store.lookup(rid)
+    return None
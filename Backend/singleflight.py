@@ -0,0 +1,68 @@
+import threading
+import time
+
+# Coalescing of identical in-flight requests.
+#
+# The first caller for a key runs the work; callers that arrive with the same
+# key while it is still running block until it finishes and get the same
+# result (or exception) instead of repeating tokenize/parse/dot. Only
+# concurrent duplicates are merged - once the leader returns, the key is
+# forgotten and the result cache takes over.
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executed = 0
+        self.coalesced = 0
+        self.saved_seconds = 0.0
+
+    def do(self, key, func, *args):
+        """Run func(*args) once per concurrent `key`; returns (result, shared)."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        start = time.perf_counter()
+        try:
+            call.result = func(*args)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                # Every waiter would otherwise have done the same work
+                self.saved_seconds += (time.perf_counter() - start) * call.waiters
+            call.done.set()
+        return call.result, False
+
+    def stats(self):
+        with self._lock:
+            return {
+                'executed': self.executed,
+                'coalesced': self.coalesced,
+                'in_flight': len(self._calls),
+                'saved_seconds': round(self.saved_seconds, 3)
+            }
@@ -0,0 +1,301 @@
+import contextlib
+import gc
+import hashlib
+import mmap
+import os
+import re
+import struct
+import tempfile
+import uuid
+
+import numpy as np
+
+from layout import flatten
+from lexer import Token
+from parser import ASTNode
+
+# Binary AST snapshots.
+#
+# A snapshot holds one parsed source: its tokens, its AST and its symbol
+# records, so a large file that was parsed before a restart need not be
+# tokenized and parsed again. The layout is
+#
+#   header   magic, format version, sha256 of the source, counts and the
+#            byte offset of every section below
+#   nodes    one fixed-width record per AST node in preorder:
+#            (type, value, parent, end) where type/value index the string
+#            pool (value -1 for None) and end is the last preorder id in the
+#            node's subtree, so the children of i start at i + 1 and each
+#            next sibling at end + 1
+#   tokens   (type, value, line, column) per token
+#   symbols  (name, kind, line, column, scope) per symbol record, scope -1
+#            for file scope
+#   strings  u64 offsets into a UTF-8 blob; every distinct string once
+#
+# Sections are 8-byte aligned little-endian arrays, so Snapshot maps the
+# file read-only and views them as NumPy arrays without reading them.
+# Worker processes mapping the same file share its pages. Nodes and
+# strings are only decoded when they're touched: through the lazy `root`
+# node, or all at once by to_ast().
+
+SNAPSHOT_ROOT = os.environ.get('AST_SNAPSHOT_DIR', os.path.join(tempfile.gettempdir(), 'ast-snapshots'))
+SNAPSHOT_MIN_NODES = int(os.environ.get('AST_SNAPSHOT_MIN_NODES', 5000))
+
+MAGIC = b'ASTSNAP\0'
+VERSION = 1
+HEADER = struct.Struct('<8sHH32s4I5Q')
+
+NODE = np.dtype([('type', '<u4'), ('value', '<i4'), ('parent', '<i4'), ('end', '<u4')])
+TOKEN = np.dtype([('type', '<u4'), ('value', '<u4'), ('line', '<u4'), ('column', '<u4')])
+SYMBOL = np.dtype([('name', '<u4'), ('kind', '<u4'), ('line', '<u4'), ('column', '<u4'), ('scope', '<i4')])
+
+_ID_RE = re.compile(r'[0-9a-f]{32}')
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def write_snapshot(path, source, ast, tokens, symbols=()):
+    """Serialize a parse of `source` to `path`, atomically replacing any existing file."""
+    with _collector_paused():
+        nodes, parent, children, _ = flatten(ast)
+        end = list(range(len(nodes)))
+        for i in range(len(nodes) - 1, -1, -1):
+            if children[i]:
+                end[i] = end[children[i][-1]]
+        # (dtype, columns in field order, fields holding strings)
+        layouts = [
+            (NODE, [[node.node_type for node in nodes],
+                    [node.value if node.value is None else str(node.value) for node in nodes],
+                    parent, end], ('type', 'value')),
+            (TOKEN, [[token.type for token in tokens], [token.value for token in tokens],
+                     [token.line for token in tokens], [token.column for token in tokens]], ('type', 'value')),
+            (SYMBOL, list(zip(*symbols)) or [()] * 5, ('name', 'kind', 'scope'))
+        ]
+
+    # One pool for every string column; None is stored as -1
+    pool = {}
+    for dtype, columns, string_fields in layouts:
+        for name, column in zip(dtype.names, columns):
+            if name in string_fields:
+                pool.update(dict.fromkeys(column))
+    pool.pop(None, None)
+    strings = list(pool)
+    ids = {string: i for i, string in enumerate(strings)}
+    ids[None] = -1
+
+    tables = []
+    for dtype, columns, string_fields in layouts:
+        rows = np.empty(len(columns[0]), dtype=dtype)
+        for name, column in zip(dtype.names, columns):
+            rows[name] = list(map(ids.__getitem__, column)) if name in string_fields else column
+        tables.append(rows)
+
+    encoded = [string.encode('utf-8') for string in strings]
+    string_offsets = np.zeros(len(encoded) + 1, dtype='<u8')
+    np.cumsum([len(s) for s in encoded], out=string_offsets[1:])
+
+    sections = [table.tobytes() for table in tables] + [string_offsets.tobytes(), b''.join(encoded)]
+    offsets = []
+    position = _align(HEADER.size)
+    for data in sections:
+        offsets.append(position)
+        position = _align(position + len(data))
+    header = HEADER.pack(MAGIC, VERSION, 0, hashlib.sha256(source.encode('utf-8')).digest(),
+                         *(len(table) for table in tables), len(encoded), *offsets)
+
+    temp_path = f'{path}.{os.getpid()}-{uuid.uuid4().hex[:8]}.tmp'
+    try:
+        with open(temp_path, 'wb') as out:
+            out.write(header)
+            for offset, data in zip(offsets, sections):
+                out.write(b'\0' * (offset - out.tell()))
+                out.write(data)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+
+
+@contextlib.contextmanager
+def _collector_paused():
+    # Bulk-built nodes and tokens are acyclic; without this the allocations
+    # set off repeated collections that cost more than building them
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+class SnapshotNode:
+    """Read-only ASTNode look-alike backed by a snapshot's node table."""
+
+    __slots__ = ('_snapshot', 'index')
+
+    def __init__(self, snapshot, index):
+        self._snapshot = snapshot
+        self.index = index
+
+    @property
+    def node_type(self):
+        return self._snapshot.string(int(self._snapshot.nodes['type'][self.index]))
+
+    @property
+    def value(self):
+        value = int(self._snapshot.nodes['value'][self.index])
+        return None if value < 0 else self._snapshot.string(value)
+
+    @property
+    def children(self):
+        return [SnapshotNode(self._snapshot, child) for child in self._snapshot.children(self.index)]
+
+    def __str__(self):
+        return f"{self.node_type}: {self.value}" if self.value else self.node_type
+
+
+class Snapshot:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < HEADER.size:
+            raise SnapshotError(f"Truncated snapshot: {path}")
+        (magic, version, _, self.digest, node_count, token_count, symbol_count, string_count,
+         nodes_at, tokens_at, symbols_at, offsets_at, data_at) = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            raise SnapshotError(f"Not an AST snapshot: {path}")
+        if version != VERSION:
+            raise SnapshotError(f"Snapshot format {version}, expected {VERSION}")
+        if offsets_at + (string_count + 1) * 8 > len(self._map):
+            raise SnapshotError(f"Truncated snapshot: {path}")
+        self.nodes = np.frombuffer(self._map, dtype=NODE, count=node_count, offset=nodes_at)
+        self.token_table = np.frombuffer(self._map, dtype=TOKEN, count=token_count, offset=tokens_at)
+        self.symbol_table = np.frombuffer(self._map, dtype=SYMBOL, count=symbol_count, offset=symbols_at)
+        self.string_offsets = np.frombuffer(self._map, dtype='<u8', count=string_count + 1, offset=offsets_at)
+        self._data_at = data_at
+        self._strings = {}
+        self._pooled = False
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def matches(self, source):
+        return self.digest == hashlib.sha256(source.encode('utf-8')).digest()
+
+    def string(self, index):
+        value = self._strings.get(index)
+        if value is None:
+            start = self._data_at + int(self.string_offsets[index])
+            end = self._data_at + int(self.string_offsets[index + 1])
+            value = self._strings[index] = self._map[start:end].decode('utf-8')
+        return value
+
+    def _pool(self):
+        """Every pooled string, decoded in one pass (for whole-table loads)."""
+        if not self._pooled:
+            offsets = self.string_offsets.tolist()
+            data = self._map[self._data_at:self._data_at + offsets[-1]]
+            self._strings = dict(enumerate(data[offsets[i]:offsets[i + 1]].decode('utf-8')
+                                           for i in range(len(offsets) - 1)))
+            # Index -1 stands for None
+            self._strings[-1] = None
+            self._pooled = True
+        return self._strings
+
+    def _decode(self, ids):
+        pool = self._pool()
+        return [pool[i] for i in ids]
+
+    def children(self, index):
+        end = int(self.nodes['end'][index])
+        child = index + 1
+        while child <= end:
+            yield child
+            child = int(self.nodes['end'][child]) + 1
+
+    @property
+    def root(self):
+        return SnapshotNode(self, 0)
+
+    def to_ast(self):
+        """Materialize the whole tree as ASTNodes."""
+        types = self._decode(self.nodes['type'].tolist())
+        values = self._decode(self.nodes['value'].tolist())
+        parent = self.nodes['parent'].tolist()
+        with _collector_paused():
+            nodes = list(map(ASTNode, types, values))
+            # Preorder: appending in id order keeps children in source order
+            for i in range(1, len(nodes)):
+                nodes[parent[i]].children.append(nodes[i])
+        return nodes[0]
+
+    def tokens(self):
+        table = self.token_table
+        types = self._decode(table['type'].tolist())
+        values = self._decode(table['value'].tolist())
+        with _collector_paused():
+            return list(map(Token, types, values, table['line'].tolist(), table['column'].tolist()))
+
+    def symbols(self):
+        """Symbol records in the form parser.Parser collects them."""
+        table = self.symbol_table
+        columns = (self._decode(table['name'].tolist()), self._decode(table['kind'].tolist()),
+                   table['line'].tolist(), table['column'].tolist(), self._decode(table['scope'].tolist()))
+        with _collector_paused():
+            return list(zip(*columns))
+
+
+class SnapshotStore:
+    def __init__(self, root=SNAPSHOT_ROOT, max_entries=1024, min_nodes=SNAPSHOT_MIN_NODES):
+        self.root = root
+        self.max_entries = max_entries
+        self.min_nodes = min_nodes
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, source_hash):
+        if not _ID_RE.fullmatch(source_hash):
+            raise ValueError(f"Invalid source hash: {source_hash}")
+        return os.path.join(self.root, f'{source_hash}.astsnap')
+
+    def load(self, source_hash, source):
+        """The snapshot of `source`, or None if there is no usable one."""
+        path = self.path(source_hash)
+        try:
+            snapshot = Snapshot(path)
+        except FileNotFoundError:
+            return None
+        except (SnapshotError, ValueError, OSError):
+            # Older format or a damaged file; it's rewritten on the next parse
+            return None
+        return snapshot if snapshot.matches(source) else None
+
+    def save(self, source_hash, source, ast, tokens, symbols=(), node_count=None):
+        """Write a snapshot if the tree is big enough to be worth keeping."""
+        if node_count is not None and node_count < self.min_nodes:
+            return False
+        write_snapshot(self.path(source_hash), source, ast, tokens, symbols)
+        self._evict()
+        return True
+
+    def _evict(self):
+        entries = []
+        with os.scandir(self.root) as it:
+            for entry in it:
+                name, _, suffix = entry.name.partition('.')
+                if suffix == 'astsnap' and _ID_RE.fullmatch(name):
+                    entries.append((entry.stat().st_mtime, entry.path))
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort()
+        for _, path in entries[:len(entries) - self.max_entries]:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,50 @@
+# Symbol index for one source file.
+#
+# parser.Parser records (name, kind, line, column, scope) for every Function,
+# Parameter, Declaration, Assignment and FunctionCall while it parses, so the
+# index costs one tuple append per symbol and no second walk over the AST.
+# SymbolIndex groups those records by name as [kind, line, column, scope]
+# lists; the grouped dict is also the JSON form, so a stored index is usable
+# for lookups as soon as it is loaded.
+
+SYMBOL_KINDS = ('Function', 'Parameter', 'Declaration', 'Assignment', 'FunctionCall')
+
+# Kinds that introduce a name; the rest refer to one
+DEFINITIONS = {'Function', 'Parameter', 'Declaration'}
+
+
+class SymbolIndex:
+    def __init__(self, names):
+        self.names = names
+
+    @classmethod
+    def from_records(cls, records):
+        names = {}
+        get = names.get
+        for name, kind, line, column, scope in records:
+            entries = get(name)
+            if entries is None:
+                names[name] = [(kind, line, column, scope)]
+            else:
+                entries.append((kind, line, column, scope))
+        return cls(names)
+
+    def __len__(self):
+        return sum(len(entries) for entries in self.names.values())
+
+    def lookup(self, name, kind=None):
+        """Locations of `name`, optionally only those of one kind."""
+        return [
+            {
+                'kind': entry_kind,
+                'role': 'definition' if entry_kind in DEFINITIONS else 'reference',
+                'line': line,
+                'column': column,
+                'scope': scope
+            }
+            for entry_kind, line, column, scope in self.names.get(name, [])
+            if kind is None or entry_kind == kind
+        ]
+
+    def to_json(self):
+        return self.names
@@ -1,4 +1,8 @@
+import io
+import os
 import string
+import sys
+import time
 
 # C Keywords
 # ------------------------------------------------------------------------
@@ -158,13 +162,13 @@ def tokenize( s ):
             definitions[identifier] = expansion
         elif pragma.startswith("#undef "):
             identifier = pragma.lstrip("#undef ")
-            if definitions.has_key(identifier):
+            if identifier in definitions:
                 del definitions[ identifier ]
         else:
             # Unknown pragma
             pass
     def _token():
-        if definitions.has_key(curtoken):
+        if curtoken in definitions:
             redefined = Token(definitions[curtoken])
             redefined.set( *curtoken.position() )
             return redefined
@@ -305,17 +309,17 @@ def parse_value(tokens):
             tokens.pop(0)
             value,tokens = parse_expression( tokens )
             if tokens[0]!=")":
-                print >>sys.stderr, "Parse Error at Line %d / Char %d - ( arguments must end with ')', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0])
+                print("Parse Error at Line %d / Char %d - ( arguments must end with ')', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0]), file=sys.stderr)
                 assert(0)
             tokens.pop(0)
         else:
             value,tokens = parse_value( tokens )
         inner = ('Prefix',(unary,value))
     elif is_keyword(tokens[0]):
-        print >>sys.stderr, "Parse Error at Line %d / Char %d - Value Expected at '%s', found keyword" % (tokens[0].line, tokens[0].pos, tokens[0])
+        print("Parse Error at Line %d / Char %d - Value Expected at '%s', found keyword" % (tokens[0].line, tokens[0].pos, tokens[0]), file=sys.stderr)
         assert(0)
     elif tokens[0] in string.punctuation:
-        print >>sys.stderr, "Parse Error at Line %d / Char %d - Value Expected at '%s', found punctuation" % (tokens[0].line, tokens[0].pos, tokens[0])
+        print("Parse Error at Line %d / Char %d - Value Expected at '%s', found punctuation" % (tokens[0].line, tokens[0].pos, tokens[0]), file=sys.stderr)
         assert(0)
     elif tokens[0][0] == '"':
         name = tokens.pop(0)
@@ -344,7 +348,7 @@ def parse_value(tokens):
                 else:
                     tokens.pop(0)
             if tokens[0]!=")":
-                print >>sys.stderr, "Parse Error at Line %d / Char %d - Function must have ')', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0])
+                print("Parse Error at Line %d / Char %d - Function must have ')', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0]), file=sys.stderr)
                 assert(0)
             tokens.pop(0)
             inner = ('Call',(inner,arguments))
@@ -352,7 +356,7 @@ def parse_value(tokens):
             tokens.pop(0)
             index,tokens = parse_expression( tokens )
             if tokens[0]!="]":
-                print >>sys.stderr, "Parse Error at Line %d / Char %d - Array Accessor must have ']', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0])
+                print("Parse Error at Line %d / Char %d - Array Accessor must have ']', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0]), file=sys.stderr)
                 assert(0)
             tokens.pop(0)
             inner = ('Index',(inner, index) )
@@ -368,19 +372,19 @@ def parse_value(tokens):
 
 def parse_if( tokens ):
     if tokens[0] not in ["if"]:
-        print >>sys.stderr, "Parse Error at Line %d / Char %d - if must start with 'if', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0])
+        print("Parse Error at Line %d / Char %d - if must start with 'if', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0]), file=sys.stderr)
         assert(0)
     tokens.pop(0)
     
     if tokens[0]!="(":
-        print >>sys.stderr, "Parse Error at Line %d / Char %d - if must have '(', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0])
+        print("Parse Error at Line %d / Char %d - if must have '(', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0]), file=sys.stderr)
         assert(0)
     tokens.pop(0)
     
     test,tokens = parse_expression( tokens )
     
     if tokens[0]!=")":
-        print >>sys.stderr, "Parse Error at Line %d / Char %d - if must have ')', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0])
+        print("Parse Error at Line %d / Char %d - if must have ')', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0]), file=sys.stderr)
         assert(0)
     tokens.pop(0)
     
@@ -396,19 +400,19 @@ def parse_if( tokens ):
 
 def parse_while( tokens ):
     if tokens[0] not in ["while"]:
-        print >>sys.stderr, "Parse Error at Line %d / Char %d - while must start with 'while', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0])
+        print("Parse Error at Line %d / Char %d - while must start with 'while', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0]), file=sys.stderr)
         assert(0)
     tokens.pop(0)
     
     if tokens[0]!="(":
-        print >>sys.stderr, "Parse Error at Line %d / Char %d - while must have '(', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0])
+        print("Parse Error at Line %d / Char %d - while must have '(', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0]), file=sys.stderr)
         assert(0)
     tokens.pop(0)
     
     test,tokens = parse_expression( tokens )
     
     if tokens[0]!=")":
-        print >>sys.stderr, "Parse Error at Line %d / Char %d - if must have ')', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0])
+        print("Parse Error at Line %d / Char %d - if must have ')', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0]), file=sys.stderr)
         assert(0)
     tokens.pop(0)
     
@@ -419,31 +423,31 @@ def parse_while( tokens ):
 
 def parse_for( tokens ):
     if tokens[0] not in ["for"]:
-        print >>sys.stderr, "Parse Error at Line %d / Char %d - for must start with 'for', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0])
+        print("Parse Error at Line %d / Char %d - for must start with 'for', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0]), file=sys.stderr)
         assert(0)
     tokens.pop(0)
     
     if tokens[0]!="(":
-        print >>sys.stderr, "Parse Error at Line %d / Char %d - for must have '(', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0])
+        print("Parse Error at Line %d / Char %d - for must have '(', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0]), file=sys.stderr)
         assert(0)
     tokens.pop(0)
     
     init,tokens = parse_expression( tokens )
     
     if tokens[0]!=";":
-        print >>sys.stderr, "Parse Error at Line %d / Char %d - for must have first ';', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0])
+        print("Parse Error at Line %d / Char %d - for must have first ';', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0]), file=sys.stderr)
         assert(0)
     tokens.pop(0)
     test,tokens = parse_expression( tokens )
     
     if tokens[0]!=";":
-        print >>sys.stderr, "Parse Error at Line %d / Char %d - for must have second ';', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0])
+        print("Parse Error at Line %d / Char %d - for must have second ';', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0]), file=sys.stderr)
         assert(0)
     tokens.pop(0)
     step,tokens = parse_expression( tokens )
     
     if tokens[0]!=")":
-        print >>sys.stderr, "Parse Error at Line %d / Char %d - if must have ')', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0])
+        print("Parse Error at Line %d / Char %d - if must have ')', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0]), file=sys.stderr)
         assert(0)
     tokens.pop(0)
     
@@ -455,7 +459,7 @@ def parse_for( tokens ):
 def parse_cast( tokens ):
     # This enforces (int)x or (int)(x), rather than int(x), that's not quite right
     if tokens[0]!="(":
-        print >>sys.stderr, "Parse Error at Line %d / Char %d - cast must start with '(', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0])
+        print("Parse Error at Line %d / Char %d - cast must start with '(', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0]), file=sys.stderr)
         assert(0)
     tokens.pop(0)
     # Get the Cast Type
@@ -463,7 +467,7 @@ def parse_cast( tokens ):
     if tokens[0] != ")":
         for e in expression:
             print (e)
-        print >>sys.stderr, "Parse Error at Line %d / Char %d - ')' expected after expression %s" % (tokens[0].line, tokens[0].pos, str(inner))
+        print("Parse Error at Line %d / Char %d - ')' expected after expression %s" % (tokens[0].line, tokens[0].pos, str(inner)), file=sys.stderr)
         assert(0)
     tokens.pop(0)
     # Get the Casted Value
@@ -471,7 +475,7 @@ def parse_cast( tokens ):
         tokens.pop(0)
         cast_value,tokens = parse_expression(tokens)
         if tokens[0] != ")":
-            print >>sys.stderr, "Parse Error at Line %d / Char %d - ')' expected after expression %s" % (tokens[0].line, tokens[0].pos, str(inner))
+            print("Parse Error at Line %d / Char %d - ')' expected after expression %s" % (tokens[0].line, tokens[0].pos, str(inner)), file=sys.stderr)
             assert(0)
         tokens.pop(0)
     else:
@@ -505,7 +509,7 @@ def parse_expression( tokens ):
                     if tokens[0] != ")":
                         for e in expression:
                             print (e)
-                        print >>sys.stderr, "Parse Error at Line %d / Char %d - ')' expected after expression %s" % (tokens[0].line, tokens[0].pos, str(inner))
+                        print("Parse Error at Line %d / Char %d - ')' expected after expression %s" % (tokens[0].line, tokens[0].pos, str(inner)), file=sys.stderr)
                         assert(0)
                     tokens.pop(0)
                     #break
@@ -558,19 +562,19 @@ def parse_expression( tokens ):
     elif len(expression) == 0:
         return ("Expression",[]),tokens
     else:
-        print >>sys.stderr, "Parse Error at Line %d / Char %d - Couldn't compress expression into tree" % (tokens[0].line, tokens[0].pos)
+        print("Parse Error at Line %d / Char %d - Couldn't compress expression into tree" % (tokens[0].line, tokens[0].pos), file=sys.stderr)
         for e in expression:
-            print >>sys.stderr, e
+            print(e, file=sys.stderr)
         assert(0)
 
 def parse_struct( tokens ):
     struct = []
     if tokens[0] not in ["struct","union"]:
-        print >>sys.stderr, "Parse Error at Line %d / Char %d - struct must start with 'struct' or 'union', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0])
+        print("Parse Error at Line %d / Char %d - struct must start with 'struct' or 'union', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0]), file=sys.stderr)
         assert(0)
     kind = "Struct" if (tokens.pop(0) == "struct") else "Union"
     if tokens[0]!="{":
-        print >>sys.stderr, "Parse Error at Line %d / Char %d - Blocks must start with 'struct {', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0])
+        print("Parse Error at Line %d / Char %d - Blocks must start with 'struct {', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0]), file=sys.stderr)
         assert(0)
     tokens.pop(0)
     while len(tokens):
@@ -583,11 +587,11 @@ def parse_struct( tokens ):
             declaration,tokens = parse_declaration(tokens)
             struct.append(declaration)
         if tokens[0]!=";":
-            print >>sys.stderr, "Parse Error at Line %d / Char %d - struct values must end in ';', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0])
+            print("Parse Error at Line %d / Char %d - struct values must end in ';', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0]), file=sys.stderr)
             assert(0)
         tokens.pop(0)
     if tokens[0]!="}":
-        print >>sys.stderr, "Parse Error at Line %d / Char %d - Blocks must start with 'struct {', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0])
+        print("Parse Error at Line %d / Char %d - Blocks must start with 'struct {', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0]), file=sys.stderr)
         assert(0)
     tokens.pop(0)
     
@@ -596,19 +600,19 @@ def parse_struct( tokens ):
 
 def parse_switch(tokens):
     if tokens[0] not in ["switch"]:
-        print >>sys.stderr, "Parse Error at Line %d / Char %d - switch must start with 'switch', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0])
+        print("Parse Error at Line %d / Char %d - switch must start with 'switch', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0]), file=sys.stderr)
         assert(0)
     tokens.pop(0)
     
     if tokens[0]!="(":
-        print >>sys.stderr, "Parse Error at Line %d / Char %d - for must have '(', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0])
+        print("Parse Error at Line %d / Char %d - for must have '(', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0]), file=sys.stderr)
         assert(0)
     tokens.pop(0)
     
     test,tokens = parse_expression( tokens )
     
     if tokens[0]!=")":
-        print >>sys.stderr, "Parse Error at Line %d / Char %d - functions arguments must have ')', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0])
+        print("Parse Error at Line %d / Char %d - functions arguments must have ')', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0]), file=sys.stderr)
         assert(0)
     tokens.pop(0)
 
@@ -621,7 +625,7 @@ def parse_type(tokens):
     while tokens[0] in modifiers:
         mods.append( tokens.pop(0) )
     if not ( tokens[0] in types ):
-        print >>sys.stderr, "Parse Error at Line %d / Char %d - expected type but found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0])
+        print("Parse Error at Line %d / Char %d - expected type but found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0]), file=sys.stderr)
         assert( tokens[0] in types )
     type = tokens.pop(0)
     isPointer = False
@@ -646,12 +650,12 @@ def parse_declaration( tokens ):
             tokens.pop(0)
             length,tokens = parse_expression( tokens )
             if tokens[0]!="]":
-                print >>sys.stderr, "Parse Error at Line %d / Char %d - Array Definition must end with ']', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0])
+                print("Parse Error at Line %d / Char %d - Array Definition must end with ']', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0]), file=sys.stderr)
                 assert(0)
             tokens.pop(0)
         if tokens[0]=="[":
             # Get Multi Dimensional Arrays
-            print >>sys.stderr, "Parse Error at Line %d / Char %d - Multi Dimensional Arrays don't work yet" %(tokens[0].line, tokens[0].pos)
+            print("Parse Error at Line %d / Char %d - Multi Dimensional Arrays don't work yet" %(tokens[0].line, tokens[0].pos), file=sys.stderr)
             assert(0)
         if not is_keyword(name):
             if tokens[0]=="=":
@@ -669,7 +673,7 @@ def parse_declaration( tokens ):
         elif tokens[0]==";":
             break
         if len(tokens):
-            print >>sys.stderr, "Parse Error at Line %d / Char %d - unknown token encountered at '%s'" % (tokens[0].line, tokens[0].pos, tokens[0])
+            print("Parse Error at Line %d / Char %d - unknown token encountered at '%s'" % (tokens[0].line, tokens[0].pos, tokens[0]), file=sys.stderr)
             assert(0)
     return ("Declaration", assignments), tokens
 
@@ -679,7 +683,7 @@ def parse_function( tokens ):
     name = tokens.pop(0)
     
     if tokens[0]!="(":
-        print >>sys.stderr, "Parse Error at Line %d / Char %d - Function must have '(', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0])
+        print("Parse Error at Line %d / Char %d - Function must have '(', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0]), file=sys.stderr)
         assert(0)
     tokens.pop(0)
     
@@ -695,7 +699,7 @@ def parse_function( tokens ):
         type,tokens = parse_type(tokens)
         argname = tokens.pop(0)
         if is_keyword(name):
-            print >>sys.stderr, "Parse Error at Line %d / Char %d - Function argument #%d's name '%s' cannot be a keyword" % (len(arguments)+1, name)
+            print("Parse Error at Line %d / Char %d - Function argument #%d's name '%s' cannot be a keyword" % (len(arguments)+1, name), file=sys.stderr)
             assert(0)
         arguments.append( (type,argname) )
         if tokens[0]!=",":
@@ -704,7 +708,7 @@ def parse_function( tokens ):
             tokens.pop(0)
     
     if tokens[0]!=")":
-        print >>sys.stderr, "Parse Error at Line %d / Char %d - Functions arguments must have ')', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0])
+        print("Parse Error at Line %d / Char %d - Functions arguments must have ')', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0]), file=sys.stderr)
         assert(0)
     tokens.pop(0)
     
@@ -714,7 +718,7 @@ def parse_function( tokens ):
         tokens.pop(0)
         block = None
     else:
-        print >>sys.stderr, "Parse Error at Line %d / Char %d - Functions must have '{', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0])
+        print("Parse Error at Line %d / Char %d - Functions must have '{', found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0]), file=sys.stderr)
         assert(0)
     return ("Function",(returntype,name,arguments,block)), tokens
 
@@ -748,7 +752,7 @@ def parse_statement( tokens ):
         literal,tokens = parse_value(tokens)
         statement = ("Case",literal)
         if tokens[0]!=":":
-            print >>sys.stderr, "Parse Error at Line %d / Char %d - case must end in a colon: found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0])
+            print("Parse Error at Line %d / Char %d - case must end in a colon: found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0]), file=sys.stderr)
         assert(tokens[0] == ":")
         tokens.pop(0)
         needsemicolon = False
@@ -756,7 +760,7 @@ def parse_statement( tokens ):
         tokens.pop(0)
         statement = ("default",None)
         if tokens[0]!=":":
-            print >>sys.stderr, "Parse Error at Line %d / Char %d - default must end in a colon: found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0])
+            print("Parse Error at Line %d / Char %d - default must end in a colon: found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0]), file=sys.stderr)
         assert(tokens[0] == ":")
         tokens.pop(0)
         needsemicolon = False
@@ -781,14 +785,14 @@ def parse_statement( tokens ):
         if tokens[0]==";" or tokens[0]==",":
             tokens.pop(0)
         else:
-            print >>sys.stderr, "Parse Error at Line %d / Char %d - Statements must end in a semicolon: found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0])
+            print("Parse Error at Line %d / Char %d - Statements must end in a semicolon: found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0]), file=sys.stderr)
             assert(tokens[0]==";")
     #print "Statement",statement,"\n"
     return statement, tokens
 
 def parse_block( tokens ):
     if tokens[0]!="{":
-        print >>sys.stderr, "Parse Error at Line %d / Char %d - Blocks must start with a {, found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0])
+        print("Parse Error at Line %d / Char %d - Blocks must start with a {, found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0]), file=sys.stderr)
         assert(0)
     tokens.pop(0)
     block = []
@@ -796,7 +800,7 @@ def parse_block( tokens ):
         statement,tokens = parse_statement_or_block(tokens)
         block.append( statement )
     if tokens[0]!="}":
-        print >>sys.stderr, "Parse Error at Line %d / Char %d - Blocks must end with a }, found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0])
+        print("Parse Error at Line %d / Char %d - Blocks must end with a }, found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0]), file=sys.stderr)
         assert(0)
     tokens.pop(0)
     #print "Block", block
@@ -816,29 +820,29 @@ def parse_root( tokens ):
         if tokens[0]==";":
             tokens.pop(0)
         else:
-            print >>sys.stderr, "Parse Error at Line %d / Char %d - Non-Function Declarations must end in a semicolon: found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0])
+            print("Parse Error at Line %d / Char %d - Non-Function Declarations must end in a semicolon: found %s instead" % (tokens[0].line, tokens[0].pos, tokens[0]), file=sys.stderr)
             assert(tokens[0]==";")
         return declaration
 
 # Print Abstract Syntax Tree (AST)
 # ------------------------------------------------------------------------
-def print_thing( thing, depth=0 ):
+def print_thing( thing, depth=0, out=None ):
     def p(str,d=0):
-        print( "\t"*(depth+d)+ str)
+        print( "\t"*(depth+d)+ str, file=out)
     try:
         name,value = thing
     except ValueError:
-        print ("Can't Unpack this variable:")
-        print (thing)
+        print ("Can't Unpack this variable:", file=out)
+        print (thing, file=out)
         assert(0)
     #p("THING:", name,value)
     if name == "Block":
         p("Block")
         for num,statement in enumerate(value):
-            print ("\t"*(depth)+ "Statement %d" %(num+1))
-            print_thing(statement,depth+1)
+            print ("\t"*(depth)+ "Statement %d" %(num+1), file=out)
+            print_thing(statement,depth+1,out=out)
     elif name == "Statement":
-        print_thing(value,depth)
+        print_thing(value,depth,out=out)
     elif name == "Math":
         symbol = value
         p("Math")
@@ -847,26 +851,26 @@ def print_thing( thing, depth=0 ):
     elif name == "Cast":
         type,expression = value
         p("Cast")
-        print_thing(expression,depth+1)
+        print_thing(expression,depth+1,out=out)
         p("To")
-        print_thing(type,depth+1)
+        print_thing(type,depth+1,out=out)
     elif name == "Prefix":
         p("Prefix")
         symbol, expression = value
         p(symbol)
-        print_thing(expression,depth+1)
+        print_thing(expression,depth+1,out=out)
     elif name == "Postfix":
         p("Postfix")
         expression, symbol = value
-        print_thing(expression,depth+1)
+        print_thing(expression,depth+1,out=out)
         p(symbol)
     elif name == "Binary":
         symbol,left,right = value
         p("(")
         p("Math '%s'" % symbol)
-        print_thing(left,depth+1)
+        print_thing(left,depth+1,out=out)
         p(symbol)
-        print_thing(right,depth+1)
+        print_thing(right,depth+1,out=out)
         p(")")
     elif name == "String":
         p("String")
@@ -877,9 +881,9 @@ def print_thing( thing, depth=0 ):
     elif name == "Index":
         p("Index")
         var, expression = value
-        print_thing(var,depth+1)
+        print_thing(var,depth+1,out=out)
         p("[")
-        print_thing(expression,depth+1)
+        print_thing(expression,depth+1,out=out)
         p("]")
     elif name == "Type":
         p("Type")
@@ -895,63 +899,63 @@ def print_thing( thing, depth=0 ):
             type,name,length,assignment = declaration
             if length:
                 p("Array of length",1)
-                print_thing(length,depth+2)
-            print_thing(type,depth+1)
+                print_thing(length,depth+2,out=out)
+            print_thing(type,depth+1,out=out)
             p("Name",1)
             p(name,2)
             if assignment:
                 p("Assigned the value",1)
-                print_thing(assignment,depth+2)
+                print_thing(assignment,depth+2,out=out)
     elif name == "Expression":
         p(name)
         p("(")
         if value:
-            print_thing(value,depth+1)
+            print_thing(value,depth+1,out=out)
         p(")")
     elif name=="Struct" or name=="Union":
         p(name)
         p("{")
         for expression in value:
-            print_thing(expression,depth+1)
+            print_thing(expression,depth+1,out=out)
         p("}")
     elif name=="If":
         test,action,alternative = value
         p(name)
         p("TEST",1)
-        print_thing(test,depth+2)
+        print_thing(test,depth+2,out=out)
         p("DO",1)
-        print_thing(action,depth+2)
+        print_thing(action,depth+2,out=out)
         if alternative:
             p("ELSE",1)
-            print_thing(alternative,depth+2)
+            print_thing(alternative,depth+2,out=out)
     elif name=="While":
         test,action = value
         p(name)
         p("TEST",1)
-        print_thing(test,depth+2)
+        print_thing(test,depth+2,out=out)
         p("DO",1)
-        print_thing(action,depth+2)
+        print_thing(action,depth+2,out=out)
     elif name=="For":
         init,test,step,action = value
         p(name)
         p("INIT",1)
-        print_thing(init,(depth+1)+1)
+        print_thing(init,(depth+1)+1,out=out)
         p("TEST",1)
-        print_thing(test,(depth+1)+1)
+        print_thing(test,(depth+1)+1,out=out)
         p("STEP",1)
-        print_thing(step,(depth+1)+1)
+        print_thing(step,(depth+1)+1,out=out)
         p("DO",1)
-        print_thing(action,depth+2)
+        print_thing(action,depth+2,out=out)
     elif name=="Break":
         p(name)
     elif name=="Continue":
         p(name)
     elif name=="Return":
         p(name)
-        print_thing(value,depth+1)
+        print_thing(value,depth+1,out=out)
     elif name=="Case":
         p(name)
-        print_thing(value,depth+1)
+        print_thing(value,depth+1,out=out)
     elif name=="Label":
         p(name)
         p(value,1)
@@ -966,27 +970,27 @@ def print_thing( thing, depth=0 ):
             p("Function Declaration")
         else:
             p("Function Header")
-        print_thing(returntype,depth+1)
+        print_thing(returntype,depth+1,out=out)
         p(name,1)
         if len(arguments):
             p("With %d Argument%s" %(len(arguments), "s" if len(arguments) > 1 else ""))
             for num,(argtype,argname) in enumerate(arguments):
                 p("Argument %d:" %(num+1),1)
-                print_thing(argtype,depth+2)
+                print_thing(argtype,depth+2,out=out)
                 p("Name",2)
                 p(argname,3)
         else:
             p("With No Arguments")
         if block:
             p("{")
-            print_thing(block,depth+1)
+            print_thing(block,depth+1,out=out)
             p("}")
     elif name=="Call":
         func,arguments = value
-        print_thing(func,depth+1)
+        print_thing(func,depth+1,out=out)
         p("(")
         for num,arg in enumerate(arguments):
-            print_thing(arg,depth+1)
+            print_thing(arg,depth+1,out=out)
             if num != len(arguments)-1:
                 p(",")
         p(")")
@@ -994,27 +998,27 @@ def print_thing( thing, depth=0 ):
         test,block = value
         p(name)
         p("(")
-        print_thing(test,depth+1)
+        print_thing(test,depth+1,out=out)
         p(")")
         p("{")
-        print_thing(block,depth+1)
+        print_thing(block,depth+1,out=out)
         p("}")
     else:
         p("Warning!  Unknown type '"+ str(name) +"'")
         p(str(name))
         p(str(value))
 
-def print_c( thing, depth, comments ):
+def print_c( thing, depth, comments, out=None ):
     def comment(str):
         if comments:
             p("// "+ str)
     def p(str,d=0):
-        print ("\t"*(depth+d)+ str)
+        print ("\t"*(depth+d)+ str, file=out)
     try:
         name,value = thing
     except ValueError:
-        print ("Can't Unpack this variable:")
-        print (thing)
+        print ("Can't Unpack this variable:", file=out)
+        print (thing, file=out)
         assert(0)
     comment( "THING: %s %s" % (name,str(value)) )
     comment( name )
@@ -1022,45 +1026,45 @@ def print_c( thing, depth, comments ):
         p("{")
         for num,statement in enumerate(value):
             comment( "Statement %d" %(num+1) )
-            print_c(statement,depth+1,comments)
+            print_c(statement,depth+1,comments,out=out)
         p("}")
     elif name == "Cast":
         type,expression = value
         p("(")
-        print_c(type,depth+1,comments)
+        print_c(type,depth+1,comments,out=out)
         p(")")
-        print_c(expression,depth+1,comments)
+        print_c(expression,depth+1,comments,out=out)
     elif name == "Prefix":
         symbol, expression = value
         p(symbol)
-        print_c(expression,depth+1,comments)
+        print_c(expression,depth+1,comments,out=out)
     elif name == "Postfix":
         expression, symbol = value
-        print_c(expression,depth+1,comments)
+        print_c(expression,depth+1,comments,out=out)
         p(symbol)
     elif name == "Binary":
         symbol,left,right = value
         p("(")
-        print_c(left,depth+1,comments)
+        print_c(left,depth+1,comments,out=out)
         p(symbol)
-        print_c(right,depth+1,comments)
+        print_c(right,depth+1,comments,out=out)
         p(")")
     elif name == "Ternary":
         test,yes,no = value
-        print_c(test,depth+1,comments)
+        print_c(test,depth+1,comments,out=out)
         p("?")
-        print_c(yes,depth+1,comments)
+        print_c(yes,depth+1,comments,out=out)
         p(":")
-        print_c(no,depth+1,comments)
+        print_c(no,depth+1,comments,out=out)
     elif name == "String":
         p('"%s"'%value)
     elif name == "Value":
         p(value)
     elif name == "Index":
         var, expression = value
-        print_c(var,depth+1,comments)
+        print_c(var,depth+1,comments,out=out)
         p("[")
-        print_c(expression,depth+1,comments)
+        print_c(expression,depth+1,comments,out=out)
         p("]")
     elif name == "Type":
         mods, type, isPointer = value
@@ -1072,20 +1076,20 @@ def print_c( thing, depth, comments ):
     elif name == "Declaration":
         for declaration in value:
             type,name,length,assignment = declaration
-            print_c(type,depth+1,comments)
+            print_c(type,depth+1,comments,out=out)
             p(name,1)
             if length:
                 p("[",1)
-                print_c(length,depth+2,comments)
+                print_c(length,depth+2,comments,out=out)
                 p("]",1)
             if assignment:
                 p("=",1)
-                print_c(assignment,depth+2,comments)
+                print_c(assignment,depth+2,comments,out=out)
             p(";")
     elif name == "Expression":
         p("(")
         if value:
-            print_c(value,depth+1,comments)
+            print_c(value,depth+1,comments,out=out)
         p(")")
     elif name=="Struct" or name=="Union":
         if name == "Struct":
@@ -1094,48 +1098,48 @@ def print_c( thing, depth, comments ):
             p("union")
         p("{")
         for expression in value:
-            print_c(expression,depth+1,comments)
+            print_c(expression,depth+1,comments,out=out)
         p("};")
     elif name=="If":
         test,action,alternative = value
         p("if(")
         comment( "TEST" )
-        print_c(test,depth+2,comments)
+        print_c(test,depth+2,comments,out=out)
         p(")")
         comment( "DO" )
         p("{")
-        print_c(action,depth+2,comments)
+        print_c(action,depth+2,comments,out=out)
         p("}")
         if alternative:
             comment( "ELSE" )
             p("else {",1)
-            print_c(alternative,depth+2,comments)
+            print_c(alternative,depth+2,comments,out=out)
             p("}",1)
     elif name=="While":
         test,action = value
         p("while(")
         comment( "TEST" )
-        print_c(test,depth+2,comments)
+        print_c(test,depth+2,comments,out=out)
         p(")")
         comment( "DO" )
         p("{",1)
-        print_c(action,depth+2,comments)
+        print_c(action,depth+2,comments,out=out)
         p("}",1)
     elif name=="For":
         init,test,step,action = value
         p("for(")
         comment( "INIT" )
-        print_c(init,(depth+1)+1,comments)
+        print_c(init,(depth+1)+1,comments,out=out)
         p(";")
         comment( "TEST" )
-        print_c(test,(depth+1)+1,comments)
+        print_c(test,(depth+1)+1,comments,out=out)
         p(";")
         comment( "STEP" )
-        print_c(step,(depth+1)+1,comments)
+        print_c(step,(depth+1)+1,comments,out=out)
         p(")")
         comment( "DO" )
         p("{")
-        print_c(action,depth+2,comments)
+        print_c(action,depth+2,comments,out=out)
         p("}")
     elif name=="Break":
         p("break;")
@@ -1143,11 +1147,11 @@ def print_c( thing, depth, comments ):
         p("continue;")
     elif name=="Return":
         p("return")
-        print_c(value,depth+1,comments)
+        print_c(value,depth+1,comments,out=out)
         p(";")
     elif name=="Case":
         p("case")
-        print_c(value,depth+1,comments)
+        print_c(value,depth+1,comments,out=out)
         p(":")
     elif name=="Label":
         p(value,1)
@@ -1158,7 +1162,7 @@ def print_c( thing, depth, comments ):
     elif name=="default":
         p("default:")
     elif name=="Statement":
-        print_c(value,depth,comments)
+        print_c(value,depth,comments,out=out)
         p(";")
     elif name=="Function":
         returntype,name,arguments,block = value
@@ -1168,14 +1172,14 @@ def print_c( thing, depth, comments ):
         else:
             comment( "Function Header" )
             pass
-        print_c(returntype,depth+1,comments)
+        print_c(returntype,depth+1,comments,out=out)
         p(name,1)
         p("(")
         if len(arguments):
             comment( "With %d Argument%s" %(len(arguments), "s" if len(arguments) > 1 else "") )
             for num,(argtype,argname) in enumerate(arguments):
                 comment( "Argument %d:" %(num+1) )
-                print_c(argtype,depth+2,comments)
+                print_c(argtype,depth+2,comments,out=out)
                 comment( "Name" )
                 p(argname,3)
                 if num != len(arguments)-1:
@@ -1186,15 +1190,15 @@ def print_c( thing, depth, comments ):
             p("void")
         p(")")
         if block:
-            print_c(block,depth,comments)
+            print_c(block,depth,comments,out=out)
         else:
             p(";")
     elif name=="Call":
         func,arguments = value
-        print_c(func,depth+1,comments)
+        print_c(func,depth+1,comments,out=out)
         p("(")
         for num,arg in enumerate(arguments):
-            print_c(arg,depth+1,comments)
+            print_c(arg,depth+1,comments,out=out)
             if num != len(arguments)-1:
                 p(",")
         p(")")
@@ -1202,20 +1206,118 @@ def print_c( thing, depth, comments ):
         test,block = value
         p("switch")
         p("(")
-        print_c(test,depth+1,comments)
+        print_c(test,depth+1,comments,out=out)
         p(")")
         p("{")
-        print_c(block,depth+1,comments)
+        print_c(block,depth+1,comments,out=out)
         p("}")
     else:
         p("Warning!  Unknown type '"+ str(name) +"'")
         p(str(name))
         p(str(value))
 
+# Batch driver
+# ------------------------------------------------------------------------
+# Every file gets its own output handles, so files can be processed in
+# parallel worker processes instead of swapping the global sys.stdout.
+# Saved outputs are written to a .part file and renamed when complete; a
+# file whose outputs are all newer than its source is skipped on the next
+# run, which makes an interrupted batch resumable.
+#
+# Outputs mirror each input's path relative to the common root of the
+# inputs, so a/x.c and b/x.c are saved as DIR/a/x.* and DIR/b/x.*. Inputs
+# that would still share an output (x.c next to x.h) are rejected before
+# anything runs, and each worker writes its own .part file.
+def input_root( files ):
+    if not files:
+        return os.curdir
+    return os.path.commonpath([os.path.dirname(os.path.abspath(filename)) for filename in files])
+
+def output_paths( filename, options ):
+    relative = os.path.relpath(os.path.abspath(filename), options.root)
+    base = os.path.splitext(relative)[0]
+    paths = {}
+    for enabled, kind in ((options.tokens, "tok"), (options.ast, "ast"), (options.code, "c")):
+        if enabled:
+            paths[kind] = os.path.join(options.directory, base + "." + kind)
+    return paths
+
+def find_collisions( files, options ):
+    owners = {}
+    collisions = []
+    for filename in files:
+        for path in output_paths(filename, options).values():
+            if path in owners:
+                collisions.append((owners[path], filename, path))
+            else:
+                owners[path] = filename
+    return collisions
+
+def is_up_to_date( filename, paths ):
+    source_time = os.path.getmtime(filename)
+    return len(paths) > 0 and all(os.path.exists(path) and os.path.getmtime(path) >= source_time
+                                  for path in paths.values())
+
+def process_file( task ):
+    filename, options = task
+    paths = output_paths(filename, options) if options.save else {}
+    if options.save and not options.force and is_up_to_date(filename, paths):
+        return filename, "skipped", 0.0, ""
+    start = time.perf_counter()
+    part = ".%d.part" % os.getpid()
+    if options.save:
+        for path in paths.values():
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        outs = dict((kind, open(path + part, "w")) for kind, path in paths.items())
+    else:
+        # Buffer everything so the parent can print whole files in order
+        buffer = io.StringIO()
+        outs = dict((kind, buffer) for kind in ("tok", "ast", "c"))
+        print (filename, file=buffer)
+    try:
+        data = open(filename, "r").read()
+        tokens = list(tokenize( data ))
+
+        # Print out the Lexer
+        if options.tokens:
+            print ("Lexical Analysis of " + filename, file=outs["tok"])
+            for i,token in enumerate( tokens ):
+                loc = ("%d (%d,%d): " %(i, token.line, token.pos)).ljust(16)
+                print (loc,token, file=outs["tok"])
+
+        # Parse tokens
+        if options.save:
+            if options.ast:
+                print ("AST code of " + filename, file=outs["ast"])
+            if options.code:
+                print ("// C code of " + filename, file=outs["c"])
+        while len(tokens):
+            block, tokens = parse_root( tokens )
+            if options.ast:
+                print_thing(block, out=outs["ast"])
+            if options.code:
+                print_c(block, 0, options.comments, out=outs["c"])
+    except Exception as e:
+        status, text = "error", "%s: %s" % (type(e).__name__, e)
+    else:
+        status, text = "ok", ""
+    finally:
+        if options.save:
+            for out in outs.values():
+                out.close()
+    if options.save:
+        for path in paths.values():
+            if status == "ok":
+                os.replace(path + part, path)
+            else:
+                os.unlink(path + part)
+    else:
+        text = buffer.getvalue() + text
+    return filename, status, time.perf_counter() - start, text
+
 if __name__ == "__main__":
-    import os
-    import sys
     import glob
+    from concurrent.futures import ProcessPoolExecutor
     from optparse import OptionParser
 
     # Option Parser
@@ -1238,56 +1340,44 @@ if __name__ == "__main__":
     parser.add_option("-t", "--tokens",
                       action="store_true", dest="tokens", default=False,
                       help="Output parsed tokens")
+    parser.add_option("-j", "--jobs", dest="jobs", type="int",
+                      default=os.cpu_count() or 1,
+                      help="Number of files to process in parallel")
+    parser.add_option("-f", "--force",
+                      action="store_true", dest="force", default=False,
+                      help="Reprocess files whose saved outputs are up to date")
     (options, args) = parser.parse_args()
 
     # expand options
     files = []
+    seen = set()
     for arg in args:
         for filenames in glob.glob( arg ):
+            # The same file matched by two patterns is processed once
+            if os.path.abspath(filenames) not in seen:
+                seen.add(os.path.abspath(filenames))
                 files.append( filenames )
-    output_to_files = options.save
-    dirname = options.directory
-    if output_to_files:
-        if not os.path.exists( dirname ):
-            os.mkdir( dirname )
-    real_out = astfile = cfile = sys.stdout
+    options.root = input_root( files )
+    if options.save:
+        collisions = find_collisions( files, options )
+        if collisions:
+            for first, second, path in collisions:
+                print ("%s and %s would both be saved as %s" % (first, second, path), file=sys.stderr)
+            parser.error("inputs with clashing output names")
+        if not os.path.exists( options.directory ):
+            os.mkdir( options.directory )
 
     # Do the stuff
-    for filename in files:
-        print (filename)
-        dirpath,filebase = os.path.split(filename)
-        base,ext = os.path.splitext(filebase)
-        data = open(filename,"r").read()
-        tokens = list(tokenize( data ))
-
-        # Print out the Lexer
-        if options.tokens:
-            if output_to_files:
-                sys.stdout = open(os.path.join(dirname, base+".tok"),"w")
-            print ("Lexical Analysis of " + filename)
-            for i,token in enumerate( tokens ):
-                loc = ("%d (%d,%d): " %(i, token.line, token.pos)).ljust(16)
-                print (loc,token)
-        
-        # Parse tokens
-        if output_to_files:
-            if options.ast:
-                astfile = open(os.path.join(dirname, base+".ast"),"w")
-                sys.stdout = astfile
-                print ("AST code of " + filename)
-            if options.code:
-                cfile = open(os.path.join(dirname, base+".c"),"w")
-                sys.stdout = cfile
-                print ("// C code of " + filename)
-
-        while len(tokens):
-            block, tokens = parse_root( tokens )
-            if options.ast:
-                sys.stdout = astfile
-                print_thing(block)
-            if options.code:
-                sys.stdout = cfile
-                print_c(block, 0, options.comments)
-        print
-        if output_to_files:
-            sys.stdout = real_out
+    counts = {"ok": 0, "skipped": 0, "error": 0}
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=options.jobs) as executor:
+        results = executor.map(process_file, [(filename, options) for filename in files])
+        for done, (filename, status, seconds, text) in enumerate(results, 1):
+            counts[status] += 1
+            if text:
+                print (text, file=sys.stdout if status == "ok" else sys.stderr)
+            print ("[%d/%d] %s %s %.1fms" % (done, len(files), filename, status, seconds * 1000),
+                   file=sys.stderr)
+    elapsed = time.perf_counter() - start
+    print ("%d files in %.2fs: %d ok, %d skipped, %d failed" %
+           (len(files), elapsed, counts["ok"], counts["skipped"], counts["error"]), file=sys.stderr)
@@ -0,0 +1,34 @@
+from callgraph import CallGraphBuilder
+from dotcache import DotFragmentCache
+from lexer import Tokenizer
+from parser import Parser
+
+
+def build(builder, code):
+    ast = Parser(Tokenizer(code).tokenize(), collect_symbols=False).parse()
+    return builder.build(ast, DotFragmentCache().child_hashes(ast))
+
+
+def test_edit_to_function_sharing_a_line_is_not_reused():
+    builder = CallGraphBuilder()
+    graph, stats = build(builder, 'int a() { b(); return 0; } int c() { return 0; }')
+    assert graph.calls == {'a': [('b', 1)], 'c': []}
+    graph, stats = build(builder, 'int a() { d(); return 0; } int c() { return 0; }')
+    assert graph.calls == {'a': [('d', 1)], 'c': []}
+    assert stats == {'walked': 1, 'reused': 1}
+
+
+def test_unchanged_functions_are_reused_across_sources():
+    builder = CallGraphBuilder()
+    build(builder, 'int f() { g(); g(); return 0; }\nint h() { return f(); }')
+    graph, stats = build(builder, 'int h() { return f(); }\nint f() { g(); g(); return 0; }')
+    assert graph.edges() == [('h', 'f', 1), ('f', 'g', 2)]
+    assert stats == {'walked': 0, 'reused': 2}
+
+
+def test_without_keys_every_function_is_walked():
+    ast = Parser(Tokenizer('int f() { g(); return 0; }').tokenize()).parse()
+    builder = CallGraphBuilder()
+    builder.build(ast)
+    graph, stats = builder.build(ast)
+    assert stats == {'walked': 1, 'reused': 0}
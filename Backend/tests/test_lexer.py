@@ -0,0 +1,66 @@
+import pytest
+
+from lexer import Tokenizer, remove_preprocessor_directives
+
+
+def kinds(code):
+    return [(token.type, token.value) for token in Tokenizer(code).tokenize()][:-1]
+
+
+def test_keywords_include_c99_specifiers():
+    assert kinds('unsigned long sizeof _Bool restrict') == [('KEYWORD', word) for word in
+                                                            ('unsigned', 'long', 'sizeof', '_Bool', 'restrict')]
+
+
+def test_punctuators_match_longest_first():
+    assert kinds('a<<=b a+++b x->y ...') == [
+        ('IDENTIFIER', 'a'), ('OPERATOR', '<<='), ('IDENTIFIER', 'b'),
+        ('IDENTIFIER', 'a'), ('OPERATOR', '++'), ('OPERATOR', '+'), ('IDENTIFIER', 'b'),
+        ('IDENTIFIER', 'x'), ('OPERATOR', '->'), ('IDENTIFIER', 'y'),
+        ('PUNCTUATION', '...')
+    ]
+
+
+def test_conditional_operator_tokens():
+    assert kinds('a ? 1 : 2') == [('IDENTIFIER', 'a'), ('OPERATOR', '?'), ('NUMBER', '1'),
+                                  ('OPERATOR', ':'), ('NUMBER', '2')]
+
+
+def test_digraphs_become_their_punctuator():
+    assert kinds('<: :> <% %>') == [('PUNCTUATION', value) for value in '[]{}']
+
+
+@pytest.mark.parametrize('number', ['0', '017', '0x1fULL', '10u', '1.5e-3f', '.5', '1.', '0x1.8p3'])
+def test_number_forms(number):
+    assert kinds(number) == [('NUMBER', number)]
+
+
+def test_character_and_wide_literals():
+    assert kinds(r"'a' '\n' L'x' L" + '"wide"') == [('CHAR', "'a'"), ('CHAR', r"'\n'"), ('CHAR', "L'x'"),
+                                                    ('STRING', 'L"wide"')]
+
+
+def test_comments_are_skipped_and_lines_counted():
+    tokens = Tokenizer('a /* one\ntwo */ b // three\nc').tokenize()
+    assert [(token.value, token.line) for token in tokens[:-1]] == [('a', 1), ('b', 2), ('c', 3)]
+
+
+@pytest.mark.parametrize('code, message', [
+    ('09', 'Invalid number'),
+    ('1.2.3', 'Invalid number'),
+    ('"open', 'Unterminated string'),
+    ("'ab", 'Unterminated character constant'),
+    ("''", 'Empty character constant'),
+    ('/* open', 'Unterminated comment'),
+    ('a @ b', "Unexpected character '@'"),
+])
+def test_invalid_input_is_rejected(code, message):
+    with pytest.raises(ValueError, match=message):
+        Tokenizer(code).tokenize()
+
+
+def test_directive_lines_are_blanked_not_dropped():
+    code = '#include <stdio.h>\n  #define N 3\n\nint main;'
+    tokens = Tokenizer(remove_preprocessor_directives(code)).tokenize()
+    assert [(token.value, token.line, token.column) for token in tokens[:-1]] == [('int', 4, 0), ('main', 4, 4),
+                                                                                  (';', 4, 8)]
@@ -0,0 +1,68 @@
+import pytest
+
+from lexer import Tokenizer
+from parser import Parser
+
+
+def parse(code):
+    return Parser(Tokenizer(code).tokenize()).parse()
+
+
+def shape(node):
+    return (node.node_type, node.value, [shape(child) for child in node.children if child is not None])
+
+
+def test_multi_word_specifiers():
+    assert shape(parse('unsigned long x;')) == ('Program', None, [('Declaration', 'unsigned long x', [])])
+    function = parse('static const int f(void) { return 0; }').children[0]
+    assert function.value == 'static const int f'
+
+
+def test_sizeof_forms():
+    code = 'int main() { int n = sizeof(x); long y = sizeof(unsigned int); long z = sizeof x; }'
+    block = parse(code).children[0].children[-1]
+    assert [shape(declaration.children[0]) for declaration in block.children] == [
+        ('FunctionCall', 'sizeof', [('IDENTIFIER', 'x', [])]),
+        ('FunctionCall', 'sizeof', [('Type', 'unsigned int', [])]),
+        ('FunctionCall', 'sizeof', [('IDENTIFIER', 'x', [])])
+    ]
+
+
+def test_character_constants():
+    declaration = parse("char c = 'a';").children[0]
+    assert shape(declaration) == ('Declaration', 'char c', [('CHAR', "'a'", [])])
+
+
+@pytest.mark.parametrize('code, word', [
+    ('int main() { x = a ? 1 : 2; }', '?'),
+    ('int x = a ? 1 : 2;', '?'),
+    ('int main() { return a ? b : c; }', '?'),
+    ('int main() { case 1: y = 2; }', ':'),
+    ('struct point p;', 'struct'),
+    ('int main() { typedef int t; }', 'typedef'),
+])
+def test_unsupported_grammar_is_rejected(code, word):
+    with pytest.raises(ValueError, match=f"Unsupported '{word}'"):
+        parse(code)
+
+
+@pytest.mark.parametrize('code', [
+    'int main() {',
+    'int main() { return 0;',
+    'int main() { if (x) ',
+    'int main() { while (x) { y = 1; ',
+    'int main() { { }',
+])
+def test_unterminated_block_is_rejected(code):
+    with pytest.raises(ValueError, match="Expected '}'"):
+        parse(code)
+
+
+def test_every_prefix_terminates():
+    # Mid-edit sources are cut off anywhere; each must parse or raise, never spin
+    code = 'int f(int a) { for (i = 0; i < a; i++) { if (a) { x = sizeof(int); } else { y = g(a, 2); } } return a; }'
+    for end in range(len(code) + 1):
+        try:
+            parse(code[:end])
+        except ValueError:
+            pass
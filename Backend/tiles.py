@@ -0,0 +1,202 @@
+import json
+import math
+import os
+import re
+import subprocess
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+
+from layout import Layout, NODE_HEIGHT, layout_tree
+
+# Tile pyramid for large ASTs.
+#
+# The tidy-tree layout is computed once per source hash and stored next to
+# the tiles. Each z/x/y tile is rendered on first request by handing Graphviz
+# only the nodes and edges that intersect the tile, with their positions
+# pinned (`neato -n2`), so no layout work is repeated per tile. Servers keep
+# recently used pyramids, with their layouts loaded, in a PyramidCache so a
+# burst of tile requests reads layout.json once.
+
+TILE_SIZE = 256
+TILE_ROOT = os.environ.get('AST_TILE_DIR', os.path.join(tempfile.gettempdir(), 'ast-tiles'))
+TILE_TIMEOUT = float(os.environ.get('AST_TILE_TIMEOUT', 10))
+TILE_PYRAMIDS = int(os.environ.get('AST_TILE_PYRAMIDS', 16))
+
+_HASH_RE = re.compile(r'[0-9a-f]{8,64}')
+
+
+class TileError(Exception):
+    pass
+
+
+class TileRenderError(TileError):
+    """neato failed or overran TILE_TIMEOUT; unlike other TileErrors, not the client's fault."""
+
+
+class TilePyramid:
+    def __init__(self, source_hash, root=TILE_ROOT):
+        if not _HASH_RE.fullmatch(source_hash):
+            raise TileError(f"Invalid tile hash: {source_hash}")
+        self.hash = source_hash
+        self.directory = os.path.join(root, source_hash)
+        self._layout = None
+
+    @property
+    def layout_path(self):
+        return os.path.join(self.directory, 'layout.json')
+
+    def exists(self):
+        return os.path.exists(self.layout_path)
+
+    def build(self, ast):
+        """Compute and store the layout for `ast` unless it is already cached."""
+        if self.exists():
+            return self.metadata()
+        layout = layout_tree(ast)
+        os.makedirs(self.directory, exist_ok=True)
+        data = {
+            'labels': layout.labels,
+            'parent': layout.parent.tolist(),
+            'depth': layout.depth.tolist(),
+            'x': layout.x.tolist(),
+            'y': layout.y.tolist(),
+            'width': layout.width.tolist()
+        }
+        temp_path = f"{self.layout_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as layout_file:
+            json.dump(data, layout_file)
+        os.replace(temp_path, self.layout_path)
+        self._layout = layout
+        return self.metadata()
+
+    def load(self):
+        if self._layout is None:
+            if not self.exists():
+                raise TileError(f"No layout stored for {self.hash}")
+            with open(self.layout_path) as layout_file:
+                data = json.load(layout_file)
+            self._layout = Layout(
+                data['labels'],
+                np.array(data['parent'], dtype=np.int64),
+                np.array(data['depth'], dtype=np.int64),
+                np.array(data['x']),
+                np.array(data['y']),
+                np.array(data['width'])
+            )
+        return self._layout
+
+    @property
+    def max_zoom(self):
+        layout = self.load()
+        extent = max(layout.total_width, layout.total_height, TILE_SIZE)
+        return math.ceil(math.log2(extent / TILE_SIZE))
+
+    def metadata(self):
+        layout = self.load()
+        return {
+            'hash': self.hash,
+            'tile_size': TILE_SIZE,
+            'max_zoom': self.max_zoom,
+            'width': round(layout.total_width, 1),
+            'height': round(layout.total_height, 1),
+            'url': f'/tiles/{self.hash}/{{z}}/{{x}}/{{y}}.png'
+        }
+
+    def tile_path(self, z, x, y):
+        """Return the path of a rendered tile, rendering it on first use."""
+        layout = self.load()
+        max_zoom = self.max_zoom
+        if not 0 <= z <= max_zoom:
+            raise TileError(f"Zoom level {z} out of range 0..{max_zoom}")
+        span = TILE_SIZE * 2 ** (max_zoom - z)
+        if not (0 <= x < math.ceil(layout.total_width / span) and 0 <= y < math.ceil(layout.total_height / span)):
+            raise TileError(f"Tile {z}/{x}/{y} out of range")
+        path = os.path.join(self.directory, str(z), str(x), f'{y}.png')
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._render(layout, z, x, y, span, path)
+        return path
+
+    def _render(self, layout, z, x, y, span, path):
+        x0, y0 = x * span, y * span
+        x1, y1 = x0 + span, y0 + span
+        half_w = layout.width / 2
+        half_h = NODE_HEIGHT / 2
+        visible = ((layout.x + half_w >= x0) & (layout.x - half_w <= x1) &
+                   (layout.y + half_h >= y0) & (layout.y - half_h <= y1))
+
+        # Edges are kept when their bounding box touches the tile
+        parent = layout.parent
+        child = np.nonzero(parent >= 0)[0]
+        px, py = layout.x[parent[child]], layout.y[parent[child]]
+        cx, cy = layout.x[child], layout.y[child]
+        crossing = ((np.maximum(px, cx) >= x0) & (np.minimum(px, cx) <= x1) &
+                    (np.maximum(py, cy) >= y0) & (np.minimum(py, cy) <= y1))
+        edges = child[crossing]
+        drawn = visible.copy()
+        drawn[edges] = True
+        drawn[parent[edges]] = True
+
+        # Graphviz uses points with the y axis pointing up
+        height = layout.total_height
+        lines = [
+            'digraph AST {',
+            f'  graph [bb="0,0,{layout.total_width:.1f},{height:.1f}", splines=line];',
+            '  node [shape=box, style=filled, fillcolor=lightblue, fontsize=12, fontname=Helvetica, fixedsize=true];',
+            '  edge [color=black, arrowhead=none];'
+        ]
+        for i in np.nonzero(drawn)[0].tolist():
+            label = layout.labels[i].replace('\\', '\\\\').replace('"', '\\"')
+            lines.append(f'  n{i} [label="{label}", pos="{layout.x[i]:.1f},{height - layout.y[i]:.1f}", '
+                         f'width={layout.width[i] / 72:.3f}, height={NODE_HEIGHT / 72:.3f}];')
+        for i in edges.tolist():
+            lines.append(f'  n{parent[i]} -> n{i};')
+        lines.append('}')
+
+        scale = 2.0 ** (z - self.max_zoom)
+        viewport = f'{TILE_SIZE},{TILE_SIZE},{scale},{x0 + span / 2:.1f},{height - (y0 + span / 2):.1f}'
+        # Unique per call: two threads may render the same tile at once
+        temp_path = f"{path}.{os.getpid()}-{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            subprocess.run(['neato', '-n2', '-Tpng', f'-Gviewport={viewport}', '-o', temp_path],
+                           input='\n'.join(lines), text=True, check=True, capture_output=True,
+                           timeout=TILE_TIMEOUT)
+            os.replace(temp_path, path)
+        except subprocess.CalledProcessError as e:
+            raise TileRenderError(f"Failed to render tile {z}/{x}/{y}: {e.stderr}")
+        except subprocess.TimeoutExpired:
+            raise TileRenderError(f"Rendering tile {z}/{x}/{y} exceeded {TILE_TIMEOUT}s")
+        finally:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+
+
+class PyramidCache:
+    """Small LRU of loaded TilePyramid objects keyed by source hash."""
+
+    def __init__(self, maxsize=TILE_PYRAMIDS, root=TILE_ROOT):
+        self.maxsize = maxsize
+        self.root = root
+        self._pyramids = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, source_hash):
+        """The stored pyramid for `source_hash` with its layout loaded, or None."""
+        with self._lock:
+            pyramid = self._pyramids.get(source_hash)
+            if pyramid is not None:
+                self._pyramids.move_to_end(source_hash)
+                return pyramid
+        pyramid = TilePyramid(source_hash, self.root)
+        if not pyramid.exists():
+            return None
+        pyramid.load()
+        with self._lock:
+            self._pyramids[source_hash] = pyramid
+            if len(self._pyramids) > self.maxsize:
+                self._pyramids.popitem(last=False)
+        return pyramid
@@ -0,0 +1,80 @@
+# Wire encodings for the `tokens` field of /parse responses.
+#
+# "rows" is the original list of per-token objects. "columnar" sends one
+# array per field instead: token types become small integer codes into a
+# type dictionary and values become indices into a string table, so each key
+# and each repeated identifier is sent once. "columnar-delta" additionally
+# stores line numbers as deltas and columns relative to the previous token
+# on the same line, which keeps most numbers to one or two digits.
+
+TOKEN_FORMATS = ('rows', 'columnar', 'columnar-delta')
+
+
+def encode_tokens(tokens, fmt='rows'):
+    if fmt == 'rows':
+        return [
+            {
+                "index": i,
+                "type": token.type,
+                "value": token.value,
+                "line": token.line,
+                "column": token.column
+            }
+            for i, token in enumerate(tokens)
+        ]
+    if fmt not in TOKEN_FORMATS:
+        raise ValueError(f"Unknown token format: {fmt}")
+
+    type_codes = {}
+    string_codes = {}
+    types = [type_codes.setdefault(token.type, len(type_codes)) for token in tokens]
+    values = [string_codes.setdefault(token.value, len(string_codes)) for token in tokens]
+    lines = [token.line for token in tokens]
+    columns = [token.column for token in tokens]
+
+    if fmt == 'columnar-delta':
+        prev_line = 0
+        prev_column = 0
+        for i in range(len(tokens)):
+            line, column = lines[i], columns[i]
+            lines[i] = line - prev_line
+            columns[i] = column - prev_column if line == prev_line else column
+            prev_line, prev_column = line, column
+
+    return {
+        'format': fmt,
+        'count': len(tokens),
+        'types': list(type_codes),
+        'strings': list(string_codes),
+        'type': types,
+        'value': values,
+        'line': lines,
+        'column': columns
+    }
+
+
+def decode_tokens(encoded):
+    """Expand any encoding back into the "rows" representation."""
+    if isinstance(encoded, list):
+        return encoded
+    types = encoded['types']
+    strings = encoded['strings']
+    lines = encoded['line']
+    columns = encoded['column']
+    rows = []
+    line = 0
+    column = 0
+    for i in range(encoded['count']):
+        if encoded['format'] == 'columnar-delta':
+            column = columns[i] + column if lines[i] == 0 else columns[i]
+            line += lines[i]
+        else:
+            line, column = lines[i], columns[i]
+        rows.append({
+            "index": i,
+            "type": types[encoded['type'][i]],
+            "value": strings[encoded['value'][i]],
+            "line": line,
+            "column": column
+        })
+    return rows
@@ -3,7 +3,10 @@ import { Controlled as CodeMirror } from 'react-codemirror2';
 import 'codemirror/lib/codemirror.css';
 import 'codemirror/theme/material.css';
 import 'codemirror/mode/clike/clike';
-import { Button, Container, Typography, Box, Paper } from '@mui/material';
+import { Button, Container, Typography, Box, Paper, FormControlLabel, Switch } from '@mui/material';
+import AstTree from './AstTree';
+
+const API_BASE = 'http://127.0.0.1:5050';
 
 function App() {
   const [code, setCode] = useState(`#include <stdio.h>
@@ -16,22 +19,31 @@ int main() {
     return x;
 }`);
   const [astImage, setAstImage] = useState(null);
+  const [astTree, setAstTree] = useState(null);
+  const [renderInBrowser, setRenderInBrowser] = useState(false);
   const [error, setError] = useState(null);
 
   const parseCode = async () => {
     try {
-      const response = await fetch('http://127.0.0.1:5050/parse', {
+      const response = await fetch(`${API_BASE}/parse`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ code }),
+        body: JSON.stringify(
+          renderInBrowser ? { code, renderer: 'json', layout: true } : { code }
+        ),
       });
       if (!response.ok) {
         throw new Error(`HTTP error! status: ${response.status}`);
       }
       const data = await response.json();
       console.log('Response data:', data); // Debug: Log the response
-      if (data.image) {
-        setAstImage(data.image); // Set the base64 image string
+      if (data.tree) {
+        setAstTree(data.tree); // Drawn locally by AstTree
+        setAstImage(null);
+        setError(null);
+      } else if (data.image_url) {
+        setAstImage(`${API_BASE}${data.image_url}`); // Image bytes are streamed from /image/<render-id>
+        setAstTree(null);
         setError(null);
       } else if (data.error) {
         setError(data.error);
@@ -73,12 +85,27 @@ int main() {
         <Button variant="contained" color="primary" onClick={parseCode}>
           Parse Code
         </Button>
+        <FormControlLabel
+          sx={{ ml: 2 }}
+          control={
+            <Switch
+              checked={renderInBrowser}
+              onChange={(event) => setRenderInBrowser(event.target.checked)}
+            />
+          }
+          label="Render in browser"
+        />
       </Box>
       {error && (
         <Typography color="error" align="center" gutterBottom>
           {error}
         </Typography>
       )}
+      {astTree && (
+        <Box mt={4} textAlign="center">
+          <AstTree tree={astTree} />
+        </Box>
+      )}
       {astImage && (
         <Box mt={4} textAlign="center">
           <img
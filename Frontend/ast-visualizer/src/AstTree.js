@@ -0,0 +1,94 @@
+import React, { useMemo } from 'react';
+import { hierarchy, tree as d3tree } from 'd3';
+
+const NODE_HEIGHT = 28;
+const CHAR_WIDTH = 7;
+
+// Draws the compact AST JSON returned by /parse with renderer "json".
+// Uses the server's precomputed coordinates when present, otherwise lays
+// the tree out in the browser with d3.tree().
+function nodeLabel(tree, id) {
+  const type = tree.types[tree.type[id]];
+  const value = tree.value[id];
+  return value ? `${type}: ${value}` : type;
+}
+
+function computeLayout(tree) {
+  if (tree.layout) {
+    return {
+      width: tree.layout.width,
+      height: tree.layout.height,
+      x: tree.layout.x,
+      y: tree.layout.y,
+      w: tree.layout.w,
+    };
+  }
+  const root = hierarchy(0, (id) => tree.children[id]);
+  d3tree().nodeSize([160, NODE_HEIGHT * 2.5])(root);
+  const x = new Array(tree.count);
+  const y = new Array(tree.count);
+  let minX = Infinity;
+  let maxX = -Infinity;
+  let maxY = 0;
+  root.each((node) => {
+    x[node.data] = node.x;
+    y[node.data] = node.y + NODE_HEIGHT;
+    minX = Math.min(minX, node.x);
+    maxX = Math.max(maxX, node.x);
+    maxY = Math.max(maxY, node.y);
+  });
+  const margin = 100;
+  for (let i = 0; i < tree.count; i++) {
+    x[i] += margin - minX;
+  }
+  const w = tree.type.map((_, id) => nodeLabel(tree, id).length * CHAR_WIDTH + 16);
+  return { width: maxX - minX + 2 * margin, height: maxY + NODE_HEIGHT * 2, x, y, w };
+}
+
+function AstTree({ tree }) {
+  const layout = useMemo(() => computeLayout(tree), [tree]);
+  const half = NODE_HEIGHT / 2;
+  const edges = [];
+  const nodes = [];
+  tree.children.forEach((kids, parent) => {
+    kids.forEach((child) => {
+      edges.push(
+        <line
+          key={`e${child}`}
+          x1={layout.x[parent]}
+          y1={layout.y[parent] + half}
+          x2={layout.x[child]}
+          y2={layout.y[child] - half}
+          stroke="black"
+        />
+      );
+    });
+    nodes.push(
+      <g key={`n${parent}`}>
+        <rect
+          x={layout.x[parent] - layout.w[parent] / 2}
+          y={layout.y[parent] - half}
+          width={layout.w[parent]}
+          height={NODE_HEIGHT}
+          fill="lightblue"
+          stroke="black"
+        />
+        <text x={layout.x[parent]} y={layout.y[parent]} textAnchor="middle" dominantBaseline="central" fontSize="12">
+          {nodeLabel(tree, parent)}
+        </text>
+      </g>
+    );
+  });
+  return (
+    <svg
+      width="100%"
+      viewBox={`0 0 ${layout.width} ${layout.height}`}
+      style={{ border: '1px solid #ddd', fontFamily: 'Helvetica' }}
+    >
+      {edges}
+      {nodes}
+    </svg>
+  );
+}
+
+export default AstTree;